@@ -1,42 +1,88 @@
-import csv
+import argparse
 import collections
 import re
 
-def analyze_styles(csv_path):
-    style_data = collections.defaultdict(list)
-
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            style = row.get('style_url')
-            layer = row.get('layer')
-            desc = row.get('description')
-            style_data[style].append({'layer': layer, 'desc': desc})
-
-    print(f"{'Style':<20} | {'Count':<5} | {'Common Layer':<30} | {'Legitimacy Keywords'}")
-    print("-" * 100)
-
-    for style, rows in style_data.items():
-        count = len(rows)
-        
-        # Most common layer
-        layers = [r['layer'] for r in rows]
-        common_layer = collections.Counter(layers).most_common(1)[0][0] if layers else "None"
-        
-        # Check legitimacy keywords in description
-        legit_counts = collections.Counter()
-        for r in rows:
-            desc = r['desc']
-            if 'חצי לגיטימי' in desc:
-                legit_counts['semi'] += 1
-            elif 'לא לגיטימי' in desc:
-                legit_counts['no'] += 1
-            elif 'לגיטימי' in desc: # Check this last as it's a substring of others
-                legit_counts['yes'] += 1
-        
-        legit_summary = f"Yes:{legit_counts['yes']}, Semi:{legit_counts['semi']}, No:{legit_counts['no']}"
-        
-        print(f"{style:<20} | {count:<5} | {common_layer[:30]:<30} | {legit_summary}")
+from output_sinks import read_rows
+
+# One pass over the description; alternatives are tried longest first so
+# 'חצי לגיטימי' and 'לא לגיטימי' win over the bare 'לגיטימי' at the same spot
+LEGITIMACY_PATTERN = re.compile('(חצי לגיטימי)|(לא לגיטימי)|(לגיטימי)')
+LEGITIMACY_KEYS = (None, 'semi', 'no', 'yes')  # by regex group
+
+def legitimacy_keyword(desc):
+    """
+    Returns 'semi', 'no' or 'yes' for the legitimacy keyword in a description,
+    or None. When several appear, semi beats no beats yes.
+    """
+    if not desc:
+        return None
+    best = None
+    for match in LEGITIMACY_PATTERN.finditer(desc):
+        if best is None or match.lastindex < best:
+            best = match.lastindex
+            if best == 1:
+                break
+    return LEGITIMACY_KEYS[best] if best else None
+
+class StyleStats:
+    """
+    Per-style counters updated one row at a time: row count, layers and
+    legitimacy keywords. Memory grows with the number of distinct styles and
+    layers, not with the number of rows.
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.layers = collections.defaultdict(collections.Counter)
+        self.legitimacy = collections.defaultdict(collections.Counter)
+
+    def add(self, row):
+        style = row.get('style_url') or ''
+        self.counts[style] += 1
+        self.layers[style][row.get('layer') or ''] += 1
+        keyword = legitimacy_keyword(row.get('description'))
+        if keyword:
+            self.legitimacy[style][keyword] += 1
+
+    def observe(self, rows):
+        """Yields rows unchanged while counting them, e.g. between the converter and its sink."""
+        for row in rows:
+            self.add(row)
+            yield row
+
+    def print_report(self):
+        print(f"{'Style':<20} | {'Count':<5} | {'Common Layer':<30} | {'Legitimacy Keywords'}")
+        print("-" * 100)
+
+        for style, count in self.counts.items():
+            common_layer = self.layers[style].most_common(1)[0][0]
+            legit_counts = self.legitimacy[style]
+            legit_summary = f"Yes:{legit_counts['yes']}, Semi:{legit_counts['semi']}, No:{legit_counts['no']}"
+
+            print(f"{style:<20} | {count:<5} | {common_layer[:30]:<30} | {legit_summary}")
+
+def analyze_styles(source):
+    """
+    Prints per-style counts, most common layer and legitimacy keywords.
+    source is a CSV/Parquet/Arrow path from convert_kmz_to_csv or an
+    iterable of its rows (e.g. iter_kmz_rows). Returns the StyleStats.
+    """
+    if isinstance(source, str):
+        source = read_rows(source, columns=['style_url', 'layer', 'description'])
+
+    stats = StyleStats()
+    for row in source:
+        stats.add(row)
+    stats.print_report()
+    return stats
 
 if __name__ == "__main__":
-    analyze_styles("fruit_trees_2022.csv")
+    parser = argparse.ArgumentParser(description="Summarize styles, layers and legitimacy keywords.")
+    parser.add_argument('path', nargs='?', default="fruit_trees_2022.csv", help="Converted CSV/Parquet/Arrow file, or a .kmz")
+    args = parser.parse_args()
+
+    if args.path.lower().endswith('.kmz'):
+        from convert_kmz_to_csv import iter_kmz_rows
+        analyze_styles(iter_kmz_rows(args.path))
+    else:
+        analyze_styles(args.path)
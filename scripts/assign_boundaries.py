@@ -0,0 +1,156 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from extended_data import parse_value
+from normalize_tree_records import TREE_RECORD_FIELDS, TREE_RECORD_TYPES
+from output_sinks import open_sink, read_rows
+from tree_spatial import BoundaryLayer, to_float, wgs84_to_itm
+
+# Record column -> boundary property, per layer (defaults: same name)
+MUNI_COLUMNS = ('muni_code', 'muni_name', 'muni_name_en', 'muni_region')
+STAT_AREA_COLUMNS = ('stat_area_code',)
+
+def _itm_coordinates(rows):
+    """ITM x/y of a batch: location-x-il/location-y-il when present, else projected from lon/lat."""
+    x = to_float([r.get('location-x-il') for r in rows])
+    y = to_float([r.get('location-y-il') for r in rows])
+    missing = np.isnan(x) | np.isnan(y)
+    if missing.any():
+        lon = to_float([r.get('location-x', r.get('longitude')) for r in rows])[missing]
+        lat = to_float([r.get('location-y', r.get('latitude')) for r in rows])[missing]
+        x[missing], y[missing] = wgs84_to_itm(lon, lat)
+    return x, y
+
+class BoundaryAssigner:
+    """
+    Fills boundary columns of rows from one or more BoundaryLayers.
+
+    layers is a list of (BoundaryLayer, {column: property}). Rows are
+    handled in batches: ITM coordinates for the whole batch, one assign()
+    per layer, then the columns are set from the matched polygon's
+    properties. Rows outside every polygon keep their existing values.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+        self.rows = 0
+        self.assigned = [0] * len(layers)
+
+    @property
+    def columns(self):
+        return [column for _, mapping in self.layers for column in mapping]
+
+    def assign(self, rows):
+        """Sets the boundary columns of a batch of row dicts in place."""
+        x, y = _itm_coordinates(rows)
+        self.rows += len(rows)
+        for n, (layer, mapping) in enumerate(self.layers):
+            polygon = layer.assign(x, y)
+            self.assigned[n] += int((polygon >= 0).sum())
+            for column, prop in mapping.items():
+                values = layer.values(polygon, prop, default=None)
+                for row, value in zip(rows, values):
+                    if value is not None:
+                        row[column] = value
+                    else:
+                        row.setdefault(column, '')
+        return rows
+
+    def iter_rows(self, rows, batch_size=50000):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from self.assign(batch)
+                batch = []
+        if batch:
+            yield from self.assign(batch)
+
+def _restore_types(rows, types):
+    """Converts typed record columns read back as strings (read_rows) to their values."""
+    for row in rows:
+        for column, kind in types.items():
+            if column in row:
+                row[column] = parse_value(row[column], kind)
+        yield row
+
+def assign_boundaries(input_path, output_path, muni_path=None, stat_area_path=None,
+                      muni_columns=None, stat_area_columns=None, batch_size=50000):
+    """
+    Writes the rows of a tree record file (normalize_tree_records output) or
+    a converted CSV/Parquet/Arrow file with municipality and statistical-area
+    columns filled by point-in-polygon against local GeoJSON boundary files.
+    Returns (rows written, [assigned per layer]).
+    """
+    for path in (input_path, muni_path, stat_area_path):
+        if path and not os.path.exists(path):
+            print(f"Error: File not found: {path}")
+            return None
+    if not muni_path and not stat_area_path:
+        print("Error: No boundary file given (--muni and/or --stat-areas)")
+        return None
+
+    started = time.perf_counter()
+    layers = []
+    for path, mapping in ((muni_path, muni_columns or {c: c for c in MUNI_COLUMNS}),
+                          (stat_area_path, stat_area_columns or {c: c for c in STAT_AREA_COLUMNS})):
+        if path:
+            layer = BoundaryLayer.from_geojson(path)
+            print(f"Loaded {len(layer.polygons)} polygons from {path}")
+            layers.append((layer, mapping))
+    assigner = BoundaryAssigner(layers)
+
+    rows = read_rows(input_path)
+    first = next(rows, None)
+    fieldnames = list(first) if first else list(TREE_RECORD_FIELDS)
+    fieldnames += [c for c in assigner.columns if c not in fieldnames]
+    types = {c: t for c, t in TREE_RECORD_TYPES.items() if c in fieldnames}
+
+    def all_rows():
+        if first is not None:
+            yield first
+            yield from rows
+
+    count = 0
+    with open_sink(output_path, fieldnames, types) as writer:
+        for row in _restore_types(assigner.iter_rows(all_rows(), batch_size), types):
+            writer.write(row)
+            count += 1
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {count} rows to {output_path} in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s)")
+    for (layer, mapping), assigned in zip(layers, assigner.assigned):
+        share = assigned / count if count else 0
+        print(f"  {', '.join(mapping)}: {assigned} assigned ({share:.1%}), {count - assigned} outside all polygons")
+    return count, assigner.assigned
+
+def _parse_mapping(pairs, defaults):
+    mapping = {c: c for c in defaults}
+    for pair in pairs or []:
+        column, _, prop = pair.partition('=')
+        mapping[column] = prop or column
+    return mapping
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign municipality and statistical-area codes to tree records.")
+    parser.add_argument('input', nargs='?', default="fruit_trees_2022.records.csv",
+                        help="Tree records or convert_kmz_to_csv output (CSV/Parquet/Arrow)")
+    parser.add_argument('-o', '--output', default="fruit_trees_2022.assigned.csv", help="CSV/Parquet/Arrow path")
+    parser.add_argument('--muni', help="Municipality boundaries (GeoJSON, WGS84 or ITM)")
+    parser.add_argument('--stat-areas', help="Statistical area boundaries (GeoJSON, WGS84 or ITM)")
+    parser.add_argument('--muni-property', nargs='*', metavar='COLUMN=PROPERTY',
+                        help="Municipality property for a column, e.g. muni_code=SEMEL_YISH")
+    parser.add_argument('--stat-area-property', nargs='*', metavar='COLUMN=PROPERTY',
+                        help="Statistical area property for a column, e.g. stat_area_code=YISHUV_STAT")
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    assign_boundaries(
+        args.input, args.output, args.muni, args.stat_areas,
+        _parse_mapping(args.muni_property, MUNI_COLUMNS),
+        _parse_mapping(args.stat_area_property, STAT_AREA_COLUMNS),
+        args.batch_size,
+    )
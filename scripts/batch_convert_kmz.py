@@ -0,0 +1,387 @@
+import argparse
+import bisect
+import concurrent.futures
+import csv
+import glob
+import os
+import shutil
+import tempfile
+import time
+import xml.parsers.expat
+import zipfile
+
+from convert_kmz_to_csv import FIELDNAMES, clean_text, indexed_styles, iter_kmz_rows, iter_placemark_rows
+from kmz_archive import kml_names, open_kml
+
+# Top-level elements every unit needs to resolve styleUrls
+SHARED_TAGS = ('Style', 'StyleMap', 'Schema')
+
+def find_kmz_files(inputs):
+    """Expands directories and glob patterns into a sorted, de-duplicated list of KMZ paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, '*.kmz')))
+        elif any(c in item for c in '*?['):
+            paths.extend(glob.glob(item))
+        else:
+            paths.append(item)
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+def extract_kml(kmz_path, kml_filename, out_path):
+    """Inflates one .kml entry of a KMZ to out_path."""
+    with open_kml(kmz_path, kml_filename) as src, open(out_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 4 * 1024 * 1024)
+
+def _element_end(f, start, end_index):
+    """
+    Returns the byte offset just past an element.
+    expat reports the '<' of the end tag for regular elements but the position
+    after the tag for self-closing ones, so the start tag is inspected first.
+    """
+    f.seek(start)
+    head = f.read(4096)
+    quote = None
+    for i, c in enumerate(head):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in b'"\'':
+            quote = c
+        elif c == ord('>'):
+            if head[i - 1] == ord('/'):
+                return start + i + 1
+            break
+
+    f.seek(end_index)
+    tail = f.read(1024)
+    return end_index + tail.index(b'>') + 1
+
+def split_top_level(kml_path):
+    """
+    Scans an inflated KML file with expat and splits it into conversion units.
+
+    Each top-level Folder becomes one unit, as in inspect_kml_structure's
+    print_structure; runs of other top-level elements that contain Placemarks
+    become units of their own. Elements next to the Document, directly under
+    <kml>, are top-level too and are cut out of the footer. Styles,
+    StyleMaps and Schemas (at any depth outside Placemarks) are returned as
+    shared ranges that every unit gets.
+
+    Returns a dict with the 'header' byte range, 'footer' and 'shared'
+    ranges, and 'units' as a list of {'name', 'ranges'} in document order.
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    stack = []  # (local tag, start offset) of open elements
+    children = []  # top-level (start, end index, tag, has placemarks, name, outside the Document)
+    shared = []
+    container_depth = None
+    current = None  # top-level child being read
+    name_text = None
+    placemark_depth = 0
+
+    def start(qname, attrs):
+        nonlocal container_depth, current, name_text, placemark_depth
+        tag = qname.split(':')[-1]
+        depth = len(stack)
+        if depth == 1 and container_depth is None:
+            container_depth = 1 if tag == 'Document' else 0
+        stack.append((tag, parser.CurrentByteIndex))
+        if container_depth is None:
+            return
+
+        if current is None and (depth == container_depth + 1 or (depth == 1 and tag != 'Document')):
+            current = {'tag': tag, 'has_placemarks': False, 'name': None, 'depth': depth}
+        if tag == 'Placemark':
+            placemark_depth += 1
+            current['has_placemarks'] = True
+        elif (tag == 'name' and depth == container_depth + 2
+              and current['tag'] == 'Folder' and not placemark_depth):
+            name_text = []
+            parser.CharacterDataHandler = name_text.append
+
+    def end(qname):
+        nonlocal current, name_text, placemark_depth
+        tag, start_offset = stack.pop()
+        depth = len(stack)
+        if tag == 'Placemark':
+            placemark_depth -= 1
+        elif tag == 'name' and name_text is not None:
+            current['name'] = clean_text(''.join(name_text))
+            name_text = None
+            parser.CharacterDataHandler = None
+
+        if tag in SHARED_TAGS and not placemark_depth:
+            shared.append((start_offset, parser.CurrentByteIndex))
+        if current is not None and depth == current['depth']:
+            children.append((start_offset, parser.CurrentByteIndex, tag,
+                             current['has_placemarks'], current['name'], depth <= container_depth))
+            current = None
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+
+    with open(kml_path, 'rb') as f:
+        parser.ParseFile(f)
+
+        size = f.seek(0, os.SEEK_END)
+        shared_ranges = [(s, _element_end(f, s, e)) for s, e in shared]
+        resolved = [(s, _element_end(f, s, e), tag, has_pm, name, outside)
+                    for s, e, tag, has_pm, name, outside in children]
+
+    if not resolved:
+        return {'header': (0, 0), 'footer': [], 'shared': [], 'units': []}
+
+    inside = [c for c in resolved if not c[5]]
+    header_end = (inside or resolved)[0][0]
+    tail = inside[-1][1] if inside else header_end
+    footer = []
+    for s, e, *_, outside in resolved:
+        if outside and s >= tail:
+            footer.append((tail, s))
+            tail = e
+    footer.append((tail, size))
+
+    units = []
+    run = None
+    for s, e, tag, has_pm, name, _ in resolved:
+        if tag in SHARED_TAGS:
+            continue
+        if tag == 'Folder':
+            run = None
+            units.append({'name': name or 'Unnamed', 'ranges': [(s, e)], 'has_placemarks': has_pm})
+        else:
+            if run is None:
+                run = {'name': '(document)', 'ranges': [], 'has_placemarks': False}
+                units.append(run)
+            run['ranges'].append((s, e))
+            run['has_placemarks'] = run['has_placemarks'] or has_pm
+
+    return {
+        'header': (0, header_end),
+        'footer': footer,
+        'shared': shared_ranges,
+        'units': [u for u in units if u['has_placemarks']],
+    }
+
+class _SegmentReader:
+    """Read-only file object that concatenates byte ranges of one file."""
+
+    def __init__(self, path, ranges):
+        self._f = open(path, 'rb')
+        self._ranges = list(ranges)
+        self._pos = None  # file offset within the current range
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 62
+        out = []
+        while size > 0 and self._ranges:
+            start, end = self._ranges[0]
+            if self._pos is None:
+                self._pos = start
+            chunk_len = min(size, end - self._pos)
+            self._f.seek(self._pos)
+            chunk = self._f.read(chunk_len)
+            out.append(chunk)
+            size -= len(chunk)
+            self._pos += len(chunk)
+            if self._pos >= end or not chunk:
+                self._ranges.pop(0)
+                self._pos = None
+        return b''.join(out)
+
+    def close(self):
+        self._f.close()
+
+def _write_rows(rows, part_path):
+    """Writes rows without a header. Returns the number of placemarks."""
+    count = 0
+    with open(part_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        for data in rows:
+            writer.writerow(data)
+            count += 1
+    return count
+
+def convert_file_job(kmz_path, part_path):
+    """Worker: converts a whole KMZ (every KML document in it) into a headerless part CSV."""
+    started = time.perf_counter()
+    count = _write_rows(iter_kmz_rows(kmz_path), part_path)
+    return count, time.perf_counter() - started
+
+def plan_file_job(kmz_path, work_dir):
+    """
+    Worker: inflates every KML document of a KMZ (root first, as
+    iter_kmz_rows reads them) and splits each into top-level units.
+    Returns one plan per document, with the styles iter_kmz_rows would
+    preload from the KMZ index (None if there is none).
+    """
+    started = time.perf_counter()
+    with zipfile.ZipFile(kmz_path, 'r') as z:
+        kml_filenames = kml_names(z)
+    if not kml_filenames:
+        raise ValueError(f"No KML file found in {kmz_path}")
+
+    plans = []
+    for k, kml_filename in enumerate(kml_filenames):
+        kml_path = os.path.join(work_dir, f'doc-{k:03d}.kml')
+        extract_kml(kmz_path, kml_filename, kml_path)
+        plan = split_top_level(kml_path)
+        plan['kml_path'] = kml_path
+        plan['styles'], plan['style_maps'] = indexed_styles(kmz_path, kml_filename)
+        plans.append(plan)
+    return plans, time.perf_counter() - started
+
+def _unit_ranges(plan, unit_index):
+    """
+    Byte ranges of a unit's document: the unit with every shared range
+    outside it, in document order, so each Placemark sees the styles an
+    unsplit conversion has seen by then.
+    """
+    unit = plan['units'][unit_index]['ranges']
+    starts = [s for s, _ in unit]
+    shared = []
+    for s, e in plan['shared']:
+        i = bisect.bisect_right(starts, s) - 1
+        if i < 0 or e > unit[i][1]:
+            shared.append((s, e))
+    return [plan['header']] + sorted(shared + unit) + plan['footer']
+
+def convert_unit_job(kml_path, plan, unit_index, part_path, deferred_path):
+    """
+    Worker: converts one unit into a part CSV. Rows deferred until the end
+    of the document for a style defined later go to deferred_path instead,
+    which batch_convert merges after every unit of the document, where an
+    unsplit conversion yields them.
+    """
+    started = time.perf_counter()
+    reader = _SegmentReader(kml_path, _unit_ranges(plan, unit_index))
+    deferred = 0
+    try:
+        with open(deferred_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+
+            def emit_deferred(data):
+                nonlocal deferred
+                writer.writerow(data)
+                deferred += 1
+
+            rows = iter_placemark_rows(reader, plan['styles'], plan['style_maps'], emit_deferred=emit_deferred)
+            count = _write_rows(rows, part_path)
+    finally:
+        reader.close()
+    return count + deferred, time.perf_counter() - started
+
+def _merge_parts(part_paths, csv_path):
+    with open(csv_path, 'w', newline='', encoding='utf-8') as out:
+        csv.DictWriter(out, fieldnames=FIELDNAMES).writeheader()
+        for part in part_paths:
+            with open(part, 'r', newline='', encoding='utf-8') as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+
+def batch_convert(kmz_paths, output_csv=None, output_dir=None, workers=None, split_folders=False):
+    """
+    Converts many KMZ files with a process pool.
+
+    Writes either one merged CSV (output_csv), ordered by input path and then
+    as iter_kmz_rows yields the rows, or one CSV per input in output_dir. With
+    split_folders=True each KML document of a file is also split by
+    top-level Folder so one large KMZ is spread over several workers.
+    Returns a list of per-file results (path, placemarks, seconds, units).
+    """
+    if not output_csv and not output_dir:
+        raise ValueError("Either output_csv or output_dir is required")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    work_root = tempfile.mkdtemp(prefix='kmz_batch_')
+    results = {p: {'path': p, 'placemarks': 0, 'seconds': 0.0, 'units': 0, 'error': None} for p in kmz_paths}
+    parts = {p: [] for p in kmz_paths}
+    started = time.perf_counter()
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = {}  # future -> kmz path
+            if split_folders:
+                plans = {}
+                for i, path in enumerate(kmz_paths):
+                    work_dir = os.path.join(work_root, str(i))
+                    os.makedirs(work_dir)
+                    plans[pool.submit(plan_file_job, path, work_dir)] = (path, work_dir)
+
+                for future in concurrent.futures.as_completed(plans):
+                    path, work_dir = plans[future]
+                    try:
+                        file_plans, seconds = future.result()
+                    except Exception as e:
+                        results[path]['error'] = str(e)
+                        continue
+                    results[path]['seconds'] += seconds
+                    for k, plan in enumerate(file_plans):
+                        results[path]['units'] += len(plan['units'])
+                        deferred_paths = []
+                        for u in range(len(plan['units'])):
+                            part_path = os.path.join(work_dir, f'part-{k:03d}-{u:05d}.csv')
+                            deferred_path = os.path.join(work_dir, f'deferred-{k:03d}-{u:05d}.csv')
+                            parts[path].append(part_path)
+                            deferred_paths.append(deferred_path)
+                            jobs[pool.submit(convert_unit_job, plan['kml_path'], plan, u, part_path,
+                                             deferred_path)] = path
+                        parts[path].extend(deferred_paths)
+            else:
+                for i, path in enumerate(kmz_paths):
+                    part_path = os.path.join(work_root, f'part-{i:05d}.csv')
+                    parts[path].append(part_path)
+                    results[path]['units'] = 1
+                    jobs[pool.submit(convert_file_job, path, part_path)] = path
+
+            for future in concurrent.futures.as_completed(jobs):
+                path = jobs[future]
+                try:
+                    count, seconds = future.result()
+                except Exception as e:
+                    results[path]['error'] = str(e)
+                    continue
+                results[path]['placemarks'] += count
+                results[path]['seconds'] += seconds
+
+        ok = [p for p in kmz_paths if not results[p]['error']]
+        if output_csv:
+            _merge_parts([part for p in ok for part in parts[p]], output_csv)
+        else:
+            for p in ok:
+                out_path = os.path.join(output_dir, os.path.splitext(os.path.basename(p))[0] + '.csv')
+                _merge_parts(parts[p], out_path)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    for p in kmz_paths:
+        r = results[p]
+        if r['error']:
+            print(f"{os.path.basename(p)}: error: {r['error']}")
+        else:
+            rate = r['placemarks'] / r['seconds'] if r['seconds'] else 0
+            print(f"{os.path.basename(p)}: {r['placemarks']} placemarks, {r['units']} units, "
+                  f"{r['seconds']:.2f}s worker time ({rate:.0f} placemarks/s)")
+
+    total = sum(r['placemarks'] for r in results.values())
+    print(f"Converted {total} placemarks from {len(kmz_paths)} files in {time.perf_counter() - started:.2f}s")
+    return [results[p] for p in kmz_paths]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert many KMZ files to CSV in parallel.")
+    parser.add_argument('inputs', nargs='+', help="KMZ files, directories or glob patterns")
+    out = parser.add_mutually_exclusive_group(required=True)
+    out.add_argument('-o', '--output', help="Merged CSV path")
+    out.add_argument('--output-dir', help="Write one CSV per input into this directory")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--split-folders', action='store_true', help="Also split each KMZ by top-level Folder")
+    args = parser.parse_args()
+
+    kmz_files = find_kmz_files(args.inputs)
+    if not kmz_files:
+        print("Error: No KMZ files found.")
+    else:
+        batch_convert(kmz_files, output_csv=args.output, output_dir=args.output_dir,
+                      workers=args.workers, split_folders=args.split_folders)
@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from conversion_metrics import peak_rss_mb
+from synthetic_kmz import write_synthetic_kmz
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+TOOLS = ('convert_kmz_to_csv', 'inspect_kml_fields', 'inspect_kml_structure', 'analyze_styles')
+
+def run_tool(tool, kmz_path, csv_path):
+    """Runs one tool in this process with its output discarded. Returns wall time and peak RSS."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if tool == 'convert_kmz_to_csv':
+            from convert_kmz_to_csv import convert_kmz_to_csv
+            convert_kmz_to_csv(kmz_path, csv_path, streaming=True)
+        elif tool == 'inspect_kml_fields':
+            from inspect_kml_fields import inspect_kml_fields
+            inspect_kml_fields(kmz_path)
+        elif tool == 'inspect_kml_structure':
+            from inspect_kml_structure import inspect_kml_structure
+            inspect_kml_structure(kmz_path)
+        elif tool == 'analyze_styles':
+            from analyze_styles import analyze_styles
+            analyze_styles(csv_path)
+        else:
+            raise ValueError(f"Unknown tool: {tool}")
+    return {'wall_s': time.perf_counter() - started, 'peak_rss_mb': peak_rss_mb()}
+
+def _measure(tool, kmz_path, csv_path, index_dir):
+    """
+    Runs a tool in a fresh interpreter, so peak RSS is its own. The KMZ index
+    directory is fresh per run too, so inspection timings include the scan.
+    """
+    env = dict(os.environ, KMZ_INDEX_DIR=index_dir)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-tool', tool, kmz_path, csv_path],
+                         env=env, cwd=script_dir, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def run_benchmarks(scales=('1k', '100k'), tools=TOOLS, work_dir=None, repeat=1, seed=0):
+    """
+    Generates a synthetic KMZ per scale and times each tool on it.
+    analyze_styles reads the CSV written by convert_kmz_to_csv, so it needs
+    that tool in the same run. Returns the results dict (see write_results).
+    """
+    tools = [t for t in TOOLS if t in tools]
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        for scale in scales:
+            n = SCALES[scale]
+            kmz_path = os.path.join(tmp, f'synthetic_{scale}.kmz')
+            csv_path = os.path.join(tmp, f'synthetic_{scale}.csv')
+            started = time.perf_counter()
+            write_synthetic_kmz(kmz_path, placemarks=n, seed=seed)
+            print(f"{scale}: generated {n} placemarks ({os.path.getsize(kmz_path) / 1e6:.1f} MB) "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+            for tool in tools:
+                if tool == 'analyze_styles' and not os.path.exists(csv_path):
+                    print(f"{scale}: skipping analyze_styles, no converted CSV")
+                    continue
+                for attempt in range(repeat):
+                    with tempfile.TemporaryDirectory(dir=tmp) as index_dir:
+                        measured = _measure(tool, kmz_path, csv_path, index_dir)
+                    run = {
+                        'tool': tool,
+                        'scale': scale,
+                        'placemarks': n,
+                        'repeat': attempt,
+                        'wall_s': round(measured['wall_s'], 4),
+                        'placemarks_per_s': round(n / measured['wall_s'], 1),
+                        'peak_rss_mb': round(measured['peak_rss_mb'], 1),
+                    }
+                    results['runs'].append(run)
+                    print(f"  {tool:<24} {run['wall_s']:>9.2f}s {run['placemarks_per_s']:>12.0f}/s "
+                          f"{run['peak_rss_mb']:>8.1f} MB")
+    return results
+
+def _find_based_row(element, ns):
+    """Field lookups as build_placemark_row did them before kml_parser: one find() path per field."""
+    name = element.find('kml:name', ns) if ns else element.find('name')
+    desc = element.find('kml:description', ns) if ns else element.find('description')
+    point = element.find('.//kml:Point', ns) if ns else element.find('.//Point')
+    coords = None
+    if point is not None:
+        coords = point.find('kml:coordinates', ns) if ns else point.find('coordinates')
+    style = element.find('kml:styleUrl', ns) if ns else element.find('styleUrl')
+    return name, desc, coords, style
+
+def placemark_costs(placemarks=20000, seed=0, work_dir=None, repeat=3):
+    """
+    Per-placemark cost in microseconds, for every available kml_parser
+    backend: field extraction with find() paths (the old way) and with
+    precomputed tags (build_placemark_row), both on an already parsed
+    tree, and a full streaming conversion (iter_placemark_rows).
+    The best of repeat runs is kept.
+    """
+    import kml_parser
+    from convert_kmz_to_csv import build_placemark_row, iter_placemark_rows
+    from kmz_archive import open_kml
+    from kmz_index import detect_namespace
+
+    def best_us(fn):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        return round(min(times) / placemarks * 1e6, 2)
+
+    results = {'placemarks': placemarks, 'backends': {}}
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        kmz_path = os.path.join(tmp, 'placemarks.kmz')
+        write_synthetic_kmz(kmz_path, placemarks=placemarks, seed=seed)
+        for backend in kml_parser.BACKENDS:
+            try:
+                kml_parser.select_backend(backend)
+            except ImportError:
+                continue
+            with open_kml(kmz_path) as kml_file:
+                root = kml_parser.parse(kml_file)
+            ns = detect_namespace(root)
+            elements = list(root.iter(kml_parser.tags_for(ns).Placemark))
+
+            def stream():
+                with open_kml(kmz_path) as kml_file:
+                    for _ in iter_placemark_rows(kml_file):
+                        pass
+
+            results['backends'][backend] = {
+                'find_paths_us': best_us(lambda: [_find_based_row(e, ns) for e in elements]),
+                'tags_us': best_us(lambda: [build_placemark_row(e, '', ns) for e in elements]),
+                'streaming_us': best_us(stream),
+            }
+        kml_parser.select_backend()
+    return results
+
+def print_placemark_costs(results):
+    print(f"Per-placemark cost over {results['placemarks']} placemarks (microseconds)")
+    print(f"{'Backend':<8} | {'find() paths':>12} | {'tags':>8} | {'streaming':>10}")
+    print("-" * 48)
+    for backend, costs in results['backends'].items():
+        print(f"{backend:<8} | {costs['find_paths_us']:>12.2f} | {costs['tags_us']:>8.2f} | "
+              f"{costs['streaming_us']:>10.2f}")
+
+def write_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+def compare_results(baseline_path, results, threshold=0.1):
+    """
+    Prints the change in wall time and peak RSS against a previous results
+    file for every (tool, scale) in both. Returns the runs slower than
+    baseline by more than threshold (a fraction).
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def best(runs):
+        by_key = {}
+        for run in runs:
+            key = (run['tool'], run['scale'])
+            if key not in by_key or run['wall_s'] < by_key[key]['wall_s']:
+                by_key[key] = run
+        return by_key
+
+    old = best(baseline['runs'])
+    new = best(results['runs'])
+    regressions = []
+    print(f"{'Tool':<24} | {'Scale':<5} | {'Wall':>16} | {'Peak RSS':>18}")
+    print("-" * 74)
+    for key in sorted(set(old) & set(new)):
+        o, n = old[key], new[key]
+        wall_change = n['wall_s'] / o['wall_s'] - 1
+        rss_change = n['peak_rss_mb'] / o['peak_rss_mb'] - 1
+        print(f"{key[0]:<24} | {key[1]:<5} | {n['wall_s']:>8.2f}s {wall_change:>+6.0%} | "
+              f"{n['peak_rss_mb']:>8.1f} MB {rss_change:>+6.0%}")
+        if wall_change > threshold:
+            regressions.append(n)
+    return regressions
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--run-tool':
+        # Worker mode used by _measure
+        print(json.dumps(run_tool(*sys.argv[2:5])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark the KMZ scripts on synthetic data.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1k', '100k'])
+    parser.add_argument('--tools', nargs='+', choices=list(TOOLS), default=list(TOOLS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', help="Where to write the synthetic KMZs (default: system temp)")
+    parser.add_argument('-o', '--output', default="benchmark_results.json", help="Results JSON path")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown fraction reported as a regression")
+    parser.add_argument('--placemark-cost', type=int, metavar='N',
+                        help="Only measure per-placemark parsing cost per XML backend on N placemarks")
+    args = parser.parse_args()
+
+    if args.placemark_cost:
+        costs = placemark_costs(args.placemark_cost, args.seed, args.work_dir)
+        print_placemark_costs(costs)
+        write_results(costs, args.output)
+        print(f"Results written to {args.output}")
+        sys.exit(0)
+
+    results = run_benchmarks(args.scales, args.tools, args.work_dir, args.repeat, args.seed)
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
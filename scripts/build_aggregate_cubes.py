@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from output_sinks import _require_pyarrow, read_rows
+from tree_spatial import to_float, wgs84_to_itm
+
+# Category columns of the cubes. fruit_type falls back to attributes-species
+# (normalize_tree_records copies fruit_type there)
+CUBE_DIMENSIONS = ('muni_name', 'fruit_type', 'legitimacy', 'meta-source-type')
+# ITM grid cell sizes in meters; 0 is the level without a grid (per municipality/category)
+RESOLUTIONS = (0, 100, 1000, 10000)
+CUBE_VERSION = 1
+# Parquet schema metadata key holding the manifest of aggregated source files
+MANIFEST_KEY = b'aggregate_cubes'
+
+def _header(path):
+    first = next(read_rows(path), None)
+    return list(first or {})
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_source(path):
+    """ITM coordinates, canopy area and category values of every row of one source file."""
+    if path.lower().endswith('.kmz'):
+        from convert_kmz_to_csv import iter_kmz_rows
+        rows = iter_kmz_rows(path)
+    else:
+        wanted = ['location-x-il', 'location-y-il', 'location-x', 'location-y', 'longitude', 'latitude',
+                  'attributes-canopy-area', 'attributes-species', *CUBE_DIMENSIONS]
+        header = _header(path)
+        rows = read_rows(path, [c for c in wanted if c in header])
+
+    xs, ys, lon, lat, canopy = [], [], [], [], []
+    dims = {d: [] for d in CUBE_DIMENSIONS}
+    for row in rows:
+        xs.append(row.get('location-x-il'))
+        ys.append(row.get('location-y-il'))
+        lon.append(row.get('location-x') or row.get('longitude'))
+        lat.append(row.get('location-y') or row.get('latitude'))
+        canopy.append(row.get('attributes-canopy-area'))
+        for d in CUBE_DIMENSIONS:
+            dims[d].append(row.get(d) or '')
+        if not dims['fruit_type'][-1]:
+            dims['fruit_type'][-1] = row.get('attributes-species') or ''
+
+    x, y = to_float(xs), to_float(ys)
+    missing = np.isnan(x) | np.isnan(y)
+    if missing.any():
+        x[missing], y[missing] = wgs84_to_itm(to_float(lon)[missing], to_float(lat)[missing])
+    return x, y, to_float(canopy), dims
+
+def aggregate_source(path, source, resolutions=RESOLUTIONS):
+    """
+    Aggregates one source file into cube rows: for each resolution, one
+    row per (grid cell, category combination) with the tree count, the
+    summed canopy area and the number of trees with a canopy area.
+    Rows without coordinates only count at resolution 0.
+    Returns a pyarrow Table.
+    """
+    pa = _require_pyarrow()
+    x, y, canopy, dims = _read_source(path)
+    codes, labels = [], []
+    for d in CUBE_DIMENSIONS:
+        values, inverse = np.unique(np.array(dims[d], dtype=str), return_inverse=True)
+        codes.append(inverse.astype(np.int64))
+        labels.append(values)
+    has_canopy = ~np.isnan(canopy)
+    canopy = np.where(has_canopy, canopy, 0.0)
+    located = ~(np.isnan(x) | np.isnan(y))
+
+    columns = {name: [] for name in ('resolution', 'cell_x', 'cell_y', *CUBE_DIMENSIONS,
+                                     'count', 'canopy_area', 'canopy_trees')}
+    for resolution in resolutions:
+        rows = np.flatnonzero(located) if resolution else np.arange(len(x))
+        if not rows.size:
+            continue
+        if resolution:
+            cx = np.floor(x[rows] / resolution).astype(np.int64)
+            cy = np.floor(y[rows] / resolution).astype(np.int64)
+        else:
+            cx = cy = np.zeros(rows.size, dtype=np.int64)
+
+        # One mixed-radix int64 key per row over (cell, categories), or the
+        # stacked parts as rows when the key space does not fit in an int64
+        parts = (cx - cx.min(), cy - cy.min(), *(c[rows] for c in codes))
+        if math.prod(int(part.max()) + 1 for part in parts) < 2 ** 63:
+            key = np.zeros(rows.size, dtype=np.int64)
+            for part in parts:
+                key = key * (int(part.max()) + 1) + part
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        else:
+            _, first, inverse = np.unique(np.column_stack(parts), axis=0, return_index=True,
+                                          return_inverse=True)
+            inverse = inverse.reshape(-1)
+        n = len(first)
+        columns['resolution'].append(np.full(n, resolution, dtype=np.int32))
+        cell = [cx[first] * resolution, cy[first] * resolution] if resolution else [None, None]
+        for name, values in zip(('cell_x', 'cell_y'), cell):
+            columns[name].append(pa.array(values, type=pa.int64()) if values is not None
+                                 else pa.nulls(n, type=pa.int64()))
+        for d, c, values in zip(CUBE_DIMENSIONS, codes, labels):
+            columns[d].append(values[c[rows][first]])
+        columns['count'].append(np.bincount(inverse, minlength=n).astype(np.int64))
+        columns['canopy_area'].append(np.bincount(inverse, weights=canopy[rows], minlength=n))
+        columns['canopy_trees'].append(np.bincount(inverse, weights=has_canopy[rows], minlength=n).astype(np.int64))
+
+    arrays = {'source': pa.array([source] * sum(len(c) for c in columns['count']), type=pa.string())}
+    for name, parts in columns.items():
+        chunks = [p if isinstance(p, pa.Array) else pa.array(p) for p in parts]
+        arrays[name] = pa.concat_arrays(chunks) if chunks else pa.array([], type=pa.int64())
+    for d in CUBE_DIMENSIONS:
+        arrays[d] = arrays[d].cast(pa.string())
+    return pa.table(arrays)
+
+def _load_cube(cube_path, resolutions):
+    """Existing cube table and manifest, or (None, empty manifest) if absent or built with other resolutions."""
+    empty = {'version': CUBE_VERSION, 'resolutions': list(resolutions), 'sources': {}}
+    if not os.path.exists(cube_path):
+        return None, empty
+    import pyarrow.parquet as pq
+    table = pq.read_table(cube_path)
+    manifest = json.loads((table.schema.metadata or {}).get(MANIFEST_KEY, b'{}'))
+    if manifest.get('version') != CUBE_VERSION or manifest.get('resolutions') != list(resolutions):
+        return None, empty
+    return table, manifest
+
+def build_aggregate_cubes(input_paths, cube_path, resolutions=RESOLUTIONS, rebuild=False):
+    """
+    Writes pre-aggregated cubes of tree records, converter outputs or KMZs
+    into one Parquet file: tree counts and canopy area by source,
+    municipality, fruit_type, legitimacy and meta-source-type, per ITM grid
+    cell at each resolution (0 = no grid).
+
+    The file's metadata records the size, mtime and SHA-256 of every source
+    aggregated into it. On the next run only sources that changed are
+    re-read; the rows of unchanged ones are copied from the existing cube,
+    and sources no longer listed are dropped. Returns the manifest.
+    """
+    if not input_paths:
+        print("Error: No source files given")
+        return None
+    for path in input_paths:
+        if not os.path.exists(path):
+            print(f"Error: File not found: {path}")
+            return None
+    sources = [os.path.basename(p) for p in input_paths]
+    if len(set(sources)) != len(sources):
+        print("Error: Source files must have distinct file names")
+        return None
+
+    pa = _require_pyarrow()
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    started = time.perf_counter()
+    old_table, old_manifest = _load_cube(cube_path, resolutions) if not rebuild else (None, {'sources': {}})
+    manifest = {'version': CUBE_VERSION, 'resolutions': list(resolutions), 'sources': {}}
+    kept, tables = [], []
+    for path, source in zip(input_paths, sources):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        previous = old_manifest['sources'].get(key) if old_table is not None else None
+        entry = {'source': source, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if previous and previous['source'] == source and previous['size'] == stat.st_size:
+            entry['sha256'] = previous['sha256'] if previous['mtime'] == stat.st_mtime else _file_sha256(path)
+            if entry['sha256'] == previous['sha256']:
+                entry['rows'] = previous['rows']
+                manifest['sources'][key] = entry
+                kept.append(source)
+                continue
+        entry.setdefault('sha256', _file_sha256(path))
+
+        source_started = time.perf_counter()
+        table = aggregate_source(path, source, resolutions)
+        entry['rows'] = int(pc.sum(pc.filter(table['count'], pc.equal(table['resolution'], 0))).as_py() or 0)
+        manifest['sources'][key] = entry
+        tables.append(table)
+        print(f"  {source}: {entry['rows']} trees -> {table.num_rows} cube rows "
+              f"in {time.perf_counter() - source_started:.1f}s")
+
+    if kept:
+        print(f"  {len(kept)} unchanged source(s) reused: {', '.join(kept)}")
+        reused = old_table.filter(pc.is_in(old_table['source'], value_set=pa.array(kept)))
+        tables.insert(0, reused.replace_schema_metadata(None))
+
+    table = pa.concat_tables(tables, promote_options='permissive').sort_by(
+        [('resolution', 'ascending'), ('muni_name', 'ascending'), ('source', 'ascending')])
+    table = table.replace_schema_metadata({MANIFEST_KEY: json.dumps(manifest, ensure_ascii=False).encode('utf-8')})
+
+    tmp_path = cube_path + '.tmp'
+    # Row groups never span two resolutions, so a query on one level skips the others by statistics
+    with pq.ParquetWriter(tmp_path, table.schema, compression='zstd') as writer:
+        for resolution in resolutions:
+            writer.write_table(table.filter(pc.equal(table['resolution'], resolution)), row_group_size=64 * 1024)
+    os.replace(tmp_path, cube_path)
+
+    elapsed = time.perf_counter() - started
+    trees = sum(e['rows'] for e in manifest['sources'].values())
+    print(f"Wrote {table.num_rows} cube rows for {trees} trees from {len(sources)} source(s) to {cube_path} "
+          f"({os.path.getsize(cube_path) / 1024:.0f} KB) in {elapsed:.1f}s")
+    return manifest
+
+def query_cube(cube_path, group_by=('muni_name',), resolution=0, where=None):
+    """
+    Sums a cube file over everything but group_by at one resolution, reading
+    only the columns needed. where maps columns to required values.
+    Returns a pyarrow Table sorted by count, descending.
+    """
+    import pyarrow.parquet as pq
+    filters = [('resolution', '=', resolution)] + [(c, '=', v) for c, v in (where or {}).items()]
+    columns = list(dict.fromkeys([*group_by, 'count', 'canopy_area', 'canopy_trees']))
+    table = pq.read_table(cube_path, columns=columns, filters=filters)
+    result = table.group_by(list(group_by)).aggregate(
+        [('count', 'sum'), ('canopy_area', 'sum'), ('canopy_trees', 'sum')])
+    return result.sort_by([('count_sum', 'descending')])
+
+def _parse_where(pairs):
+    where = {}
+    for pair in pairs or []:
+        column, _, value = pair.partition('=')
+        where[column] = value
+    return where
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query pre-aggregated tree count/canopy cubes.")
+    parser.add_argument('inputs', nargs='*',
+                        help="Tree records, converter outputs or KMZs (CSV/Parquet/Arrow/KMZ). Sources of the "
+                             "cube left off are dropped from it, so to refresh one file pass every input again")
+    parser.add_argument('-o', '--output', default="tree_cubes.parquet", help="Cube file (Parquet)")
+    parser.add_argument('--resolutions', type=int, nargs='*', default=list(RESOLUTIONS),
+                        help="ITM grid cell sizes in meters (0 = no grid)")
+    parser.add_argument('--rebuild', action='store_true', help="Re-aggregate every source")
+    parser.add_argument('--query', nargs='*', metavar='COLUMN',
+                        help="Print totals of an existing cube grouped by these columns")
+    parser.add_argument('--resolution', type=int, default=0, help="Grid level for --query")
+    parser.add_argument('--where', nargs='*', metavar='COLUMN=VALUE', help="Filters for --query")
+    parser.add_argument('--limit', type=int, default=20, help="Rows printed by --query")
+    args = parser.parse_args()
+
+    if args.query is not None:
+        if not os.path.exists(args.output):
+            print(f"Error: File not found: {args.output}")
+        else:
+            result = query_cube(args.output, args.query or ['muni_name'], args.resolution, _parse_where(args.where))
+            for row in result.slice(0, args.limit).to_pylist():
+                print(' | '.join(f"{v:.1f}" if isinstance(v, float) else str(v) for v in row.values()))
+            print(f"({result.num_rows} groups)")
+    elif not args.inputs:
+        parser.error("no input files")
+    else:
+        build_aggregate_cubes(args.inputs, args.output, tuple(sorted(set(args.resolutions))), args.rebuild)
@@ -0,0 +1,117 @@
+import json
+import os
+
+from kml_parser import tostring
+
+CHECKPOINT_VERSION = 1
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+class Quarantine:
+    """
+    JSON-lines file of Placemarks that failed to convert.
+
+    Each line holds the KML entry, the layer, the error and the Placemark's
+    XML, so the rows can be inspected or fixed and converted on their own.
+    resume_at truncates the file to a checkpointed byte position and appends
+    after it; count is the number of placemarks quarantined before it.
+    """
+
+    def __init__(self, path, resume_at=None, count=0):
+        self.path = path
+        self.kml_filename = None
+        self.count = count
+        if resume_at is None:
+            self._f = open(path, 'w', encoding='utf-8')
+        else:
+            self._f = open(path, 'a+', encoding='utf-8')
+            self._f.truncate(resume_at)
+            self._f.seek(resume_at)
+
+    def add(self, element, error, layer=None):
+        record = {
+            'kml': self.kml_filename,
+            'layer': layer,
+            'error': f"{type(error).__name__}: {error}",
+            'placemark': tostring(element),
+        }
+        self._f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def flush(self):
+        """Flushes to disk and returns the byte position written so far."""
+        _fsync(self._f)
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ConversionCheckpoint:
+    """
+    Resume point of a conversion, kept as a small JSON file next to the output.
+
+    A checkpoint records the KML entry being converted, the number of its
+    placemarks already handled (written or quarantined, in the order the
+    reader emits them), and the byte positions the output and quarantine
+    files were flushed to at that moment. It is written atomically after
+    both files are fsynced, so whatever is past those positions on disk can
+    be truncated away on resume.
+
+    key describes the run (input file, output, columns, reader mode); a
+    checkpoint whose key differs is ignored.
+    """
+
+    def __init__(self, path, key, every=50000):
+        self.path = path
+        self.key = dict(key, version=CHECKPOINT_VERSION)
+        self.every = every
+        self._next = every
+
+    def load(self):
+        """Returns the saved state if it belongs to this run, else None."""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except ValueError:
+            return None
+        if state.get('key') != json.loads(json.dumps(self.key)):
+            return None
+        return state
+
+    def due(self, handled):
+        """True once every `every` placemarks."""
+        if handled < self._next:
+            return False
+        self._next = handled + self.every
+        return True
+
+    def save(self, entry, ordinal, rows, output_bytes, quarantine=None, unmapped=None):
+        state = {
+            'key': self.key,
+            'entry': entry,
+            'ordinal': ordinal,
+            'rows': rows,
+            'output_bytes': output_bytes,
+            'quarantine_bytes': quarantine.flush() if quarantine else None,
+            'quarantined': quarantine.count if quarantine else 0,
+            'unmapped': dict(unmapped or {}),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            _fsync(f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
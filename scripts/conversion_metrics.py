@@ -0,0 +1,172 @@
+import contextlib
+import json
+import resource
+import sys
+import time
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory in MB."""
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class _TimedReader:
+    """File object wrapper that books read() time to the 'inflate' phase (zip decompression)."""
+
+    def __init__(self, f, metrics):
+        self._f = f
+        self._metrics = metrics
+
+    def read(self, size=-1):
+        with self._metrics.phase('inflate'):
+            return self._f.read(size)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+class _TimedSink:
+    """Sink wrapper that books write() time to the 'write' phase and counts placemarks."""
+
+    def __init__(self, sink, metrics):
+        self._sink = sink
+        self._metrics = metrics
+
+    def write(self, row):
+        with self._metrics.phase('write'):
+            self._sink.write(row)
+        self._metrics.count()
+
+    def __getattr__(self, name):
+        return getattr(self._sink, name)
+
+class ConversionMetrics:
+    """
+    Opt-in instrumentation for a conversion run.
+
+    Phase times are exclusive: time spent in a nested phase (e.g. 'inflate'
+    while 'parse' reads the KML) is booked to the nested phase only, so the
+    phases add up to the instrumented wall time. Progress lines go to
+    stream every progress_interval seconds. profile=True runs cProfile and
+    trace_memory=True runs tracemalloc over the run; both slow it down.
+    """
+
+    def __init__(self, progress_interval=10.0, profile=False, trace_memory=False, stream=None, label='convert'):
+        self.progress_interval = progress_interval
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stream = stream if stream is not None else sys.stderr
+        self.label = label
+        self.phases = {}
+        self.placemarks = 0
+        self.info = {}
+        self._stack = []  # [name, started, nested time] of open phases
+        self._profiler = None
+        self._started = None
+        self._finished = None
+        self._last_progress = None
+        self._tracemalloc = None
+
+    def start(self):
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start(10)
+        if self.profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = self._last_progress = time.perf_counter()
+        return self
+
+    def stop(self):
+        self._finished = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.trace_memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            tracemalloc.stop()
+            self._tracemalloc = {
+                'current_mb': current / 1e6,
+                'peak_mb': peak / 1e6,
+                'top': [{'where': str(stat.traceback), 'size_mb': stat.size / 1e6, 'count': stat.count} for stat in top],
+            }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def reader(self, f):
+        return _TimedReader(f, self)
+
+    def sink(self, writer):
+        return _TimedSink(writer, self)
+
+    def timed_rows(self, rows, name='parse'):
+        """Yields from a row iterator, booking the time spent producing each row to phase name."""
+        rows = iter(rows)
+        while True:
+            with self.phase(name):
+                row = next(rows, None)
+            if row is None:
+                return
+            yield row
+
+    def count(self, n=1):
+        self.placemarks += n
+        if self.placemarks % 1000 == 0:
+            now = time.perf_counter()
+            if now - self._last_progress >= self.progress_interval:
+                self._last_progress = now
+                self.progress(now)
+
+    def progress(self, now=None):
+        elapsed = (now or time.perf_counter()) - self._started
+        rate = self.placemarks / elapsed if elapsed else 0.0
+        print(f"[{self.label}] {self.placemarks} placemarks in {elapsed:.1f}s ({rate:.0f}/s), "
+              f"peak RSS {peak_rss_mb():.1f} MB", file=self.stream, flush=True)
+
+    def report(self):
+        wall = (self._finished or time.perf_counter()) - self._started
+        report = dict(self.info)
+        report.update({
+            'placemarks': self.placemarks,
+            'wall_s': round(wall, 4),
+            'placemarks_per_s': round(self.placemarks / wall, 1) if wall else None,
+            'phases_s': {name: round(t, 4) for name, t in sorted(self.phases.items(), key=lambda p: -p[1])},
+            'unaccounted_s': round(wall - sum(self.phases.values()), 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        })
+        if self._tracemalloc is not None:
+            report['tracemalloc'] = self._tracemalloc
+        if self._profiler is not None:
+            import io
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(25)
+            report['profile'] = out.getvalue().splitlines()
+        return report
+
+    def dump_profile(self, path):
+        """Writes the cProfile data (for snakeviz, pstats, etc.)."""
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
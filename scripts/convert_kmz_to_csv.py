@@ -1,7 +1,17 @@
 import zipfile
-import csv
-import xml.etree.ElementTree as ET
 import os
+import json
+import tempfile
+import collections
+import contextlib
+
+from conversion_checkpoint import ConversionCheckpoint, Quarantine
+from extended_data import ExtendedDataColumns, field_types, merge_types
+import kml_parser
+from kml_parser import first_child, first_descendant, tags_for
+from kmz_archive import kml_names, open_kml
+from kmz_index import cached_index, detect_namespace, scan_extended_data, style_maps_to_normal
+from output_sinks import is_columnar, open_sink
 
 def clean_text(text):
     if not text:
@@ -97,173 +107,675 @@ STYLE_MAPPING = {
     '#icon-962-009D57': {'fruit': 'Olive/Pomegranate/Fig', 'legitimacy': 'Legitimate'},
 }
 
-def convert_kmz_to_csv(kmz_path, csv_path):
+FIELDNAMES = ['name', 'description', 'longitude', 'latitude', 'layer', 'icon', 'color', 'style_url', 'fruit_type', 'legitimacy']
+
+def _style_text(elem):
+    """Stripped text of a style element, None if empty (as kmz_index stores it)."""
+    if elem is None:
+        return None
+    return (elem.text or '').strip() or None
+
+def parse_style(style, ns):
+    """Returns the IconStyle color and icon href of a Style element."""
+    tags = tags_for(ns)
+    icon_style = first_descendant(style, tags.IconStyle)
+    color = None
+    icon_href = None
+
+    if icon_style is not None:
+        color = _style_text(first_child(icon_style, tags.color))
+        icon_href = _style_text(first_descendant(icon_style, tags.href))
+
+    return {'color': color, 'icon': icon_href}
+
+def parse_style_map(sm, ns):
+    """Returns the style id of the 'normal' pair of a StyleMap element, or None."""
+    tags = tags_for(ns)
+    for pair in sm:
+        if pair.tag != tags.Pair:
+            continue
+        if _style_text(first_child(pair, tags.key)) == 'normal':
+            url = _style_text(first_child(pair, tags.styleUrl))
+            return url.strip('#') if url else None
+    return None
+
+def build_placemark_row(element, layer, ns):
+    """
+    Extracts a CSV row from a Placemark element.
+    Color, icon, fruit type and legitimacy are left empty; see StyleClassifier.
+    """
+    data = {
+        'name': '',
+        'description': '',
+        'longitude': '',
+        'latitude': '',
+        'layer': clean_text(layer),
+        'icon': '',
+        'color': '',
+        'style_url': '',
+        'fruit_type': '',
+        'legitimacy': ''
+    }
+
+    # Name, description and style are direct children; the first of each counts
+    tags = tags_for(ns)
+    name_elem = desc_elem = style_url_elem = None
+    for child in element:
+        tag = child.tag
+        if tag == tags.name:
+            if name_elem is None:
+                name_elem = child
+        elif tag == tags.description:
+            if desc_elem is None:
+                desc_elem = child
+        elif tag == tags.styleUrl:
+            if style_url_elem is None:
+                style_url_elem = child
+
+    if name_elem is not None:
+        data['name'] = clean_text(name_elem.text)
+    if desc_elem is not None:
+        data['description'] = clean_text(desc_elem.text)
+
+    # Coordinates (the Point may be nested in a MultiGeometry)
+    point_elem = first_descendant(element, tags.Point)
+    if point_elem is not None:
+        coords_elem = first_child(point_elem, tags.coordinates)
+        if coords_elem is not None and coords_elem.text:
+            coords = coords_elem.text.strip().split(',')
+            if len(coords) >= 2:
+                data['longitude'] = coords[0]
+                data['latitude'] = coords[1]
+
+    # Style
+    if style_url_elem is not None and style_url_elem.text:
+        raw_style_url = style_url_elem.text.strip()
+        data['style_url'] = raw_style_url
+
+    return data
+
+def resolve_style_ref(style_ref, styles, style_maps):
+    """Follows StyleMaps from a style id to its normal Style. Returns the Style dict or None."""
+    seen = set()
+    while style_ref not in styles:
+        if style_ref in seen or style_ref not in style_maps:
+            return None
+        seen.add(style_ref)
+        style_ref = style_maps[style_ref]
+    return styles[style_ref]
+
+class StyleClassifier:
+    """
+    styleUrl -> (color, icon, fruit_type, legitimacy) table, built once per document.
+
+    Each Style and StyleMap id is resolved through its StyleMap chain to the
+    final normal Style. Fruit type and legitimacy come from STYLE_MAPPING by
+    id first; a Style used as the normal style of a mapped StyleMap inherits
+    its entry. Styles still unmapped fall back to the mapping shared by
+    every mapped style with the same icon href and color, then the same icon
+    href alone. Classifying a placemark is then a single dict lookup, and
+    placemarks left without a fruit type are counted in unmapped.
+    """
+
+    def __init__(self, styles, style_maps, unmapped=None):
+        self.unmapped = unmapped if unmapped is not None else collections.Counter()
+        self.table = {}
+
+        ids = set(styles) | set(style_maps)
+        resolved = {i: resolve_style_ref(i, styles, style_maps) for i in ids}
+
+        mapped = {url[1:]: m for url, m in STYLE_MAPPING.items()}
+        for sm_id, normal in style_maps.items():
+            if sm_id in mapped and normal not in mapped:
+                mapped[normal] = mapped[sm_id]
+
+        by_signature = collections.defaultdict(set)
+        by_icon = collections.defaultdict(set)
+        for i, m in mapped.items():
+            s = resolved.get(i)
+            if s is not None:
+                by_signature[(s['icon'], s['color'])].add((m['fruit'], m['legitimacy']))
+                by_icon[s['icon']].add((m['fruit'], m['legitimacy']))
+
+        for i in ids:
+            s = resolved[i] or {'color': None, 'icon': None}
+            if i in mapped:
+                fruit, legitimacy = mapped[i]['fruit'], mapped[i]['legitimacy']
+            elif resolved[i] is not None and len(by_signature.get((s['icon'], s['color']), ())) == 1:
+                fruit, legitimacy = next(iter(by_signature[(s['icon'], s['color'])]))
+            elif resolved[i] is not None and s['icon'] and len(by_icon.get(s['icon'], ())) == 1:
+                fruit, legitimacy = next(iter(by_icon[s['icon']]))
+            else:
+                fruit, legitimacy = '', ''
+
+            self.table['#' + i] = {
+                'color': s['color'] or '',
+                'icon': s['icon'] or '',
+                'fruit_type': fruit,
+                'legitimacy': legitimacy,
+            } if resolved[i] is not None else None
+
+    def apply(self, data, final=True):
+        """
+        Fills color, icon, fruit_type and legitimacy of a row.
+        Returns False, leaving the row untouched, if the style is not defined
+        in the document (yet) and final is False.
+        """
+        style_url = data['style_url']
+        entry = self.table.get(style_url)
+        if entry is None:
+            if not final:
+                return False
+            mapping = STYLE_MAPPING.get(style_url)
+            entry = {
+                'color': '',
+                'icon': '',
+                'fruit_type': mapping['fruit'] if mapping else '',
+                'legitimacy': mapping['legitimacy'] if mapping else '',
+            }
+        data.update(entry)
+        if style_url and not entry['fruit_type']:
+            self.unmapped[style_url] += 1
+        return True
+
+def print_unmapped_summary(unmapped):
+    """Prints style ids whose placemarks got no fruit type, most frequent first."""
+    if not unmapped:
+        return
+    print(f"Unmapped styles: {sum(unmapped.values())} placemarks across {len(unmapped)} style ids")
+    for style_url, count in unmapped.most_common():
+        print(f"  {style_url:<30} {count}")
+
+def print_malformed_summary(malformed):
+    """Prints the layers of placemarks written without geometry because their coordinates did not parse."""
+    if not malformed:
+        return
+    print(f"Malformed geometries: {sum(malformed.values())} placemarks written without geometry")
+    for layer, count in malformed.most_common():
+        print(f"  {layer or 'Unknown Layer':<30} {count}")
+
+def print_rejected_summary(rejected):
+    """Prints ExtendedData columns whose values did not fit the column type and were written empty."""
+    if not rejected:
+        return
+    print(f"ExtendedData values not matching their column type: {sum(rejected.values())} written empty")
+    for column, count in rejected.most_common():
+        print(f"  {column:<30} {count}")
+
+def _encode_geometry(encode, elem, fmt, layer, quarantine, malformed):
+    """
+    Encodes one Placemark geometry. Without a quarantine, coordinates that
+    do not parse give an empty geometry, counted per layer in malformed,
+    instead of ending the conversion.
+    """
+    try:
+        return encode(elem, fmt)
+    except ValueError:
+        if quarantine is not None:
+            raise
+        if malformed is not None:
+            malformed[layer] += 1
+        return ''
+
+def _uncount(unmapped, data):
+    """Takes a skipped row back out of the unmapped counts (a resumed run restores them from its checkpoint)."""
+    if data['style_url'] and not data['fruit_type']:
+        unmapped[data['style_url']] -= 1
+
+def iter_placemark_rows(kml_file, styles=None, style_maps=None, geometry=None, unmapped=None, extended=None,
+                        skip=0, quarantine=None, malformed=None, emit_deferred=None):
+    """
+    Streams Placemark rows out of a KML file object with iterparse.
+
+    Each row is yielded as soon as its Placemark end tag is read, and the
+    element is then cleared and detached so memory does not grow with the
+    document. Styles and StyleMaps are collected as they go by. A Placemark
+    that references a style not seen yet is spilled to a temporary file and
+    yielded after the document ends, once all styles are known.
+
+    styles and style_maps may be preloaded with the document's complete
+    set (e.g. from the KMZ index), in which case nothing is deferred.
+
+    geometry='wkt' or 'wkb' adds a 'geometry' field with the full Placemark
+    geometry (Point, LineString, Polygon or MultiGeometry), see kml_geometry.
+    Without a quarantine, a geometry whose coordinates do not parse is left
+    empty and its layer counted into the malformed Counter, if given.
+
+    Style ids of placemarks left without a fruit type are counted into the
+    unmapped Counter, if given.
+
+    extended, an extended_data.ExtendedDataColumns, adds its typed
+    ExtendedData columns to every row.
+
+    A Placemark that fails to convert is passed to quarantine (see
+    conversion_checkpoint.Quarantine) instead of raising, if given.
+    skip drops the first skip placemarks, counting both rows and
+    quarantined placemarks in the order they are emitted; this is how a
+    checkpointed conversion resumes. With preloaded styles that order is
+    document order and skipped placemarks are not even converted.
+
+    emit_deferred, a callable, receives the deferred rows instead of them
+    being yielded after the document (batch_convert_kmz keeps them apart).
+    """
+    if geometry:
+        from kml_geometry import encode_geometry
+    ns = None
+    tags = None
+    preloaded = styles is not None
+    styles = dict(styles or {})
+    style_maps = dict(style_maps or {})
+    unmapped = unmapped if unmapped is not None else collections.Counter()
+    classifier = None  # rebuilt when a Style or StyleMap arrives after it was built
+    stack = []   # open elements, root first
+    layers = []  # layer name of each open Folder
+    placemark_depth = 0
+
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as deferred:
+        has_deferred = False
+
+        for event, elem in kml_parser.iterparse(kml_file, events=('start', 'end')):
+            tag = elem.tag
+
+            if event == 'start':
+                if ns is None:
+                    ns = detect_namespace(elem)
+                    tags = tags_for(ns)
+                stack.append(elem)
+                if tag == tags.Folder:
+                    layers.append(layers[-1] if layers else "Unknown Layer")
+                elif tag == tags.Placemark:
+                    placemark_depth += 1
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+
+            if tag == tags.Style:
+                style_id = elem.get('id')
+                if style_id:
+                    styles[style_id] = parse_style(elem, ns)
+                    classifier = None
+            elif tag == tags.StyleMap:
+                sm_id = elem.get('id')
+                normal_style = parse_style_map(elem, ns) if sm_id else None
+                if normal_style:
+                    style_maps[sm_id] = normal_style
+                    classifier = None
+            elif tag == tags.Placemark:
+                placemark_depth -= 1
+                if skip and preloaded:
+                    skip -= 1
+                else:
+                    try:
+                        data = build_placemark_row(elem, layers[-1] if layers else "Unknown Layer", ns)
+                        if geometry:
+                            data['geometry'] = _encode_geometry(encode_geometry, elem, geometry, data['layer'],
+                                                                quarantine, malformed)
+                        if extended:
+                            extended.extract(elem, ns, data)
+                        if classifier is None:
+                            classifier = StyleClassifier(styles, style_maps, unmapped)
+                        ready = classifier.apply(data, final=preloaded or not data['style_url'])
+                    except Exception as e:
+                        if quarantine is None:
+                            raise
+                        if skip:
+                            skip -= 1
+                        else:
+                            quarantine.add(elem, e, layers[-1] if layers else None)
+                    else:
+                        if not ready:
+                            deferred.write(json.dumps(data, ensure_ascii=False, default=str) + '\n')
+                            has_deferred = True
+                        elif skip:
+                            skip -= 1
+                            _uncount(unmapped, data)
+                        else:
+                            yield data
+            elif placemark_depth:
+                # Inside a Placemark; it is read as a whole on its end tag
+                continue
+            elif tag == tags.name:
+                if parent is not None and parent.tag == tags.Folder:
+                    layers[-1] = elem.text
+                continue
+            elif tag == tags.Folder:
+                layers.pop()
+            else:
+                continue
+
+            if placemark_depth:
+                continue
+            elem.clear()
+            if parent is not None:
+                parent.remove(elem)
+
+        if has_deferred:
+            deferred.seek(0)
+            if classifier is None:
+                classifier = StyleClassifier(styles, style_maps, unmapped)
+            for line in deferred:
+                data = json.loads(line)
+                if extended:
+                    extended.restore(data)
+                classifier.apply(data)
+                if skip:
+                    skip -= 1
+                    _uncount(unmapped, data)
+                elif emit_deferred is not None:
+                    emit_deferred(data)
+                else:
+                    yield data
+
+def indexed_styles(kmz_path, kml_filename):
+    """
+    Returns (styles, style_maps) from an up-to-date KMZ index, or (None, None)
+    if the archive has not been indexed.
+    """
+    index = cached_index(kmz_path)
+    if index is None or index['kml_filename'] != kml_filename:
+        return None, None
+    return index['styles'], style_maps_to_normal(index)
+
+def iter_kmz_rows(kmz_path, cache_kml=False):
+    """
+    Streams the Placemark rows of every KML document in a KMZ file, root
+    document first (see iter_placemark_rows and kmz_archive.open_kml).
+    """
+    with zipfile.ZipFile(kmz_path, 'r') as z:
+        kml_filenames = kml_names(z)
+    if not kml_filenames:
+        raise ValueError(f"No KML file found in {kmz_path}")
+
+    for kml_filename in kml_filenames:
+        styles, style_maps = indexed_styles(kmz_path, kml_filename)
+        with open_kml(kmz_path, kml_filename, cache=cache_kml) as kml_file:
+            yield from iter_placemark_rows(kml_file, styles, style_maps)
+
+def _phase(metrics, name):
+    return metrics.phase(name) if metrics else contextlib.nullcontext()
+
+def _point_geometries(placemarks, tags, fmt):
+    """
+    Encodes the geometry of every Placemark whose geometry is a single
+    Point in one kml_geometry.encode_points batch. Returns a list aligned
+    with placemarks, None where a Placemark needs encode_geometry.
+    """
+    from kml_geometry import encode_points
+
+    shapes = (tags.Point, tags.LineString, tags.LinearRing, tags.Polygon, tags.MultiGeometry)
+    rows, texts = [], []
+    for i, element in enumerate(placemarks):
+        shape = next((child for child in element if child.tag in shapes), None)
+        if shape is not None and shape.tag == tags.Point:
+            coords_elem = first_child(shape, tags.coordinates)
+            if coords_elem is not None and coords_elem.text:
+                rows.append(i)
+                texts.append(coords_elem.text)
+
+    encoded = [None] * len(placemarks)
+    for i, value in zip(rows, encode_points(texts, fmt)):
+        encoded[i] = value
+    return encoded
+
+def iter_tree_rows(kml_file, geometry=None, unmapped=None, metrics=None, extended=None, skip=0, quarantine=None,
+                   malformed=None):
+    """
+    Parses a whole KML document into a tree and yields its Placemark rows
+    in document order. Simple, but memory grows with the document; see
+    iter_placemark_rows for the streaming reader, and for skip, quarantine
+    and malformed. Point geometries are encoded in one batch.
+    """
+    if geometry:
+        from kml_geometry import encode_geometry
+
+    with _phase(metrics, 'parse'):
+        root = kml_parser.parse(kml_file)
+
+    ns = detect_namespace(root)
+    tags = tags_for(ns)
+
+    # 1. Parse Styles
+    with _phase(metrics, 'styles'):
+        styles = {} # id -> {color, icon}
+        for style in root.iter(tags.Style):
+            style_id = style.get('id')
+            if not style_id:
+                continue
+            styles[style_id] = parse_style(style, ns)
+
+        # 2. Parse StyleMaps
+        style_maps = {} # id -> normal_style_id
+        for sm in root.iter(tags.StyleMap):
+            sm_id = sm.get('id')
+            if not sm_id:
+                continue
+
+            normal_style = parse_style_map(sm, ns)
+            if normal_style:
+                style_maps[sm_id] = normal_style
+
+        # 3. Classify every styleUrl once
+        classifier = StyleClassifier(styles, style_maps, unmapped)
+
+    def collect(element, current_layer):
+        tag = element.tag
+
+        if tag == tags.Folder or tag == tags.Document:
+            if tag == tags.Folder:
+                name_elem = first_child(element, tags.name)
+                if name_elem is not None:
+                    current_layer = name_elem.text
+
+            # Process children
+            for child in element:
+                collect(child, current_layer)
+
+        elif tag == tags.Placemark:
+            placemarks.append((element, current_layer))
+
+    # Start processing from root
+    placemarks = []
+    with _phase(metrics, 'walk'):
+        for child in root:
+            collect(child, "Unknown Layer")
+        del placemarks[:skip]
+        points = _point_geometries([p for p, _ in placemarks], tags, geometry) if geometry else None
+
+        for k, (element, current_layer) in enumerate(placemarks):
+            try:
+                data = build_placemark_row(element, current_layer, ns)
+                if geometry:
+                    data['geometry'] = points[k] if points[k] is not None else _encode_geometry(
+                        encode_geometry, element, geometry, data['layer'], quarantine, malformed)
+                if extended:
+                    extended.extract(element, ns, data)
+                classifier.apply(data)
+            except Exception as e:
+                if quarantine is None:
+                    raise
+                quarantine.add(element, e, current_layer)
+                continue
+            yield data
+
+def convert_kmz_to_csv(kmz_path, csv_path, streaming=False, geometry=None, metrics=None, cache_kml=False,
+                       extended_data=False, checkpoint_path=None, checkpoint_every=50000, resume=False,
+                       quarantine_path=None, style_stats=None):
     """
     Converts a KMZ file to a CSV file extracting Placemark data.
     Includes Layer (Folder), Icon, Color, Style URL.
     Infers Fruit Type and Legitimacy from Style URL.
+
+    Every .kml document in the archive is converted, root document first.
+    Entries are read through kmz_archive.open_kml; cache_kml=True keeps an
+    inflated copy of compressed entries for later runs.
+
+    A csv_path ending in .parquet, .arrow or .feather is written as a
+    columnar file with float lon/lat and dictionary-encoded categories.
+
+    geometry='wkt' or 'wkb' (hex) adds a 'geometry' column holding the full
+    geometry, including LineStrings and Polygons that have no lon/lat.
+    Without quarantine_path, a geometry whose coordinates do not parse is
+    left empty and reported in the summary.
+
+    extended_data=True adds one typed column per ExtendedData field
+    (Data and SchemaData/SimpleData). The column set and types come from
+    the KMZ index scan: <Schema> declarations where present, otherwise the
+    types inferred from all values (int, float, date or text).
+
+    With streaming=True the KML is read with iter_placemark_rows instead of
+    being parsed into a full tree, so memory stays flat on large exports.
+    Placemarks with forward style references are then written last.
+
+    metrics, a conversion_metrics.ConversionMetrics, turns on instrumentation:
+    per-phase times (open, inflate, parse, styles, walk, write), placemark
+    rate, peak memory and periodic progress lines. The caller starts it and
+    reads its report.
+
+    checkpoint_path turns on checkpointing (CSV output only): every
+    checkpoint_every placemarks, and when the run fails or is interrupted,
+    the output is flushed and its byte position saved together with the
+    placemark ordinal (see conversion_checkpoint.ConversionCheckpoint).
+    With resume=True a matching checkpoint is picked up: the output is
+    truncated to the saved position and conversion continues after the
+    saved placemark. The checkpoint is removed once the run completes.
+
+    quarantine_path writes Placemarks that fail to convert to a JSON-lines
+    file and carries on, instead of aborting the run.
+
+    style_stats, an analyze_styles.StyleStats, is updated with every row
+    written, so the style report needs no second pass over the output.
     """
     if not os.path.exists(kmz_path):
         print(f"Error: File not found: {kmz_path}")
         return
 
+    fieldnames = FIELDNAMES + ['geometry'] if geometry else FIELDNAMES
+
     try:
-        with zipfile.ZipFile(kmz_path, 'r') as z:
-            # Find the KML file (usually doc.kml)
-            kml_filename = None
-            for name in z.namelist():
-                if name.endswith('.kml'):
-                    kml_filename = name
-                    break
-            
-            if not kml_filename:
-                print("Error: No KML file found in KMZ archive.")
+        with _phase(metrics, 'open'):
+            with zipfile.ZipFile(kmz_path, 'r') as z:
+                # Find the KML files (usually just doc.kml)
+                kml_filenames = kml_names(z)
+
+        if not kml_filenames:
+            print("Error: No KML file found in KMZ archive.")
+            return
+
+        if metrics:
+            metrics.info.update({'kmz': kmz_path, 'kml_filenames': kml_filenames, 'output': csv_path,
+                                 'mode': 'streaming' if streaming else 'tree', 'geometry': geometry})
+
+        extended = None
+        column_types = None
+        if extended_data:
+            with _phase(metrics, 'schema'):
+                types = {}
+                for kml_filename in kml_filenames:
+                    for name, kind in field_types(scan_extended_data(kmz_path, kml_filename)).items():
+                        types[name] = merge_types(types.get(name), kind)
+                extended = ExtendedDataColumns(types, reserved=fieldnames)
+            fieldnames = fieldnames + extended.fieldnames
+            column_types = extended.column_types
+            print(f"ExtendedData columns: {len(extended.columns)}")
+
+        checkpoint = None
+        state = None
+        if checkpoint_path:
+            if is_columnar(csv_path):
+                print("Error: Checkpointing needs CSV output.")
                 return
+            stat = os.stat(kmz_path)
+            checkpoint = ConversionCheckpoint(checkpoint_path, {
+                'kmz': os.path.abspath(kmz_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                'output': os.path.abspath(csv_path), 'fieldnames': fieldnames,
+                'mode': 'streaming' if streaming else 'tree',
+                # Placemark ordinals follow document order only with styles preloaded from the index
+                'preloaded': streaming and cached_index(kmz_path) is not None,
+            }, checkpoint_every)
+            if resume:
+                state = checkpoint.load()
+                if state and (not os.path.exists(csv_path) or os.path.getsize(csv_path) < state['output_bytes']):
+                    state = None
+                if state:
+                    print(f"Resuming from checkpoint: {state['rows']} rows written, "
+                          f"entry {kml_filenames[state['entry']]} at placemark {state['ordinal']}")
+                else:
+                    print("No usable checkpoint found; starting from the beginning.")
 
-            print(f"Processing KML file: {kml_filename}")
-            
-            with z.open(kml_filename) as kml_file:
-                tree = ET.parse(kml_file)
-                root = tree.getroot()
-
-                ns = {}
-                if '}' in root.tag:
-                    ns_url = root.tag.split('}')[0].strip('{')
-                    ns = {'kml': ns_url}
-
-                # 1. Parse Styles
-                styles = {} # id -> {color, icon}
-                for style in root.findall('.//kml:Style', ns) if ns else root.findall('.//Style'):
-                    style_id = style.get('id')
-                    if not style_id:
-                        continue
-                    
-                    icon_style = style.find('.//kml:IconStyle', ns) if ns else style.find('.//IconStyle')
-                    color = None
-                    icon_href = None
-                    
-                    if icon_style is not None:
-                        c_elem = icon_style.find('kml:color', ns) if ns else icon_style.find('color')
-                        if c_elem is not None:
-                            color = c_elem.text
-                        
-                        i_elem = icon_style.find('.//kml:href', ns) if ns else icon_style.find('.//href')
-                        if i_elem is not None:
-                            icon_href = i_elem.text
-                    
-                    styles[style_id] = {'color': color, 'icon': icon_href}
-
-                # 2. Parse StyleMaps
-                style_maps = {} # id -> normal_style_id
-                for sm in root.findall('.//kml:StyleMap', ns) if ns else root.findall('.//StyleMap'):
-                    sm_id = sm.get('id')
-                    if not sm_id:
+        unmapped = collections.Counter(state['unmapped'] if state else {})
+        malformed = collections.Counter()
+        count = state['rows'] if state else 0
+        entry, skip, written = 0, 0, 0
+        # Prepare output (CSV, or Parquet/Arrow by extension)
+        with contextlib.ExitStack() as outputs:
+            sink = writer = outputs.enter_context(
+                open_sink(csv_path, fieldnames, column_types, resume_at=state['output_bytes'] if state else None))
+            if metrics:
+                writer = metrics.sink(writer)
+            quarantine = None
+            if quarantine_path:
+                quarantine = outputs.enter_context(
+                    Quarantine(quarantine_path, state['quarantine_bytes'], state['quarantined'])
+                    if state and state['quarantine_bytes'] is not None else Quarantine(quarantine_path))
+            quarantined = 0
+
+            def save_checkpoint():
+                ordinal = skip + written + (quarantine.count - quarantined if quarantine else 0)
+                checkpoint.save(entry, ordinal, count, sink.flush(), quarantine, +unmapped)
+
+            try:
+                for entry, kml_filename in enumerate(kml_filenames):
+                    if state and entry < state['entry']:
                         continue
-                    
-                    # Find 'normal' pair
-                    normal_style = None
-                    pairs = sm.findall('kml:Pair', ns) if ns else sm.findall('Pair')
-                    for pair in pairs:
-                        key = pair.find('kml:key', ns) if ns else pair.find('key')
-                        if key is not None and key.text == 'normal':
-                            url = pair.find('kml:styleUrl', ns) if ns else pair.find('styleUrl')
-                            if url is not None:
-                                normal_style = url.text.strip('#')
-                            break
-                    
-                    if normal_style:
-                        style_maps[sm_id] = normal_style
-
-                # Prepare CSV
-                with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    fieldnames = ['name', 'description', 'longitude', 'latitude', 'layer', 'icon', 'color', 'style_url', 'fruit_type', 'legitimacy']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-
-                    count = 0
-
-                    def process_element(element, current_layer):
-                        nonlocal count
-                        tag = element.tag.split('}')[-1]
-
-                        if tag in ['Folder', 'Document']:
-                            name_elem = element.find('kml:name', ns) if ns else element.find('name')
-                            layer_name = name_elem.text if name_elem is not None else current_layer
-                            if tag == 'Document':
-                                pass
-                            else:
-                                current_layer = layer_name
-
-                            # Process children
-                            for child in element:
-                                process_element(child, current_layer)
-                        
-                        elif tag == 'Placemark':
-                            data = {
-                                'name': '',
-                                'description': '',
-                                'longitude': '',
-                                'latitude': '',
-                                'layer': clean_text(current_layer),
-                                'icon': '',
-                                'color': '',
-                                'style_url': '',
-                                'fruit_type': '',
-                                'legitimacy': ''
-                            }
-
-                            # Name
-                            name_elem = element.find('kml:name', ns) if ns else element.find('name')
-                            if name_elem is not None:
-                                data['name'] = clean_text(name_elem.text)
-
-                            # Description
-                            desc_elem = element.find('kml:description', ns) if ns else element.find('description')
-                            if desc_elem is not None:
-                                data['description'] = clean_text(desc_elem.text)
-
-                            # Coordinates
-                            point_elem = element.find('.//kml:Point', ns) if ns else element.find('.//Point')
-                            if point_elem is not None:
-                                coords_elem = point_elem.find('kml:coordinates', ns) if ns else point_elem.find('coordinates')
-                                if coords_elem is not None and coords_elem.text:
-                                    coords = coords_elem.text.strip().split(',')
-                                    if len(coords) >= 2:
-                                        data['longitude'] = coords[0]
-                                        data['latitude'] = coords[1]
-                            
-                            # Style
-                            style_url_elem = element.find('kml:styleUrl', ns) if ns else element.find('styleUrl')
-                            if style_url_elem is not None and style_url_elem.text:
-                                raw_style_url = style_url_elem.text.strip()
-                                data['style_url'] = raw_style_url
-                                
-                                # Infer from mapping
-                                if raw_style_url in STYLE_MAPPING:
-                                    mapping = STYLE_MAPPING[raw_style_url]
-                                    data['fruit_type'] = mapping['fruit']
-                                    data['legitimacy'] = mapping['legitimacy']
-
-                                style_ref = raw_style_url.strip('#')
-                                
-                                # Resolve StyleMap
-                                if style_ref in style_maps:
-                                    style_ref = style_maps[style_ref]
-                                
-                                # Get Style info
-                                if style_ref in styles:
-                                    s = styles[style_ref]
-                                    data['color'] = s['color'] if s['color'] else ''
-                                    data['icon'] = s['icon'] if s['icon'] else ''
-
-                            writer.writerow(data)
+                    skip = state['ordinal'] if state and entry == state['entry'] else 0
+                    written = 0
+                    print(f"Processing KML file: {kml_filename}")
+                    if quarantine:
+                        quarantine.kml_filename = kml_filename
+                        quarantined = quarantine.count
+
+                    with contextlib.ExitStack() as stack:
+                        with _phase(metrics, 'open'):
+                            kml_file = stack.enter_context(open_kml(kmz_path, kml_filename, cache=cache_kml))
+                        if metrics:
+                            kml_file = metrics.reader(kml_file)
+
+                        if streaming:
+                            # Reuse styles from an up-to-date index so nothing is deferred
+                            with _phase(metrics, 'styles'):
+                                styles, style_maps = indexed_styles(kmz_path, kml_filename)
+                            rows = iter_placemark_rows(kml_file, styles, style_maps, geometry, unmapped, extended,
+                                                       skip, quarantine, malformed)
+                            if metrics:
+                                rows = metrics.timed_rows(rows)
+                        else:
+                            rows = iter_tree_rows(kml_file, geometry, unmapped, metrics, extended, skip, quarantine,
+                                                  malformed)
+                        if style_stats is not None:
+                            rows = style_stats.observe(rows)
+
+                        for data in rows:
+                            writer.write(data)
                             count += 1
+                            written += 1
+                            if checkpoint and checkpoint.due(count + (quarantine.count if quarantine else 0)):
+                                save_checkpoint()
+            except BaseException:
+                if checkpoint:
+                    save_checkpoint()
+                    print(f"Checkpoint saved to {checkpoint_path} after {count} rows; rerun with --resume to continue.")
+                raise
 
-                    # Start processing from root
-                    for child in root:
-                        process_element(child, "Unknown Layer")
-                    
-                    print(f"Successfully converted {count} placemarks to {csv_path}")
+        if checkpoint:
+            checkpoint.remove()
+        print(f"Successfully converted {count} placemarks to {csv_path}")
+        if quarantine:
+            print(f"Quarantined {quarantine.count} placemarks to {quarantine_path}")
+        print_unmapped_summary(unmapped)
+        print_malformed_summary(malformed)
+        if extended:
+            print_rejected_summary(extended.rejected)
 
     except zipfile.BadZipFile:
         print("Error: Bad Zip File")
@@ -273,6 +785,55 @@ def convert_kmz_to_csv(kmz_path, csv_path):
         traceback.print_exc()
 
 if __name__ == "__main__":
-    kmz_file = "/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz"
-    csv_file = "fruit_trees_2022.csv"
-    convert_kmz_to_csv(kmz_file, csv_file)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a KMZ export to CSV (or Parquet/Arrow).")
+    parser.add_argument('kmz', nargs='?', default="/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
+    parser.add_argument('output', nargs='?', default="fruit_trees_2022.csv")
+    parser.add_argument('--tree', action='store_true', help="Parse the whole KML tree instead of streaming")
+    parser.add_argument('--geometry', choices=['wkt', 'wkb'], help="Add a full geometry column")
+    parser.add_argument('--cache-kml', action='store_true', help="Keep an inflated copy of the KML for later runs")
+    parser.add_argument('--extended-data', action='store_true', help="Add typed ExtendedData columns")
+    parser.add_argument('--metrics', metavar='REPORT_JSON', help="Instrument the run and write a JSON report")
+    parser.add_argument('--progress', type=float, default=10.0, help="Seconds between progress lines (with --metrics)")
+    parser.add_argument('--profile', metavar='PROF', help="Also run cProfile and dump its stats here (with --metrics)")
+    parser.add_argument('--trace-memory', action='store_true', help="Also run tracemalloc (with --metrics)")
+    parser.add_argument('--checkpoint', nargs='?', const='', metavar='PATH',
+                        help="Save resume points (CSV output; default OUTPUT.checkpoint.json)")
+    parser.add_argument('--checkpoint-every', type=int, default=50000, help="Placemarks between checkpoints")
+    parser.add_argument('--resume', action='store_true', help="Continue from the checkpoint of a failed run")
+    parser.add_argument('--quarantine', nargs='?', const='', metavar='PATH',
+                        help="Write failing placemarks here instead of aborting (default OUTPUT.quarantine.jsonl)")
+    parser.add_argument('--analyze-styles', action='store_true',
+                        help="Also print per-style counts, layers and legitimacy keywords")
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics:
+        from conversion_metrics import ConversionMetrics
+        metrics = ConversionMetrics(progress_interval=args.progress, profile=bool(args.profile),
+                                    trace_memory=args.trace_memory)
+        metrics.start()
+
+    checkpoint_path = args.checkpoint or None
+    if args.checkpoint == '' or (args.resume and checkpoint_path is None):
+        checkpoint_path = args.output + '.checkpoint.json'
+    quarantine_path = args.quarantine or (args.output + '.quarantine.jsonl' if args.quarantine == '' else None)
+    style_stats = None
+    if args.analyze_styles:
+        from analyze_styles import StyleStats
+        style_stats = StyleStats()
+
+    convert_kmz_to_csv(args.kmz, args.output, streaming=not args.tree, geometry=args.geometry, metrics=metrics,
+                       cache_kml=args.cache_kml, extended_data=args.extended_data, checkpoint_path=checkpoint_path,
+                       checkpoint_every=args.checkpoint_every, resume=args.resume, quarantine_path=quarantine_path,
+                       style_stats=style_stats)
+    if style_stats:
+        style_stats.print_report()
+
+    if metrics:
+        metrics.stop()
+        metrics.write_report(args.metrics)
+        if args.profile:
+            metrics.dump_profile(args.profile)
+        print(f"Metrics written to {args.metrics}")
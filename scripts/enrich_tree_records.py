@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import os
+import time
+
+from extended_data import parse_value
+from normalize_tree_records import TREE_RECORD_FIELDS, TREE_RECORD_TYPES
+from output_sinks import open_sink, read_rows
+from tree_api_client import TREE_ID_COLUMN, ResponseCache, TreeApiClient, merge_tree_rows
+
+# API fields filled into records (the TreeRow fields of src/services/treeApi.ts)
+ENRICH_FIELDS = (
+    'attributes-species-clean-he', 'attributes-species-clean-en', 'attributes-genus',
+    'attributes-bark-diameter', 'attributes-height', 'attributes-canopy-area', 'attributes-canopy-diameter',
+    'attributes-age-estimated', 'attributes-num-barks', 'attributes-health-score', 'attributes-good-status',
+    'muni_name', 'muni_region', 'road_name', 'cad_code', 'location-address', 'environment-type',
+    'meta-internal-id', 'photos-general', 'meta-source', 'meta-date', 'meta-collection-type', 'meta-source-type',
+)
+
+def _text(value):
+    return '' if value is None else str(value)
+
+async def _enrich(rows, writer, client, fields, overwrite, batch_size, types):
+    count = matched = 0
+    batch = []
+
+    async def flush():
+        nonlocal count, matched
+        found = await client.fetch_tree_ids([row.get(TREE_ID_COLUMN) for row in batch])
+        for row in batch:
+            api_rows = found.get(row.get(TREE_ID_COLUMN))
+            if api_rows:
+                matched += 1
+                merged = merge_tree_rows(api_rows)
+                for field in fields:
+                    if field in merged and (overwrite or row.get(field) in (None, '')):
+                        row[field] = _text(merged[field])
+            for field in fields:
+                row.setdefault(field, '')
+            for column, kind in types.items():
+                if column in row:
+                    row[column] = parse_value(row[column], kind)
+            writer.write(row)
+        count += len(batch)
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return count, matched
+
+def enrich_tree_records(input_path, output_path, fields=ENRICH_FIELDS, cache_path=None, url=None,
+                        concurrency=8, api_batch_size=200, overwrite=False, batch_size=50000):
+    """
+    Writes the rows of a tree record file (normalize_tree_records output)
+    with fields filled from the digital-forest API, looked up by
+    meta-tree-id through TreeApiClient: batched IN queries over a pooled
+    session, and a ResponseCache file when cache_path is given. Only empty
+    fields are filled unless overwrite is set. Rows are read and written
+    batch_size at a time. Returns (rows written, rows matched).
+    """
+    if not os.path.exists(input_path):
+        print(f"Error: File not found: {input_path}")
+        return None
+
+    started = time.perf_counter()
+    rows = read_rows(input_path)
+    first = next(rows, None)
+    fieldnames = list(first) if first else list(TREE_RECORD_FIELDS)
+    if first is not None and TREE_ID_COLUMN not in first:
+        print(f"Error: {input_path} has no {TREE_ID_COLUMN} column (run normalize_tree_records first)")
+        return None
+    fieldnames += [f for f in fields if f not in fieldnames]
+    types = {c: t for c, t in TREE_RECORD_TYPES.items() if c in fieldnames}
+
+    def all_rows():
+        if first is not None:
+            yield first
+            yield from rows
+
+    async def run(cache):
+        async with TreeApiClient(url, concurrency=concurrency, batch_size=api_batch_size, cache=cache) as client:
+            with open_sink(output_path, fieldnames, types) as writer:
+                result = await _enrich(all_rows(), writer, client, fields, overwrite, batch_size, types)
+            if client.truncated:
+                print(f"Warning: {len(client.truncated)} tree ids kept possibly truncated API rows "
+                      f"(e.g. {client.truncated[0]})")
+            return result, client.requests, client.retried
+
+    cache = ResponseCache(cache_path) if cache_path else None
+    try:
+        (count, matched), requests, retried = asyncio.run(run(cache))
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses ({cache_path})")
+    finally:
+        if cache is not None:
+            cache.close()
+
+    elapsed = time.perf_counter() - started
+    share = matched / count if count else 0
+    print(f"Wrote {count} rows to {output_path} in {elapsed:.1f}s; {matched} matched ({share:.1%}), "
+          f"{requests} API requests ({retried} retried)")
+    return count, matched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill tree records with fields from the digital-forest API.")
+    parser.add_argument('input', nargs='?', default="fruit_trees_2022.records.csv",
+                        help="Tree records with meta-tree-id (CSV/Parquet/Arrow)")
+    parser.add_argument('-o', '--output', default="fruit_trees_2022.enriched.csv", help="CSV/Parquet/Arrow path")
+    parser.add_argument('--fields', nargs='*', default=list(ENRICH_FIELDS), help="API fields to fill")
+    parser.add_argument('--cache', metavar='PATH', default="tree_api_cache.sqlite",
+                        help="Response cache file ('' to disable)")
+    parser.add_argument('--api-url', help="Query endpoint (default: TREE_API_URL or the public API)")
+    parser.add_argument('-j', '--concurrency', type=int, default=8, help="Requests in flight")
+    parser.add_argument('--api-batch-size', type=int, default=200, help="Tree ids per request")
+    parser.add_argument('--overwrite', action='store_true', help="Replace non-empty fields too")
+    parser.add_argument('--batch-size', type=int, default=50000, help="Rows read per lookup round")
+    args = parser.parse_args()
+
+    try:
+        enrich_tree_records(args.input, args.output, args.fields, args.cache or None, args.api_url,
+                            args.concurrency, args.api_batch_size, args.overwrite, args.batch_size)
+    except Exception as e:
+        print(f"Error: {e}")
@@ -0,0 +1,221 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+from output_sinks import read_rows
+from vector_tiles import geojson_tile, lonlat_to_world, mvt_tile, world_to_lonlat
+
+TILE_COLUMNS = ['name', 'longitude', 'latitude', 'fruit_type', 'legitimacy']
+LAYER_NAME = 'fruit_trees'
+TILE_SIZE = 256
+EXTENT = 4096
+
+def load_points(input_path):
+    """
+    Reads lon/lat, name, fruit_type and legitimacy of every point placemark
+    from a KMZ or a convert_kmz_to_csv output (CSV/Parquet/Arrow).
+    Returns (lon, lat, names, fruit codes, legitimacy codes, fruit labels, legitimacy labels).
+    """
+    if input_path.lower().endswith('.kmz'):
+        from convert_kmz_to_csv import iter_kmz_rows
+        rows = iter_kmz_rows(input_path)
+    else:
+        rows = read_rows(input_path, TILE_COLUMNS)
+
+    lon, lat, names, fruits, legitimacies = [], [], [], [], []
+    for row in rows:
+        if not row.get('longitude') or not row.get('latitude'):
+            continue
+        lon.append(row['longitude'])
+        lat.append(row['latitude'])
+        names.append(row.get('name') or '')
+        fruits.append(row.get('fruit_type') or '')
+        legitimacies.append(row.get('legitimacy') or '')
+
+    lon = np.array(lon, dtype=np.float64)
+    lat = np.array(lat, dtype=np.float64)
+    fruit_labels, fruit = np.unique(np.array(fruits, dtype=str), return_inverse=True)
+    legitimacy_labels, legitimacy = np.unique(np.array(legitimacies, dtype=str), return_inverse=True)
+    return lon, lat, names, fruit, legitimacy, fruit_labels.tolist(), legitimacy_labels.tolist()
+
+def _majority(cell, codes, ncells):
+    """Most frequent code per cell (ties go to the smaller code)."""
+    ncodes = int(codes.max()) + 1 if codes.size else 1
+    pairs, counts = np.unique(cell * ncodes + codes, return_counts=True)
+    cells = pairs // ncodes
+    order = np.lexsort((-counts, cells))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cells[order][1:] != cells[order][:-1]
+    result = np.zeros(ncells, dtype=np.int64)
+    result[cells[order][first]] = (pairs % ncodes)[order][first]
+    return result
+
+def cluster_level(wx, wy, fruit, legitimacy, z, radius):
+    """
+    Grid clustering at zoom z: points in the same radius-pixel cell become
+    one feature at their centroid, carrying the count and the majority
+    fruit_type and legitimacy. Returns (x, y, count, fruit, legitimacy, member),
+    where member is the source point of single-point cells and -1 otherwise.
+    """
+    cells_per_unit = 2 ** z * TILE_SIZE / radius
+    cx = np.floor(wx * cells_per_unit).astype(np.int64)
+    cy = np.floor(wy * cells_per_unit).astype(np.int64)
+    keys, cell = np.unique(cy * (int(cells_per_unit) + 1) + cx, return_inverse=True)
+    n = len(keys)
+    count = np.bincount(cell, minlength=n)
+    x = np.bincount(cell, weights=wx, minlength=n) / count
+    y = np.bincount(cell, weights=wy, minlength=n) / count
+    member = np.full(n, -1, dtype=np.int64)
+    single = count[cell] == 1
+    member[cell[single]] = np.flatnonzero(single)
+    return x, y, count, _majority(cell, fruit, n), _majority(cell, legitimacy, n), member
+
+def write_tiles_job(out_dir, fmt, z, tiles, x, y, count, fruit, legitimacy, names, fruit_labels,
+                    legitimacy_labels):
+    """
+    Writes the tiles of one zoom level given features sorted by tile.
+    tiles is a list of (tx, ty, start, end) slices into the feature arrays.
+    Returns (tiles written, bytes written).
+    """
+    n = 2 ** z
+    written = 0
+    for tx, ty, start, end in tiles:
+        properties = []
+        for k in range(start, end):
+            props = {'fruit_type': fruit_labels[fruit[k]], 'legitimacy': legitimacy_labels[legitimacy[k]]}
+            if count[k] > 1:
+                props['cluster'] = True
+                props['point_count'] = int(count[k])
+            else:
+                props['name'] = names[k]
+            properties.append(props)
+
+        directory = os.path.join(out_dir, str(z), str(tx))
+        os.makedirs(directory, exist_ok=True)
+        if fmt == 'mvt':
+            px = np.round((x[start:end] * n - tx) * EXTENT).astype(np.int64)
+            py = np.round((y[start:end] * n - ty) * EXTENT).astype(np.int64)
+            payload = mvt_tile(LAYER_NAME, px.tolist(), py.tolist(), properties, EXTENT)
+            path = os.path.join(directory, f'{ty}.pbf')
+        else:
+            lon, lat = world_to_lonlat(x[start:end], y[start:end])
+            payload = geojson_tile(lon.tolist(), lat.tolist(), properties).encode('utf-8')
+            path = os.path.join(directory, f'{ty}.geojson')
+        with open(path, 'wb') as f:
+            f.write(payload)
+        written += len(payload)
+    return len(tiles), written
+
+def export_tiles(input_path, out_dir, min_zoom=6, max_zoom=16, cluster_max_zoom=13, radius=40, fmt='geojson',
+                 workers=None, features_per_job=50000):
+    """
+    Writes pre-tiled z/x/y files of the fruit-tree points into out_dir,
+    plus a metadata.json (TileJSON-style bounds, zooms, format).
+
+    Zoom levels up to cluster_max_zoom hold grid clusters (point_count,
+    majority fruit_type/legitimacy); deeper levels hold every tree with its
+    name, fruit_type and legitimacy. fmt is 'geojson' or 'mvt' (.pbf, one
+    layer named fruit_trees). Clustering and tile assignment are NumPy
+    passes per zoom; tile encoding and writing run in a process pool, a
+    batch of whole tiles per job. Only tiles with features are written.
+    """
+    if not os.path.exists(input_path):
+        print(f"Error: File not found: {input_path}")
+        return None
+
+    started = time.perf_counter()
+    lon, lat, names, fruit, legitimacy, fruit_labels, legitimacy_labels = load_points(input_path)
+    if not lon.size:
+        print("Error: No point placemarks found.")
+        return None
+    wx, wy = lonlat_to_world(lon, lat)
+    print(f"Loaded {lon.size} points in {time.perf_counter() - started:.1f}s")
+
+    os.makedirs(out_dir, exist_ok=True)
+    levels = {}
+    summary = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for z in range(min_zoom, max_zoom + 1):
+            if z <= cluster_max_zoom:
+                x, y, count, zfruit, zlegitimacy, member = cluster_level(wx, wy, fruit, legitimacy, z, radius)
+            else:
+                x, y, zfruit, zlegitimacy = wx, wy, fruit, legitimacy
+                count = np.ones(len(wx), dtype=np.int64)
+                member = np.arange(len(wx))
+
+            n = 2 ** z
+            tx = np.minimum((x * n).astype(np.int64), n - 1)
+            ty = np.minimum((y * n).astype(np.int64), n - 1)
+            order = np.lexsort((ty, tx))
+            x, y, count, zfruit, zlegitimacy, member = (a[order] for a in (x, y, count, zfruit, zlegitimacy, member))
+            tx, ty = tx[order], ty[order]
+            change = np.flatnonzero((np.diff(tx) != 0) | (np.diff(ty) != 0)) + 1
+            starts = np.concatenate([[0], change])
+            ends = np.concatenate([change, [len(x)]])
+
+            # Batches of whole tiles, about features_per_job features each
+            jobs = []
+            first = 0
+            for i in range(len(starts)):
+                if ends[i] - starts[first] >= features_per_job or i == len(starts) - 1:
+                    lo, hi = starts[first], ends[i]
+                    tiles = [(int(tx[s]), int(ty[s]), int(s - lo), int(e - lo))
+                             for s, e in zip(starts[first:i + 1], ends[first:i + 1])]
+                    job_names = [names[m] if m >= 0 else '' for m in member[lo:hi].tolist()]
+                    jobs.append(pool.submit(write_tiles_job, out_dir, fmt, z, tiles, x[lo:hi], y[lo:hi],
+                                            count[lo:hi], zfruit[lo:hi], zlegitimacy[lo:hi], job_names,
+                                            fruit_labels, legitimacy_labels))
+                    first = i + 1
+
+            levels[z] = (int(len(x)), jobs)
+
+        # Levels are all queued before waiting, so workers encode while the next level is clustered
+        for z, (features, jobs) in levels.items():
+            tiles_written = size = 0
+            for job in jobs:
+                t, b = job.result()
+                tiles_written += t
+                size += b
+            summary[z] = {'tiles': tiles_written, 'features': features, 'bytes': size}
+            print(f"  z{z}: {features} features in {tiles_written} tiles, {size / 1e6:.1f} MB")
+
+    extension = 'pbf' if fmt == 'mvt' else 'geojson'
+    metadata = {
+        'tilejson': '3.0.0',
+        'tiles': [f'{{z}}/{{x}}/{{y}}.{extension}'],
+        'format': fmt,
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'cluster_max_zoom': cluster_max_zoom,
+        'bounds': [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())],
+        'vector_layers': [{'id': LAYER_NAME, 'fields': {
+            'name': 'String', 'fruit_type': 'String', 'legitimacy': 'String',
+            'cluster': 'Boolean', 'point_count': 'Number'}}],
+        'levels': summary,
+    }
+    with open(os.path.join(out_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    elapsed = time.perf_counter() - started
+    total = sum(level['tiles'] for level in summary.values())
+    print(f"Wrote {total} tiles for {lon.size} points to {out_dir} in {elapsed:.1f}s")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fruit-tree points as z/x/y GeoJSON or MVT tiles.")
+    parser.add_argument('input', nargs='?', default="fruit_trees_2022.csv", help="KMZ, or convert_kmz_to_csv output")
+    parser.add_argument('-o', '--output-dir', default="fruit_tree_tiles")
+    parser.add_argument('--format', choices=['geojson', 'mvt'], default='geojson')
+    parser.add_argument('--min-zoom', type=int, default=6)
+    parser.add_argument('--max-zoom', type=int, default=16)
+    parser.add_argument('--cluster-max-zoom', type=int, default=13, help="Deepest zoom with clustered points")
+    parser.add_argument('--radius', type=float, default=40, help="Cluster cell size in pixels")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    export_tiles(args.input, args.output_dir, args.min_zoom, args.max_zoom, args.cluster_max_zoom, args.radius,
+                 args.format, args.workers)
@@ -0,0 +1,167 @@
+"""
+ExtendedData fields as typed columns.
+
+Field types are 'int', 'float', 'date' or 'text'. They come from <Schema>
+declarations when a field is declared, otherwise they are inferred from
+every value seen by the KMZ index scan (see kmz_index._scan_kml).
+"""
+import collections
+import datetime
+import re
+
+from kml_parser import tags_for
+
+# <SimpleField type="..."> to column type
+KML_SCHEMA_TYPES = {
+    'int': 'int', 'uint': 'int', 'short': 'int', 'ushort': 'int',
+    'float': 'float', 'double': 'float',
+    'bool': 'text', 'string': 'text',
+}
+
+_INT = re.compile(r'[+-]?(0|[1-9]\d*)\Z')
+_FLOAT = re.compile(r'[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?\Z')
+_ISO_DATE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})\Z')
+_DMY_DATE = re.compile(r'(\d{1,2})[/.](\d{1,2})[/.](\d{4})\Z')
+
+def _parse_date(text):
+    m = _ISO_DATE.match(text)
+    if m:
+        year, month, day = m.groups()
+    else:
+        m = _DMY_DATE.match(text)
+        if not m:
+            return None
+        day, month, year = m.groups()
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+def value_type(text):
+    """Narrowest type of one non-empty value. Numbers with leading zeros (ids, phones) are text."""
+    if _INT.match(text):
+        return 'int'
+    if _FLOAT.match(text):
+        return 'float'
+    if _parse_date(text) is not None:
+        return 'date'
+    return 'text'
+
+def merge_types(a, b):
+    """Common type of two inferred types (None is 'no values yet')."""
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {'int', 'float'}:
+        return 'float'
+    return 'text'
+
+def parse_value(text, kind):
+    """Converts a value to its column type; empty or non-conforming values become None."""
+    if text is None:
+        return None
+    text = text.strip()
+    if not text:
+        return None
+    if kind == 'text':
+        return text
+    try:
+        if kind == 'int':
+            return int(text)
+        if kind == 'float':
+            return float(text)
+    except ValueError:
+        return None
+    if kind == 'date':
+        return _parse_date(text)
+    return text
+
+def field_types(extended_data):
+    """
+    Resolves {field name: type} from the index's extended_data section:
+    declared Schema types first, inferred types for the rest.
+    """
+    types = dict(extended_data.get('types', {}))
+    for fields in extended_data.get('schemas', {}).values():
+        for name, declared in fields.items():
+            types[name] = KML_SCHEMA_TYPES.get(declared, 'text')
+    return {name: kind or 'text' for name, kind in types.items()}
+
+class ExtendedDataColumns:
+    """
+    Fixed ExtendedData column set for one conversion.
+
+    extract() walks a Placemark's ExtendedData children once and looks each
+    Data/SimpleData name up in a dict, so the cost does not grow with the
+    number of known fields. Columns that collide with the base fields are
+    prefixed with 'ext_' (again, until the name is free). Non-empty values
+    that do not conform to their column type are written as None and
+    counted per column in rejected.
+    """
+
+    def __init__(self, types, reserved=()):
+        self.types = dict(sorted(types.items()))
+        taken = set(reserved) | set(self.types)
+        self.columns = {}
+        for name in self.types:
+            column = name
+            if name in reserved:
+                column = 'ext_' + name
+                while column in taken:
+                    column = 'ext_' + column
+                taken.add(column)
+            self.columns[name] = column
+        self._parsers = {name: (self.columns[name], kind) for name, kind in self.types.items()}
+        self.rejected = collections.Counter()
+
+    @property
+    def fieldnames(self):
+        return list(self.columns.values())
+
+    @property
+    def column_types(self):
+        return {self.columns[name]: kind for name, kind in self.types.items()}
+
+    def restore(self, data):
+        """Re-parses date columns of a row that went through JSON (where dates became ISO strings)."""
+        for name, kind in self.types.items():
+            if kind == 'date' and isinstance(data.get(self.columns[name]), str):
+                data[self.columns[name]] = parse_value(data[self.columns[name]], 'date')
+        return data
+
+    def extract(self, placemark, ns, data):
+        """Adds the typed ExtendedData values of a Placemark element to a row dict."""
+        for column in self.columns.values():
+            data[column] = None
+        tags = tags_for(ns)
+        extended_tag, data_tag, value_tag = tags.ExtendedData, tags.Data, tags.value
+        schema_data_tag, simple_data_tag = tags.SchemaData, tags.SimpleData
+        parsers = self._parsers
+        rejected = self.rejected
+
+        def parse(target, text):
+            value = parse_value(text, target[1])
+            if value is None and text and text.strip():
+                rejected[target[0]] += 1
+            data[target[0]] = value
+
+        for child in placemark:
+            if child.tag != extended_tag:
+                continue
+            for item in child:
+                if item.tag == data_tag:
+                    target = parsers.get(item.get('name'))
+                    if target is None:
+                        continue
+                    for value in item:
+                        if value.tag == value_tag:
+                            parse(target, value.text)
+                            break
+                elif item.tag == schema_data_tag:
+                    for simple in item:
+                        if simple.tag == simple_data_tag:
+                            target = parsers.get(simple.get('name'))
+                            if target is not None:
+                                parse(target, simple.text)
+        return data
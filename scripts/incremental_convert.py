@@ -0,0 +1,178 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+
+from convert_kmz_to_csv import FIELDNAMES, iter_kmz_rows
+
+CHANGE_FIELDNAMES = ['change'] + FIELDNAMES
+
+def placemark_fingerprint(row):
+    """Hashes the fields that define a placemark: name, coordinates, styleUrl and description."""
+    desc_hash = hashlib.sha1(row['description'].encode('utf-8')).hexdigest()
+    key = '\x1f'.join([row['name'], row['longitude'], row['latitude'], row['style_url'], desc_hash])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def placemark_identity(row):
+    """
+    Identity used to pair a deleted and an added placemark into one
+    modification. Exports carry no Placemark ids, so layer + name is used.
+    """
+    return row['layer'] + '\x1f' + row['name']
+
+def _open_store(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS placemarks (
+            seq INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            identity TEXT NOT NULL,
+            row TEXT NOT NULL
+        )
+    """)
+    conn.execute("DROP TABLE IF EXISTS current")
+    conn.execute("""
+        CREATE TABLE current (
+            seq INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            identity TEXT NOT NULL,
+            row TEXT NOT NULL
+        )
+    """)
+    return conn
+
+# Rows of one table that have no match in the other, matching duplicates
+# one-to-one by their ordinal within the same fingerprint.
+_UNMATCHED_SQL = """
+    WITH a AS (
+        SELECT seq, fingerprint, identity, row,
+               ROW_NUMBER() OVER (PARTITION BY fingerprint ORDER BY seq) AS n
+        FROM {this}
+    ), b AS (
+        SELECT fingerprint,
+               ROW_NUMBER() OVER (PARTITION BY fingerprint ORDER BY seq) AS n
+        FROM {other}
+    )
+    INSERT INTO {target} (seq, identity, row)
+    SELECT a.seq, a.identity, a.row FROM a
+    LEFT JOIN b ON a.fingerprint = b.fingerprint AND a.n = b.n
+    WHERE b.fingerprint IS NULL
+"""
+
+def _diff(conn):
+    """
+    Yields (change, row) for the current run against the stored one.
+
+    Placemarks are compared as multisets of fingerprints; leftover new and
+    old placemarks with the same identity are paired in document order and
+    reported as modified, the rest as added or deleted.
+    """
+    for name in ('new_only', 'old_only'):
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"CREATE TEMP TABLE {name} (seq INTEGER PRIMARY KEY, identity TEXT, row TEXT)")
+    conn.execute(_UNMATCHED_SQL.format(this='current', other='placemarks', target='new_only'))
+    conn.execute(_UNMATCHED_SQL.format(this='placemarks', other='current', target='old_only'))
+
+    paired = """
+        WITH n AS (
+            SELECT seq, identity, row,
+                   ROW_NUMBER() OVER (PARTITION BY identity ORDER BY seq) AS k
+            FROM new_only
+        ), o AS (
+            SELECT seq, identity, row,
+                   ROW_NUMBER() OVER (PARTITION BY identity ORDER BY seq) AS k
+            FROM old_only
+        )
+    """
+    # Added and modified, in the new document order
+    cursor = conn.execute(paired + """
+        SELECT n.row, o.seq IS NOT NULL FROM n
+        LEFT JOIN o ON n.identity = o.identity AND n.k = o.k
+        ORDER BY n.seq
+    """)
+    for row, modified in cursor:
+        yield ('modified' if modified else 'added'), json.loads(row)
+
+    # Deleted, in the old document order
+    cursor = conn.execute(paired + """
+        SELECT o.row FROM o
+        LEFT JOIN n ON n.identity = o.identity AND n.k = o.k
+        WHERE n.seq IS NULL
+        ORDER BY o.seq
+    """)
+    for (row,) in cursor:
+        yield 'deleted', json.loads(row)
+
+class _ChangeWriter:
+    """Writes change rows as CSV (with a 'change' column) or as JSONL."""
+
+    def __init__(self, path):
+        self.jsonl = path.endswith('.jsonl')
+        self.f = open(path, 'w', newline='', encoding='utf-8')
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.f, fieldnames=CHANGE_FIELDNAMES)
+            self.writer.writeheader()
+
+    def write(self, change, row):
+        if self.jsonl:
+            self.f.write(json.dumps({'change': change, **row}, ensure_ascii=False) + '\n')
+        else:
+            self.writer.writerow({'change': change, **row})
+
+    def close(self):
+        self.f.close()
+
+def convert_kmz_incremental(kmz_path, changes_path, store_path):
+    """
+    Converts a KMZ and writes only the placemarks added, modified or deleted
+    since the previous run recorded in store_path (an SQLite file).
+    changes_path ending in .jsonl is written as JSON lines, otherwise CSV.
+    The store is replaced by this run's fingerprints only after the change
+    set is written. Returns the counts per change type.
+    """
+    if not os.path.exists(kmz_path):
+        print(f"Error: File not found: {kmz_path}")
+        return None
+
+    conn = _open_store(store_path)
+    try:
+        total = 0
+        batch = []
+        for row in iter_kmz_rows(kmz_path):
+            batch.append((placemark_fingerprint(row), placemark_identity(row), json.dumps(row, ensure_ascii=False)))
+            if len(batch) >= 10000:
+                conn.executemany("INSERT INTO current (fingerprint, identity, row) VALUES (?, ?, ?)", batch)
+                total += len(batch)
+                batch = []
+        conn.executemany("INSERT INTO current (fingerprint, identity, row) VALUES (?, ?, ?)", batch)
+        total += len(batch)
+
+        counts = {'added': 0, 'modified': 0, 'deleted': 0}
+        writer = _ChangeWriter(changes_path)
+        try:
+            for change, row in _diff(conn):
+                writer.write(change, row)
+                counts[change] += 1
+        finally:
+            writer.close()
+
+        conn.execute("DROP TABLE placemarks")
+        conn.execute("ALTER TABLE current RENAME TO placemarks")
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"{total} placemarks: {counts['added']} added, {counts['modified']} modified, "
+          f"{counts['deleted']} deleted -> {changes_path}")
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write only the placemarks that changed since the last run.")
+    parser.add_argument('kmz', nargs='?', default="/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
+    parser.add_argument('-o', '--output', default="fruit_trees_2022.changes.csv", help="Change-set path (.csv or .jsonl)")
+    parser.add_argument('--store', default="fruit_trees_2022.fingerprints.sqlite", help="Fingerprint store of the previous run")
+    args = parser.parse_args()
+
+    convert_kmz_incremental(args.kmz, args.output, args.store)
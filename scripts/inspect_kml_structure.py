@@ -1,6 +1,109 @@
-import zipfile
-import xml.etree.ElementTree as ET
+import argparse
+import json
 import os
+import xml.parsers.expat
+import zipfile
+
+from kmz_archive import kml_names, open_kml
+from kmz_index import load_index, scan_counts
+
+def _by_count(histogram):
+    return dict(sorted(histogram.items(), key=lambda p: -p[1]))
+
+def structure_report(index):
+    """
+    Returns the structure report of a KML entry from its index or from
+    kmz_index.scan_counts: the Folder/Document tree under a 'kml' root
+    node ('tree'), each node with direct and total placemark counts and
+    geometry type and styleUrl histograms; the same histograms for the
+    whole document; and the number of Styles and StyleMaps defined.
+    """
+    defined = {'#' + i for i in list(index['styles']) + list(index['style_maps'])}
+    styles = index['style_counts']
+    root = {'tag': 'kml', 'name': None, 'total_placemarks': index['placemark_count'],
+            **index['top_level'], 'children': index['folders']}
+    return {
+        'placemarks': index['placemark_count'],
+        'styles_defined': len(index['styles']),
+        'style_maps_defined': len(index['style_maps']),
+        'geometry': _by_count(index['geometry_counts']),
+        'styles': _by_count(styles),
+        'undefined_styles': sorted(s for s in styles if s.startswith('#') and s not in defined),
+        'tree': root,
+    }
+
+def _histogram_text(histogram, limit):
+    items = sorted(histogram.items(), key=lambda p: -p[1])
+    text = ', '.join(f"{key} {n}" for key, n in items[:limit])
+    if len(items) > limit:
+        text += f" (+{len(items) - limit} more)"
+    return text
+
+def print_structure_report(kml_filename, report, max_styles=5):
+    """Prints a structure_report as an indented folder tree with histograms."""
+    print(f"{kml_filename}: {report['placemarks']} Placemarks, "
+          f"{report['styles_defined']} Styles, {report['style_maps_defined']} StyleMaps")
+    print(f"  Geometry: {_histogram_text(report['geometry'], len(report['geometry'])) or 'none'}")
+    print(f"  Styles used: {len(report['styles'])}; top: {_histogram_text(report['styles'], max_styles) or 'none'}")
+    if report['undefined_styles']:
+        print(f"  Undefined styleUrls: {', '.join(report['undefined_styles'])}")
+
+    print("\nFolder Structure:")
+
+    def print_node(node, level):
+        name_text = node['name'] if node['name'] is not None else "Unnamed"
+        total = node['total_placemarks']
+        direct = f", {node['placemarks']} direct" if node['children'] and node['placemarks'] != total else ''
+        print(f"{'  ' * level}{node['tag']}: {name_text} ({total} Placemarks{direct})")
+        if node['placemarks']:
+            print(f"{'  ' * (level + 1)}Geometry: {_histogram_text(node['geometry'], len(node['geometry']))}")
+            print(f"{'  ' * (level + 1)}Styles: {_histogram_text(node['styles'], max_styles)}")
+        for child in node['children']:
+            print_node(child, level + 1)
+
+    for node in report['tree']['children']:
+        print_node(node, 1)
+    if report['tree']['placemarks']:
+        print(f"  Outside any Folder/Document: {report['tree']['placemarks']} Placemarks")
+
+def scan_kmz_structure(kmz_path, json_path=None, max_styles=5):
+    """
+    Scans every KML document of a KMZ in one streaming pass each and prints
+    the structure report; json_path also writes the reports as JSON
+    ({kml filename: report}, '-' for stdout). Only counters are kept and
+    no index is built, so memory depends on the number of folders and
+    styles, not on the number of placemarks.
+    """
+    if not os.path.exists(kmz_path):
+        print(f"Error: File not found: {kmz_path}")
+        return None
+
+    try:
+        with zipfile.ZipFile(kmz_path, 'r') as z:
+            names = kml_names(z)
+        if not names:
+            print("Error: No KML file found in KMZ archive.")
+            return None
+
+        reports = {}
+        for kml_filename in names:
+            with open_kml(kmz_path, kml_filename) as kml_file:
+                reports[kml_filename] = structure_report(scan_counts(kml_file))
+
+        if json_path == '-':
+            print(json.dumps(reports, ensure_ascii=False, indent=2))
+        else:
+            for kml_filename, report in reports.items():
+                print_structure_report(kml_filename, report, max_styles)
+            if json_path:
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(reports, f, ensure_ascii=False, indent=2)
+                print(f"\nJSON report written to {json_path}")
+        return reports
+
+    except (zipfile.BadZipFile, xml.parsers.expat.ExpatError) as e:
+        print(f"Error: {e}")
+        return None
 
 def inspect_kml_structure(kmz_path):
     if not os.path.exists(kmz_path):
@@ -8,69 +111,45 @@ def inspect_kml_structure(kmz_path):
         return
 
     try:
-        with zipfile.ZipFile(kmz_path, 'r') as z:
-            kml_filename = None
-            for name in z.namelist():
-                if name.endswith('.kml'):
-                    kml_filename = name
-                    break
-            
-            if not kml_filename:
-                print("Error: No KML file found.")
-                return
-
-            print(f"Parsing {kml_filename}...")
-            with z.open(kml_filename) as kml_file:
-                tree = ET.parse(kml_file)
-                root = tree.getroot()
-                
-                ns = {}
-                if '}' in root.tag:
-                    ns_url = root.tag.split('}')[0].strip('{')
-                    ns = {'kml': ns_url}
-
-                # 1. List Styles and StyleMaps
-                styles = root.findall('.//kml:Style', ns) if ns else root.findall('.//Style')
-                print(f"\nFound {len(styles)} Styles.")
-                
-                style_maps = root.findall('.//kml:StyleMap', ns) if ns else root.findall('.//StyleMap')
-                print(f"Found {len(style_maps)} StyleMaps.")
-
-                # 2. Inspect Folders (Layers)
-                print("\nInspecting Folder Structure:")
-                
-                def print_structure(element, level=0):
-                    tag = element.tag.split('}')[-1]
-                    
-                    # Print name if it's a Folder or Document
-                    if tag in ['Folder', 'Document']:
-                        name = element.find('kml:name', ns) if ns else element.find('name')
-                        name_text = name.text if name is not None else "Unnamed"
-                        print(f"{'  ' * level}{tag}: {name_text}")
-                        
-                        placemarks = element.findall('kml:Placemark', ns) if ns else element.findall('Placemark')
-                        if placemarks:
-                            print(f"{'  ' * (level+1)}Contains {len(placemarks)} Placemarks")
-                            # Print first placemark details
-                            pm = placemarks[0]
-                            pm_style = pm.find('kml:styleUrl', ns) if ns else pm.find('styleUrl')
-                            print(f"{'  ' * (level+1)}Sample Placemark StyleUrl: {pm_style.text if pm_style is not None else 'None'}")
-
-                    # Recurse
-                    # We need to look for children that are Folders or Document
-                    # But actually we should just iterate over all children to be safe, or specific tags
-                    # For KML, Document contains Folders, Folders contain Folders/Placemarks
-                    
-                    # Find direct children that are Folder or Document
-                    for child in element:
-                        child_tag = child.tag.split('}')[-1]
-                        if child_tag in ['Folder', 'Document']:
-                            print_structure(child, level + 1)
-
-                print_structure(root)
+        index = load_index(kmz_path)
+        print(f"Parsing {index['kml_filename']}...")
+
+        # 1. List Styles and StyleMaps
+        print(f"\nFound {len(index['styles'])} Styles.")
+        print(f"Found {len(index['style_maps'])} StyleMaps.")
+
+        # 2. Inspect Folders (Layers)
+        print("\nInspecting Folder Structure:")
+
+        def print_structure(node, level=0):
+            name_text = node['name'] if node['name'] is not None else "Unnamed"
+            print(f"{'  ' * level}{node['tag']}: {name_text}")
+
+            if node['placemarks']:
+                print(f"{'  ' * (level+1)}Contains {node['placemarks']} Placemarks")
+                # Style of the first placemark
+                print(f"{'  ' * (level+1)}Sample Placemark StyleUrl: {node['sample_style'] or 'None'}")
+
+            # Folders and Documents nested in this one
+            for child in node['children']:
+                print_structure(child, level + 1)
+
+        for node in index['folders']:
+            print_structure(node, 1)
 
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    inspect_kml_structure("/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
+    parser = argparse.ArgumentParser(description="Show the Folder structure of a KMZ export.")
+    parser.add_argument('kmz', nargs='?', default="/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
+    parser.add_argument('--scan', action='store_true',
+                        help="Streaming report with per-folder geometry and style histograms (no index)")
+    parser.add_argument('--json', metavar='PATH', help="Also write the --scan report as JSON ('-' for stdout)")
+    parser.add_argument('--max-styles', type=int, default=5, help="Styles listed per folder in --scan")
+    args = parser.parse_args()
+
+    if args.scan or args.json:
+        scan_kmz_structure(args.kmz, args.json, args.max_styles)
+    else:
+        inspect_kml_structure(args.kmz)
@@ -1,19 +1,27 @@
-import zipfile
-import sys
 import os
+import zipfile
+
+from kmz_index import cached_index
+
+def inspect_kmz(kmz_path):
+    if not os.path.exists(kmz_path):
+        print(f"File not found: {kmz_path}")
+        return
 
-kmz_path = "/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz"
+    try:
+        with zipfile.ZipFile(kmz_path, 'r') as z:
+            print(f"Contents of {os.path.basename(kmz_path)}:")
+            for filename in z.namelist():
+                print(f" - {filename}")
 
-if not os.path.exists(kmz_path):
-    print(f"File not found: {kmz_path}")
-    sys.exit(1)
+        # KML-derived details only when an up-to-date index already exists; never scanned for a listing
+        index = cached_index(kmz_path)
+        if index:
+            print(f"{index['kml_filename']}: {index['placemark_count']} Placemarks (from index)")
+    except zipfile.BadZipFile:
+        print("Error: Bad Zip File")
+    except Exception as e:
+        print(f"Error: {e}")
 
-try:
-    with zipfile.ZipFile(kmz_path, 'r') as z:
-        print(f"Contents of {os.path.basename(kmz_path)}:")
-        for filename in z.namelist():
-            print(f" - {filename}")
-except zipfile.BadZipFile:
-    print("Error: Bad Zip File")
-except Exception as e:
-    print(f"Error: {e}")
+if __name__ == "__main__":
+    inspect_kmz("/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
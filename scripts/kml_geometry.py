@@ -0,0 +1,217 @@
+"""
+KML geometry parsing into NumPy arrays, with WKT and WKB output.
+
+A geometry is a (type, parts) tuple:
+    ('Point', array of shape (1, d))
+    ('LineString', array of shape (n, d))
+    ('Polygon', [outer ring, inner rings...])
+    ('MultiGeometry', [geometries...])
+where d is 2 or 3 (lon, lat[, alt]).
+"""
+import struct
+
+import numpy as np
+
+WKB_TYPES = {'Point': 1, 'LineString': 2, 'Polygon': 3, 'MultiGeometry': 7}
+
+def parse_coordinates(text):
+    """
+    Parses a KML <coordinates> block into an (n, d) float64 array in one
+    C-level pass; tuples are 'lon,lat[,alt]' separated by whitespace.
+    Raises ValueError unless every tuple has the same 2 or 3 numbers.
+    """
+    if not text or not text.strip():
+        return np.empty((0, 2))
+    tuples = text.split()
+    dim = tuples[0].count(',') + 1
+    if dim not in (2, 3) or text.count(',') != len(tuples) * (dim - 1):
+        raise ValueError(f"Malformed coordinates: {text[:100]!r}")
+    try:
+        values = np.fromstring(text.replace(',', ' '), dtype=np.float64, sep=' ')
+    except ValueError:
+        raise ValueError(f"Malformed coordinates: {text[:100]!r}") from None
+    if values.size != len(tuples) * dim:
+        raise ValueError(f"Malformed coordinates: {text[:100]!r}")
+    return values.reshape(-1, dim)
+
+def parse_points(texts):
+    """
+    Parses the <coordinates> of many Points in one C-level pass.
+
+    Returns (coords, dims): an (n, 3) float64 array, altitude 0 where the
+    tuple has none, and the number of values in each block. dims is 0 (and
+    the row NaN) where a block is empty, malformed or holds more than one
+    tuple; parse those one at a time with parse_coordinates.
+    """
+    blocks = [t.strip() if t else '' for t in texts]
+    dims = np.array([b.count(',') + 1 if b and len(b.split(None, 1)) == 1 else 0 for b in blocks], dtype=np.int64)
+    dims[(dims != 2) & (dims != 3)] = 0
+    coords = np.full((len(blocks), 3), np.nan)
+    rows = np.flatnonzero(dims)
+    try:
+        values = np.fromstring(','.join(blocks[i] for i in rows), dtype=np.float64, sep=',')
+    except ValueError:
+        values = None
+    if values is None or values.size != dims.sum():
+        # A bad number somewhere: find the blocks that parse on their own
+        for i in rows:
+            try:
+                if np.fromstring(blocks[i], dtype=np.float64, sep=',').size != dims[i]:
+                    dims[i] = 0
+            except ValueError:
+                dims[i] = 0
+        rows = np.flatnonzero(dims)
+        values = np.fromstring(','.join(blocks[i] for i in rows), dtype=np.float64, sep=',')
+
+    counts = dims[rows]
+    starts = np.cumsum(counts) - counts
+    coords[np.repeat(rows, counts), np.arange(values.size) - np.repeat(starts, counts)] = values
+    coords[dims == 2, 2] = 0.0
+    return coords, dims
+
+def _local(tag):
+    return tag.split('}')[-1]
+
+def _coords_of(elem):
+    for child in elem:
+        if _local(child.tag) == 'coordinates':
+            return parse_coordinates(child.text)
+    return np.empty((0, 2))
+
+def geometry_from_element(elem):
+    """
+    Builds a geometry from a Placemark or geometry element.
+    Returns None if there is no supported geometry.
+    """
+    tag = _local(elem.tag)
+    if tag == 'Placemark':
+        for child in elem:
+            geom = geometry_from_element(child)
+            if geom is not None:
+                return geom
+        return None
+
+    if tag == 'Point':
+        coords = _coords_of(elem)
+        return ('Point', coords[:1]) if len(coords) else None
+    if tag in ('LineString', 'LinearRing'):
+        return ('LineString', _coords_of(elem))
+    if tag == 'Polygon':
+        rings = []
+        for boundary in elem:
+            if _local(boundary.tag) not in ('outerBoundaryIs', 'innerBoundaryIs'):
+                continue
+            for ring in boundary:
+                if _local(ring.tag) == 'LinearRing':
+                    coords = _coords_of(ring)
+                    if _local(boundary.tag) == 'outerBoundaryIs':
+                        rings.insert(0, coords)
+                    else:
+                        rings.append(coords)
+        return ('Polygon', rings)
+    if tag == 'MultiGeometry':
+        parts = [g for g in (geometry_from_element(child) for child in elem) if g is not None]
+        return ('MultiGeometry', parts)
+    return None
+
+def _has_z(geom):
+    kind, parts = geom
+    if kind in ('Point', 'LineString'):
+        return parts.shape[1] > 2
+    return any(_has_z(p) if kind == 'MultiGeometry' else p.shape[1] > 2 for p in parts)
+
+def _wkt_coords(coords, dim):
+    if dim == 2:
+        coords = coords[:, :2]
+    elif coords.shape[1] < 3:
+        coords = np.column_stack([coords, np.zeros(len(coords))])
+    return ', '.join(' '.join(row) for row in coords.astype(str))
+
+def _wkt(geom, dim):
+    z = ' Z' if dim == 3 else ''
+    kind, parts = geom
+    name = {'MultiGeometry': 'GEOMETRYCOLLECTION'}.get(kind, kind.upper()) + z
+    if kind == 'Polygon':
+        # An empty inner ring is dropped; without an outer ring the polygon is empty
+        parts = parts[:1] + [r for r in parts[1:] if len(r)]
+        if not parts or not len(parts[0]):
+            return f"{name} EMPTY"
+        return f"{name} (" + ', '.join(f"({_wkt_coords(r, dim)})" for r in parts) + ")"
+    if not len(parts):
+        return f"{name} EMPTY"
+    if kind == 'MultiGeometry':
+        return f"{name} (" + ', '.join(_wkt(g, dim) for g in parts) + ")"
+    return f"{name} ({_wkt_coords(parts, dim)})"
+
+def to_wkt(geom):
+    """Formats a geometry as WKT (with Z if any part carries altitudes)."""
+    return _wkt(geom, 3 if _has_z(geom) else 2)
+
+def _wkb_coords(coords, dim):
+    if coords.shape[1] > dim:
+        coords = coords[:, :dim]
+    elif coords.shape[1] < dim:
+        coords = np.column_stack([coords, np.zeros(len(coords))])
+    return np.ascontiguousarray(coords, dtype='<f8').tobytes()
+
+def _wkb(geom, dim):
+    kind, parts = geom
+    code = WKB_TYPES[kind] + (1000 if dim == 3 else 0)
+    header = struct.pack('<BI', 1, code)
+    if kind == 'Point':
+        return header + _wkb_coords(parts, dim)
+    if kind == 'LineString':
+        return header + struct.pack('<I', len(parts)) + _wkb_coords(parts, dim)
+    if kind == 'Polygon':
+        body = [struct.pack('<I', len(parts))]
+        for ring in parts:
+            body.append(struct.pack('<I', len(ring)) + _wkb_coords(ring, dim))
+        return header + b''.join(body)
+    return header + struct.pack('<I', len(parts)) + b''.join(_wkb(g, dim) for g in parts)
+
+def to_wkb(geom):
+    """Encodes a geometry as little-endian ISO WKB bytes."""
+    return _wkb(geom, 3 if _has_z(geom) else 2)
+
+_POINT_WKB = {
+    2: np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')]),
+    3: np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8')]),
+}
+
+def encode_points(texts, fmt):
+    """
+    Encodes many Point <coordinates> blocks at once (see parse_points) as
+    WKT text or hex WKB ('wkt' / 'wkb'), the same output encode_geometry
+    gives for each. Returns a list with None for the blocks parse_points
+    leaves out.
+    """
+    coords, dims = parse_points(texts)
+    encoded = [None] * len(dims)
+    for dim in (2, 3):
+        rows = np.flatnonzero(dims == dim)
+        if not len(rows):
+            continue
+        if fmt == 'wkb':
+            records = np.empty(len(rows), dtype=_POINT_WKB[dim])
+            records['order'] = 1
+            records['type'] = WKB_TYPES['Point'] + (1000 if dim == 3 else 0)
+            for axis, name in enumerate('xyz'[:dim]):
+                records[name] = coords[rows, axis]
+            data = records.tobytes()
+            size = records.itemsize
+            for k, i in enumerate(rows):
+                encoded[i] = data[k * size:(k + 1) * size].hex()
+        else:
+            prefix = 'POINT Z (' if dim == 3 else 'POINT ('
+            for i, values in zip(rows, coords[rows, :dim].astype(str)):
+                encoded[i] = prefix + ' '.join(values) + ')'
+    return encoded
+
+def encode_geometry(elem, fmt):
+    """Returns the Placemark geometry as WKT text or hex WKB ('wkt' / 'wkb'), or '' if none."""
+    geom = geometry_from_element(elem)
+    if geom is None:
+        return ''
+    if fmt == 'wkb':
+        return to_wkb(geom).hex()
+    return to_wkt(geom)
@@ -0,0 +1,99 @@
+"""
+XML backend for the KML readers, and precomputed KML tag names.
+
+ElementTree is the default; KML_PARSER=lxml in the environment (or
+select_backend('lxml')) switches to lxml when it is installed. On the
+converter's workload ElementTree's C accelerator is the faster of the two
+(see benchmark_scripts.py --placemark-cost), because lxml builds a Python
+proxy object for every element it hands out; lxml is kept for documents
+beyond ElementTree's limits (huge_tree). Both backends produce elements
+with the same API, and comments and processing instructions are dropped
+so element children are always elements.
+
+Elements are matched on their Clark-notation tags ('{uri}name'), computed
+once per namespace by kml_tags, instead of through find() paths and an
+'if ns else' branch per lookup.
+"""
+import functools
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+BACKENDS = ('lxml', 'etree')
+
+_backend = None
+
+def select_backend(name=None):
+    """Sets the backend ('lxml', 'etree', or None for the default) and returns its name."""
+    global _backend
+    name = name or os.environ.get('KML_PARSER') or 'etree'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown KML parser backend: {name}")
+    if name == 'lxml' and lxml_etree is None:
+        raise ImportError("lxml is not installed (pip install lxml)")
+    _backend = name
+    return name
+
+def backend():
+    return _backend or select_backend()
+
+def iterparse(source, events=('end',)):
+    """Incremental parse of a file object, yielding (event, element)."""
+    if backend() == 'lxml':
+        return lxml_etree.iterparse(source, events=events, remove_comments=True, remove_pis=True,
+                                    huge_tree=True)
+    return ET.iterparse(source, events=events)
+
+def parse(source):
+    """Parses a whole document and returns its root element."""
+    if backend() == 'lxml':
+        parser = lxml_etree.XMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+        return lxml_etree.parse(source, parser).getroot()
+    return ET.parse(source).getroot()
+
+def tostring(element):
+    """Serializes an element from either backend as a str."""
+    if lxml_etree is not None and isinstance(element, lxml_etree._Element):
+        return lxml_etree.tostring(element, encoding='unicode')
+    return ET.tostring(element, encoding='unicode')
+
+class KmlTags:
+    """Clark-notation names of the KML elements the readers use, for one namespace URI."""
+
+    NAMES = (
+        'Document', 'Folder', 'Placemark', 'name', 'description', 'styleUrl', 'Point', 'coordinates',
+        'Style', 'StyleMap', 'IconStyle', 'Icon', 'href', 'color', 'Pair', 'key', 'LineString',
+        'LinearRing', 'Polygon', 'MultiGeometry', 'ExtendedData', 'Data', 'value', 'SchemaData', 'SimpleData',
+    )
+
+    def __init__(self, uri=None):
+        self.uri = uri
+        prefix = '{' + uri + '}' if uri else ''
+        for name in self.NAMES:
+            setattr(self, name, prefix + name)
+
+@functools.lru_cache(maxsize=None)
+def kml_tags(uri=None):
+    return KmlTags(uri)
+
+def tags_for(ns):
+    """KmlTags for a {'kml': uri} mapping as returned by kmz_index.detect_namespace."""
+    return kml_tags(ns.get('kml') if ns else None)
+
+def first_child(element, tag):
+    """First direct child with the given tag, or None (element.find(tag) without path compilation)."""
+    for child in element:
+        if child.tag == tag:
+            return child
+    return None
+
+def first_descendant(element, tag):
+    """First descendant with the given tag in document order, or None (element.find('.//' + tag))."""
+    for child in element.iter(tag):
+        if child is not element:
+            return child
+    return None
@@ -0,0 +1,257 @@
+import contextlib
+import hashlib
+import io
+import mmap
+import os
+import struct
+import tempfile
+import zipfile
+import zlib
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'digital-forest-cards', 'kml')
+
+# Compressed bytes per inflate step (about 0.5 MB of KML). Larger steps measured
+# slower: the inflated buffer falls out of CPU cache before the parser reads it.
+INFLATE_CHUNK = 32 * 1024
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\003\004'
+
+def kml_names(z):
+    """
+    Returns the .kml entries of an open ZipFile in archive order. The first
+    one is the root document (usually doc.kml); others are linked from it.
+    """
+    return [name for name in z.namelist() if name.lower().endswith('.kml')]
+
+def cache_dir():
+    return os.environ.get('KMZ_KML_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+def _data_offset(f, info):
+    """Start of an entry's data in the archive, past its local file header."""
+    f.seek(info.header_offset)
+    header = f.read(_LOCAL_HEADER.size)
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    return info.header_offset + _LOCAL_HEADER.size + fields[10] + fields[11]
+
+class MappedFile(io.RawIOBase):
+    """
+    Read-only file over a memory-mapped byte range. read() slices the map
+    without any decompression; buffer is a zero-copy memoryview of the whole
+    range for parsers that accept one (expat's Parse).
+    """
+
+    def __init__(self, path, offset=0, length=None):
+        super().__init__()
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._start = offset
+        self._end = size if length is None else offset + length
+        self._pos = offset
+        self._view = None
+
+    @property
+    def buffer(self):
+        if self._view is None:
+            self._view = memoryview(self._map)[self._start:self._end] if self._map else memoryview(b'')
+        return self._view
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = self._end if size is None or size < 0 else min(self._pos + size, self._end)
+        data = self._map[self._pos:end] if self._map else b''
+        self._pos = max(end, self._pos)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def tell(self):
+        return self._pos - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.tell(), io.SEEK_END: self._end - self._start}[whence]
+        self._pos = self._start + max(0, min(base + offset, self._end - self._start))
+        return self.tell()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        super().close()
+
+class InflatingFile(io.RawIOBase):
+    """
+    Reads a DEFLATE entry straight from the archive, inflating
+    INFLATE_CHUNK compressed bytes at a time so the parser is served from a
+    large buffer instead of many small decompressor calls. The CRC is
+    checked at the end of the entry, like zipfile does.
+    """
+
+    def __init__(self, kmz_path, info, chunk_size=INFLATE_CHUNK):
+        super().__init__()
+        self._f = open(kmz_path, 'rb')
+        self._info = info
+        self._chunk_size = chunk_size
+        self._data_start = _data_offset(self._f, info)
+        self._rewind()
+
+    def _rewind(self):
+        self._f.seek(self._data_start)
+        self._remaining = self._info.compress_size
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._crc = 0
+        self._buf = b''
+        self._buf_pos = 0
+        self._pos = 0
+        self._eof = False
+
+    def _inflate(self):
+        """Inflates and returns the next non-empty chunk of the entry, or b'' at its end."""
+        while not self._eof:
+            compressed = self._f.read(min(self._chunk_size, self._remaining))
+            self._remaining -= len(compressed)
+            data = self._inflater.decompress(compressed)
+            if not self._remaining or not compressed:
+                data += self._inflater.flush()
+                self._eof = True
+                self._crc = zlib.crc32(data, self._crc)
+                if self._crc != self._info.CRC:
+                    raise zipfile.BadZipFile(f"Bad CRC-32 for file {self._info.filename!r}")
+            else:
+                self._crc = zlib.crc32(data, self._crc)
+            if data:
+                return data
+        return b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        available = len(self._buf) - self._buf_pos
+        if size < 0 or available < size:
+            # Collect whole chunks and join once, so large reads stay linear
+            chunks = [self._buf[self._buf_pos:]]
+            while size < 0 or available < size:
+                data = self._inflate()
+                if not data:
+                    break
+                chunks.append(data)
+                available += len(data)
+            self._buf = b''.join(chunks)
+            self._buf_pos = 0
+        data = self._buf[self._buf_pos:self._buf_pos + size] if size >= 0 else self._buf[self._buf_pos:]
+        self._buf_pos += len(data)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._info.file_size
+        if offset < self._pos:
+            self._rewind()
+        while self._pos < offset:
+            if not self.read(min(offset - self._pos, self._chunk_size)):
+                break
+        return self._pos
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+def _cache_path(kmz_path, info):
+    # Keyed by entry content (CRC and size), so a rewritten archive misses the cache
+    key = hashlib.sha1(f"{os.path.abspath(kmz_path)}\x1f{info.filename}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), f"{key}-{info.CRC:08x}-{info.file_size}.kml")
+
+def _cached_kml(kmz_path, info):
+    """Returns the sidecar copy of an inflated entry, writing it on first use."""
+    path = _cache_path(kmz_path, info)
+    if os.path.exists(path) and os.path.getsize(path) == info.file_size:
+        return path
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Private temp file, so concurrent workers inflating the same entry do not collide
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with InflatingFile(kmz_path, info) as src, os.fdopen(fd, 'wb') as dst:
+            for chunk in iter(lambda: src.read(INFLATE_CHUNK * 4), b''):
+                dst.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+    # Drop copies of older versions of the same entry, once the new one is in place
+    prefix = os.path.basename(path).split('-')[0] + '-'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith('.kml') and name != os.path.basename(path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, name))
+    return path
+
+@contextlib.contextmanager
+def open_kml(kmz_path, kml_filename=None, cache=False):
+    """
+    Opens a KML entry of a KMZ as a seekable binary file.
+
+    STORED entries are memory-mapped in place (MappedFile). DEFLATE entries
+    are inflated in large chunks (InflatingFile), or with cache=True
+    inflated once into a sidecar file under cache_dir() that is then
+    memory-mapped on every later run. Other compression methods and
+    encrypted entries fall back to ZipFile.open. kml_filename defaults to
+    the root document.
+    """
+    with zipfile.ZipFile(kmz_path, 'r') as z:
+        if kml_filename is None:
+            names = kml_names(z)
+            if not names:
+                raise ValueError(f"No KML file found in {kmz_path}")
+            kml_filename = names[0]
+        info = z.getinfo(kml_filename)
+        encrypted = info.flag_bits & 0x1
+
+        if not encrypted and info.compress_type == zipfile.ZIP_STORED:
+            with open(kmz_path, 'rb') as f:
+                offset = _data_offset(f, info)
+            kml_file = MappedFile(kmz_path, offset, info.file_size)
+        elif not encrypted and info.compress_type == zipfile.ZIP_DEFLATED:
+            if cache:
+                kml_file = MappedFile(_cached_kml(kmz_path, info))
+            else:
+                kml_file = InflatingFile(kmz_path, info)
+        else:
+            kml_file = z.open(kml_filename)
+
+        with kml_file:
+            yield kml_file
@@ -0,0 +1,410 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+from extended_data import merge_types, value_type
+from kmz_archive import kml_names, open_kml
+
+INDEX_VERSION = 6
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'digital-forest-cards', 'kmz-index')
+
+GEOMETRY_TAGS = ('Point', 'LineString', 'LinearRing', 'Polygon', 'MultiGeometry', 'Model', 'Track', 'MultiTrack')
+
+def find_kml_name(z):
+    """Returns the name of the first (root) .kml entry of an open ZipFile, or None."""
+    names = kml_names(z)
+    return names[0] if names else None
+
+def detect_namespace(root):
+    """Returns the {'kml': uri} mapping for a root element, or {} if it has no namespace."""
+    if '}' in root.tag:
+        return {'kml': root.tag.split('}')[0].strip('{')}
+    return {}
+
+def index_dir():
+    return os.environ.get('KMZ_INDEX_DIR', DEFAULT_INDEX_DIR)
+
+def _index_path(kmz_path):
+    key = hashlib.sha1(os.path.abspath(kmz_path).encode('utf-8')).hexdigest()
+    return os.path.join(index_dir(), key + '.json')
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _folder_node(tag):
+    return {'tag': tag, 'name': None, 'placemarks': 0, 'total_placemarks': 0, 'sample_style': None,
+            'geometry': {}, 'styles': {}, 'children': []}
+
+def _count(histogram, key):
+    histogram[key] = histogram.get(key, 0) + 1
+
+def _scan_kml(kml_file, ranges=True):
+    """
+    Reads a KML stream once with expat and returns the index body:
+    styles, style maps, folder tree (with direct and total placemark
+    counts and geometry type and styleUrl histograms per folder),
+    placemark byte ranges and geometry types, placemark child tags and
+    ExtendedData field names, inferred value types and declared Schema
+    fields.
+
+    With ranges=False only counters are kept: the per-placemark lists are
+    left empty and ExtendedData values are not typed, so memory does not
+    grow with the number of placemarks.
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    namespace = None
+    prefix = ''
+    namespaces = {}  # xmlns / xmlns:* declarations of the root element
+    stack = []  # local tags of open elements
+    text = None
+
+    styles = {}
+    style_maps = {}
+    root_folder = _folder_node('kml')
+    folders = [root_folder]
+    offsets = []
+    lengths = []
+    geometries = []
+    placemark_count = 0
+    geometry_counts = {}
+    style_counts = {}
+    placemark_tags = set()
+    data_fields = set()
+    simple_data_fields = set()
+    field_types = {}  # ExtendedData field -> inferred type; 'text' stops inference
+    schemas = {}      # Schema id -> {field: declared type}
+
+    style = None      # Style being read
+    style_map = None  # (id, pairs) of StyleMap being read
+    pair = None
+    placemark = None  # {'start', 'geometry', 'style', 'field'} of Placemark being read
+    range_open = False  # last Placemark's length waits for the token after its end tag
+    schema = None     # fields of the Schema being read
+
+    def capture():
+        nonlocal text
+        text = []
+        parser.CharacterDataHandler = text.append
+
+    def take():
+        nonlocal text
+        value = ''.join(text).strip() if text is not None else ''
+        text = None
+        parser.CharacterDataHandler = None
+        return value
+
+    def close_range(*_):
+        # The parser is at the first token after the Placemark, whatever its end tag looked like
+        nonlocal range_open
+        lengths[-1] = parser.CurrentByteIndex - offsets[-1]
+        range_open = False
+        parser.CharacterDataHandler = None
+
+    def start(name, attrs):
+        nonlocal namespace, prefix, style, style_map, pair, placemark, schema
+        if range_open:
+            close_range()
+        if namespace is None:
+            prefix = name.split(':')[0] if ':' in name else ''
+            namespace = attrs.get('xmlns:' + prefix if prefix else 'xmlns', '')
+            namespaces.update((k, v) for k, v in attrs.items() if k == 'xmlns' or k.startswith('xmlns:'))
+        tag = name.split(':')[-1]
+        parent = stack[-1] if stack else None
+        stack.append(tag)
+
+        if placemark is not None:
+            if parent == 'Placemark':
+                placemark_tags.add(tag)
+                if tag == 'styleUrl':
+                    capture()
+            if tag in GEOMETRY_TAGS and placemark['geometry'] is None:
+                placemark['geometry'] = tag
+            elif tag == 'Data' and parent == 'ExtendedData':
+                placemark['field'] = attrs.get('name')
+                data_fields.add(placemark['field'])
+            elif tag == 'value' and parent == 'Data':
+                if ranges and field_types.get(placemark['field']) != 'text':
+                    capture()
+            elif tag == 'SimpleData' and parent == 'SchemaData':
+                placemark['field'] = attrs.get('name')
+                simple_data_fields.add(placemark['field'])
+                if ranges and field_types.get(placemark['field']) != 'text':
+                    capture()
+            return
+
+        if tag in ('Folder', 'Document'):
+            node = _folder_node(tag)
+            folders[-1]['children'].append(node)
+            folders.append(node)
+        elif tag == 'Placemark':
+            placemark = {'start': parser.CurrentByteIndex, 'geometry': None, 'style': None, 'field': None}
+        elif tag == 'Schema':
+            schema = schemas.setdefault(attrs.get('id') or attrs.get('name') or '', {})
+        elif tag == 'SimpleField' and schema is not None and attrs.get('name'):
+            schema[attrs['name']] = (attrs.get('type') or 'string').lower()
+        elif tag == 'Style':
+            style = {'id': attrs.get('id'), 'color': None, 'scale': None, 'icon': None}
+        elif tag == 'StyleMap':
+            style_map = (attrs.get('id'), {})
+        elif tag == 'Pair' and style_map is not None:
+            pair = {}
+        elif tag == 'name' and parent in ('Folder', 'Document'):
+            capture()
+        elif style is not None and 'IconStyle' in stack and tag in ('color', 'scale', 'href'):
+            capture()
+        elif pair is not None and tag in ('key', 'styleUrl'):
+            capture()
+
+    def end(name):
+        nonlocal style, style_map, pair, placemark, schema, placemark_count, range_open
+        if range_open:
+            close_range()
+        tag = stack.pop()
+        parent = stack[-1] if stack else None
+
+        if placemark is not None:
+            if tag == 'styleUrl' and parent == 'Placemark':
+                placemark['style'] = take()
+            elif (tag == 'value' or tag == 'SimpleData') and text is not None:
+                value = take()
+                if value:
+                    field = placemark['field']
+                    field_types[field] = merge_types(field_types.get(field), value_type(value))
+            elif tag == 'Placemark':
+                geometry = placemark['geometry'] or ''
+                if ranges:
+                    offsets.append(placemark['start'])
+                    lengths.append(None)
+                    geometries.append(geometry)
+                    # Closed by the next start or end tag, or by the text in between
+                    range_open = True
+                    parser.CharacterDataHandler = close_range
+                placemark_count += 1
+                _count(geometry_counts, geometry or 'None')
+                _count(style_counts, placemark['style'] or 'None')
+                folder = folders[-1]
+                folder['placemarks'] += 1
+                _count(folder['geometry'], geometry or 'None')
+                _count(folder['styles'], placemark['style'] or 'None')
+                if folder['sample_style'] is None:
+                    folder['sample_style'] = placemark['style'] or ''
+                placemark = None
+            return
+
+        if tag in ('Folder', 'Document'):
+            node = folders.pop()
+            node['total_placemarks'] += node['placemarks']
+            folders[-1]['total_placemarks'] += node['total_placemarks']
+        elif tag == 'Schema':
+            schema = None
+        elif tag == 'name' and parent in ('Folder', 'Document'):
+            folders[-1]['name'] = take()
+        elif tag == 'Style' and style is not None:
+            if style['id']:
+                styles[style.pop('id')] = style
+            style = None
+        elif style is not None and tag in ('color', 'scale', 'href') and text is not None:
+            style['icon' if tag == 'href' else tag] = take() or None
+        elif tag == 'StyleMap' and style_map is not None:
+            if style_map[0]:
+                style_maps[style_map[0]] = style_map[1]
+            style_map = None
+        elif tag == 'Pair' and pair is not None:
+            if pair.get('key'):
+                style_map[1][pair['key']] = pair.get('styleUrl')
+            pair = None
+        elif pair is not None and tag in ('key', 'styleUrl'):
+            pair[tag] = take()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    if hasattr(kml_file, 'buffer'):
+        # Memory-mapped entry: parse the whole buffer in place
+        parser.Parse(kml_file.buffer, True)
+        size = len(kml_file.buffer)
+    else:
+        parser.ParseFile(kml_file)
+        size = kml_file.tell()
+    if range_open:
+        # The Placemark end tag was the last token of the document
+        lengths[-1] = size - offsets[-1]
+
+    geometry_types = sorted(set(geometries))
+    codes = {g: i for i, g in enumerate(geometry_types)}
+    return {
+        'namespace': namespace or '',
+        'prefix': prefix,
+        'namespaces': namespaces,
+        'styles': styles,
+        'style_maps': style_maps,
+        'folders': root_folder['children'],
+        'placemark_count': placemark_count,
+        'placemarks': {
+            'offsets': offsets,
+            'lengths': lengths,
+            'geometry_types': geometry_types,
+            'geometry': [codes[g] for g in geometries],
+        },
+        'geometry_counts': geometry_counts,
+        'style_counts': style_counts,
+        # Placemarks outside any Folder/Document
+        'top_level': {'placemarks': root_folder['placemarks'], 'geometry': root_folder['geometry'],
+                      'styles': root_folder['styles']},
+        'placemark_tags': sorted(placemark_tags),
+        'extended_data': {
+            'data': sorted(f for f in data_fields if f),
+            'simple_data': sorted(f for f in simple_data_fields if f),
+            # Fields present only with empty values have type None
+            'types': {f: field_types.get(f) for f in sorted((data_fields | simple_data_fields) - {None})},
+            'schemas': schemas,
+        },
+    }
+
+def build_index(kmz_path):
+    """Parses the KMZ once and returns its index (without writing it)."""
+    with zipfile.ZipFile(kmz_path, 'r') as z:
+        kml_filename = find_kml_name(z)
+        if not kml_filename:
+            raise ValueError(f"No KML file found in {kmz_path}")
+
+        entries = [{'name': info.filename, 'size': info.file_size, 'compressed_size': info.compress_size}
+                   for info in z.infolist()]
+
+    with open_kml(kmz_path, kml_filename) as kml_file:
+        index = _scan_kml(kml_file)
+
+    index['kml_filename'] = kml_filename
+    index['entries'] = entries
+    return index
+
+def load_index(kmz_path, rebuild=False):
+    """
+    Returns the index of a KMZ, building and persisting it if needed.
+
+    The cached index is keyed by absolute path and checked against the
+    archive's size and mtime; if only the mtime changed, the content hash
+    decides whether the index can be reused.
+    """
+    stat = os.stat(kmz_path)
+    cache_path = _index_path(kmz_path)
+    cached = None
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except ValueError:
+            cached = None
+
+    if cached and cached.get('version') == INDEX_VERSION and cached['key']['size'] == stat.st_size:
+        if cached['key']['mtime'] == stat.st_mtime:
+            return cached
+        content_hash = _file_sha256(kmz_path)
+        if cached['key']['sha256'] == content_hash:
+            cached['key']['mtime'] = stat.st_mtime
+            _write_index(cache_path, cached)
+            return cached
+    else:
+        content_hash = _file_sha256(kmz_path)
+
+    index = build_index(kmz_path)
+    index['version'] = INDEX_VERSION
+    index['key'] = {
+        'path': os.path.abspath(kmz_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': content_hash,
+    }
+    _write_index(cache_path, index)
+    return index
+
+def cached_index(kmz_path):
+    """Returns the persisted index if it is up to date, without building one."""
+    cache_path = _index_path(kmz_path)
+    if not os.path.exists(cache_path):
+        return None
+    stat = os.stat(kmz_path)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except ValueError:
+        # Corrupt or truncated; the next load_index rebuilds it
+        return None
+    key = cached.get('key', {})
+    if cached.get('version') != INDEX_VERSION or key.get('size') != stat.st_size or key.get('mtime') != stat.st_mtime:
+        return None
+    return cached
+
+def _write_index(cache_path, index):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # Private temp file, so concurrent writers of the same index do not collide
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix=os.path.basename(cache_path) + '.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def iter_placemarks(kmz_path, index, indices):
+    """
+    Parses only the given Placemarks, using their byte ranges from the index.
+    Yields (i, element) in document order.
+    """
+    offsets = index['placemarks']['offsets']
+    lengths = index['placemarks']['lengths']
+    # Fragments may use any prefix declared on the root (kml:, gx:, atom:, ...), so all are re-declared
+    ns_attrs = ''.join(f' {name}={quoteattr(uri)}' for name, uri in index['namespaces'].items())
+    open_tag = ('<kml' + ns_attrs + '>').encode('utf-8')
+
+    with open_kml(kmz_path, index['kml_filename']) as kml_file:
+        for i in sorted(indices):
+            kml_file.seek(offsets[i])
+            fragment = kml_file.read(lengths[i])
+            yield i, ET.fromstring(open_tag + fragment + b'</kml>')[0]
+
+def entry_index(kmz_path, kml_filename=None):
+    """
+    Returns the index body of a KML entry. The root document's is the
+    persisted index, built if needed; other entries are scanned directly.
+    """
+    index = load_index(kmz_path)
+    if kml_filename is None or kml_filename == index['kml_filename']:
+        return index
+    with open_kml(kmz_path, kml_filename) as kml_file:
+        return _scan_kml(kml_file)
+
+def scan_counts(kml_file):
+    """Scans a KML stream for its styles, folder tree and counters only (see _scan_kml)."""
+    return _scan_kml(kml_file, ranges=False)
+
+def scan_extended_data(kmz_path, kml_filename=None):
+    """
+    Returns the extended_data section (field names, inferred types, Schema
+    declarations) of a KML entry (see entry_index).
+    """
+    return entry_index(kmz_path, kml_filename)['extended_data']
+
+def style_maps_to_normal(index):
+    """Returns {StyleMap id: normal style id}, the shape convert_kmz_to_csv uses."""
+    return {sm_id: pairs['normal'].strip('#')
+            for sm_id, pairs in index['style_maps'].items() if pairs.get('normal')}
+
+if __name__ == "__main__":
+    kmz_file = sys.argv[1] if len(sys.argv) > 1 else "/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz"
+    idx = load_index(kmz_file, rebuild='--rebuild' in sys.argv)
+    print(f"Index for {kmz_file}: {_index_path(kmz_file)}")
+    print(f"  {idx['placemark_count']} Placemarks, {len(idx['styles'])} Styles, {len(idx['style_maps'])} StyleMaps")
+    print(f"  Geometry: {idx['geometry_counts']}")
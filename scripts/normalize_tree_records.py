@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from output_sinks import open_sink, read_rows
+from tree_spatial import encode_plus_codes, to_float, wgs84_to_itm
+
+# Columns of the digital-forest tree records (municipality-examples.csv), in file order
+TREE_RECORD_FIELDS = [
+    '_source',
+    'attributes-age', 'attributes-age-estimated', 'attributes-bark-circumference', 'attributes-bark-diameter',
+    'attributes-canopy-area', 'attributes-canopy-diameter', 'attributes-description', 'attributes-genus',
+    'attributes-good-status', 'attributes-health-score', 'attributes-height', 'attributes-num-barks',
+    'attributes-species', 'attributes-species-clean-en', 'attributes-species-clean-he', 'attributes-year-planted',
+    'cad_code', 'cad_gush', 'cad_parcel', 'cluster-size', 'coords',
+    'environment-description', 'environment-grass', 'environment-habitat', 'environment-habitat-volume',
+    'environment-irrigated', 'environment-irrigation-type', 'environment-irrigation-water-quality',
+    'environment-lighting', 'environment-pavement', 'environment-signage', 'environment-sitting-area',
+    'environment-type',
+    'idx',
+    'importance-aesthetic', 'importance-botanical', 'importance-community', 'importance-historic',
+    'importance-symbolic',
+    'location-accuracy', 'location-address', 'location-block', 'location-city', 'location-elevation',
+    'location-grid', 'location-plot', 'location-street', 'location-street-number',
+    'location-x', 'location-x-il', 'location-y', 'location-y-il',
+    'meta-collection-type', 'meta-date', 'meta-internal-id', 'meta-source', 'meta-source-type', 'meta-tree-id',
+    'meta-url',
+    'muni_code', 'muni_name', 'muni_name_en', 'muni_region',
+    'photos-bark', 'photos-fruit', 'photos-general', 'photos-ground', 'photos-leaf', 'photos-top-view',
+    'photos-wide-view',
+    'road_id', 'road_name', 'road_type', 'stat_area_code',
+]
+
+# Typed columns for Parquet/Arrow output (see output_sinks.ColumnarSink)
+TREE_RECORD_TYPES = {
+    'location-x': 'float', 'location-y': 'float', 'location-x-il': 'float', 'location-y-il': 'float',
+    'idx': 'int', 'cluster-size': 'int',
+}
+
+# fruit_type (from STYLE_MAPPING) -> (species he, species en, genus), where the category is one species or genus
+FRUIT_SPECIES = {
+    'Lemon': ('לימון', 'Citrus Limon', 'Citrus limon'),
+    'Kumquat': ('קומקוואט', 'Citrus Japonica', 'Citrus japonica'),
+    'Orange/Clementine': ('', '', 'Citrus'),
+    'Grapefruit/Pomelo': ('', '', 'Citrus'),
+}
+
+class TreeRecordNormalizer:
+    """
+    Maps converter rows (convert_kmz_to_csv FIELDNAMES) to tree records.
+
+    Rows are handled in batches: ITM coordinates and the Plus Code
+    meta-tree-id are computed for a whole batch with NumPy, then the record
+    dicts are filled from a template. Placemarks without a point (e.g.
+    LineStrings) have no coordinates and are skipped. keep lists converter
+    columns appended as-is after the record columns (e.g. fruit_type,
+    legitimacy).
+    """
+
+    def __init__(self, source, meta=None, id_prefix='fruit', keep=()):
+        self.template = dict.fromkeys(TREE_RECORD_FIELDS, '')
+        self.template['_source'] = source
+        self.template['cluster-size'] = 1
+        self.template.update(meta or {})
+        self.id_prefix = id_prefix
+        self.keep = list(keep)
+        self.fieldnames = TREE_RECORD_FIELDS + [c for c in self.keep if c not in TREE_RECORD_FIELDS]
+        self.seen = 0
+        self.skipped = 0
+
+    def normalize(self, rows):
+        """Returns the tree records for a batch of converter rows."""
+        lon = to_float([r.get('longitude') for r in rows])
+        lat = to_float([r.get('latitude') for r in rows])
+        valid = ~(np.isnan(lon) | np.isnan(lat))
+        positions = np.flatnonzero(valid)
+        first = self.seen
+        self.seen += len(rows)
+        self.skipped += len(rows) - positions.size
+        if not positions.size:
+            return []
+
+        lon, lat = lon[positions], lat[positions]
+        x, y = wgs84_to_itm(lon, lat)
+        tree_ids = encode_plus_codes(lon, lat).tolist()
+        lon, lat, x, y = lon.tolist(), lat.tolist(), x.tolist(), y.tolist()
+
+        records = []
+        for k, i in enumerate(positions.tolist()):
+            row = rows[i]
+            record = self.template.copy()
+            species = FRUIT_SPECIES.get(row.get('fruit_type') or '', ('', '', ''))
+            record.update({
+                'attributes-description': row.get('description') or '',
+                'attributes-species': row.get('fruit_type') or '',
+                'attributes-species-clean-he': species[0],
+                'attributes-species-clean-en': species[1],
+                'attributes-genus': species[2],
+                'coords': f'[{lon[k]!r}, {lat[k]!r}]',
+                'idx': first + i,
+                'location-x': lon[k],
+                'location-y': lat[k],
+                'location-x-il': x[k],
+                'location-y-il': y[k],
+                'meta-internal-id': f'{self.id_prefix}-{first + i + 1}',
+                'meta-tree-id': tree_ids[k],
+            })
+            for column in self.keep:
+                record[column] = row.get(column, '')
+            records.append(record)
+        return records
+
+    def iter_records(self, rows, batch_size=50000):
+        """Streams tree records for an iterable of converter rows, one batch in memory at a time."""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from self.normalize(batch)
+                batch = []
+        if batch:
+            yield from self.normalize(batch)
+
+def normalize_tree_records(input_path, output_path, meta=None, id_prefix='fruit', keep=(), batch_size=50000):
+    """
+    Writes the placemarks of a KMZ, or of a converted CSV/Parquet/Arrow
+    file, as tree records in the municipality-examples.csv schema.
+    meta fills constant columns (meta-source, meta-date, ...).
+    Returns (records written, placemarks skipped).
+    """
+    if not os.path.exists(input_path):
+        print(f"Error: File not found: {input_path}")
+        return None
+
+    if input_path.lower().endswith('.kmz'):
+        from convert_kmz_to_csv import iter_kmz_rows
+        rows = iter_kmz_rows(input_path)
+    else:
+        rows = read_rows(input_path)
+
+    normalizer = TreeRecordNormalizer(os.path.basename(input_path), meta, id_prefix, keep)
+    started = time.perf_counter()
+    count = 0
+    with open_sink(output_path, normalizer.fieldnames, TREE_RECORD_TYPES) as writer:
+        for record in normalizer.iter_records(rows, batch_size):
+            writer.write(record)
+            count += 1
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {count} tree records to {output_path} in {elapsed:.1f}s "
+          f"({count / elapsed if elapsed else 0:.0f}/s); skipped {normalizer.skipped} placemarks without a point")
+    return count, normalizer.skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize converted placemarks to the tree record schema.")
+    parser.add_argument('input', nargs='?', default="fruit_trees_2022.csv", help="KMZ, or convert_kmz_to_csv output")
+    parser.add_argument('-o', '--output', default="fruit_trees_2022.records.csv", help="CSV/Parquet/Arrow path")
+    parser.add_argument('--source', default="עצי פרי 2022", help="meta-source")
+    parser.add_argument('--source-type', default="", help="meta-source-type")
+    parser.add_argument('--collection-type', default="", help="meta-collection-type")
+    parser.add_argument('--date', default="", help="meta-date (YYYY-MM-DD)")
+    parser.add_argument('--url', default="", help="meta-url")
+    parser.add_argument('--id-prefix', default="fruit", help="meta-internal-id prefix")
+    parser.add_argument('--keep', nargs='*', default=[], help="Converter columns to append, e.g. fruit_type legitimacy")
+    args = parser.parse_args()
+
+    meta = {
+        'meta-source': args.source,
+        'meta-source-type': args.source_type,
+        'meta-collection-type': args.collection_type,
+        'meta-date': args.date,
+        'meta-url': args.url,
+    }
+    normalize_tree_records(args.input, args.output, meta, args.id_prefix, args.keep)
@@ -0,0 +1,195 @@
+import csv
+import os
+
+# Columns written as float64 instead of text
+FLOAT_COLUMNS = ('longitude', 'latitude')
+# Low-cardinality columns written dictionary-encoded
+CATEGORICAL_COLUMNS = ('layer', 'icon', 'color', 'style_url', 'fruit_type', 'legitimacy')
+
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet/Arrow output (pip install pyarrow)")
+    return pyarrow
+
+def _to_float(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+class CsvSink:
+    """
+    Writes rows through csv.DictWriter. Typed values are written as text (dates in ISO format).
+    resume_at reopens an existing file, truncated to that byte position (see flush), and appends.
+    """
+
+    def __init__(self, path, fieldnames, resume_at=None):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        if resume_at is None:
+            self._f = open(path, 'w', newline='', encoding='utf-8')
+        else:
+            self._f = open(path, 'r+', newline='', encoding='utf-8')
+            self._f.truncate(resume_at)
+            self._f.seek(resume_at)
+        self._writer = csv.DictWriter(self._f, fieldnames=self.fieldnames)
+        if resume_at is None:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def flush(self):
+        """Flushes the rows written so far to disk and returns the file's byte position."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ColumnarSink:
+    """
+    Writes rows as Parquet (.parquet) or Arrow IPC (.arrow/.feather) files.
+
+    Rows are buffered per column and written as one record batch every
+    batch_size rows. FLOAT_COLUMNS are float64 and CATEGORICAL_COLUMNS are
+    dictionary-encoded against one dictionary per column that grows across
+    batches (Arrow IPC files allow dictionary deltas, not replacements).
+    types maps further columns to 'int', 'float' or
+    'date' (int64, float64, date32) for already-converted values; every
+    other column is a string.
+    """
+
+    def __init__(self, path, fieldnames, batch_size=65536, types=None):
+        pa = _require_pyarrow()
+        typed = {'int': pa.int64(), 'float': pa.float64(), 'date': pa.date32()}
+        self.types = {name: typed[kind] for name, kind in (types or {}).items() if kind in typed}
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self._columns = {name: [] for name in self.fieldnames}
+        self._rows = 0
+        # Categorical column -> {value: dictionary index}, in first-seen order. Seeded with ''
+        # because pyarrow treats growing an empty dictionary as a replacement, not a delta
+        self._dictionaries = {name: {'': 0} for name in self.fieldnames
+                              if name in CATEGORICAL_COLUMNS and name not in FLOAT_COLUMNS and name not in self.types}
+
+        fields = []
+        for name in self.fieldnames:
+            if name in FLOAT_COLUMNS:
+                fields.append(pa.field(name, pa.float64()))
+            elif name in self.types:
+                fields.append(pa.field(name, self.types[name]))
+            elif name in CATEGORICAL_COLUMNS:
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        self.schema = pa.schema(fields)
+
+        if path.lower().endswith('.parquet'):
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            import pyarrow.ipc
+            self._writer = pyarrow.ipc.new_file(
+                path, self.schema, options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def write(self, row):
+        for name in self.fieldnames:
+            self._columns[name].append(row.get(name))
+        self._rows += 1
+        if self._rows >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        pa = _require_pyarrow()
+        arrays = []
+        for field in self.schema:
+            values = self._columns[field.name]
+            if field.name in FLOAT_COLUMNS:
+                arrays.append(pa.array([_to_float(v) for v in values], type=pa.float64()))
+            elif field.name in self.types:
+                arrays.append(pa.array(values, type=field.type))
+            elif field.name in CATEGORICAL_COLUMNS:
+                arrays.append(self._encode(pa, field.name, values))
+            else:
+                arrays.append(pa.array(values, type=pa.string()))
+            values.clear()
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self._rows = 0
+
+    def _encode(self, pa, name, values):
+        dictionary = self._dictionaries[name]
+        indices = [None if v is None else dictionary.setdefault(v, len(dictionary)) for v in values]
+        return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()),
+                                              pa.array(list(dictionary), type=pa.string()))
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_columnar(path):
+    return path.lower().endswith(COLUMNAR_EXTENSIONS)
+
+def open_sink(path, fieldnames, types=None, resume_at=None):
+    """
+    Opens a sink for path, chosen by its extension (.parquet/.arrow/.feather or CSV).
+    types maps extra columns to 'int', 'float', 'date' or 'text' (see ColumnarSink).
+    resume_at (CSV only) appends to an existing file from that byte position.
+    """
+    if is_columnar(path):
+        if resume_at is not None:
+            raise ValueError("Resuming is only supported for CSV output")
+        return ColumnarSink(path, fieldnames, types=types)
+    return CsvSink(path, fieldnames, resume_at=resume_at)
+
+def read_rows(path, columns=None):
+    """
+    Yields rows as dicts of strings from a CSV or a columnar file.
+    For columnar files only the given columns are read.
+    """
+    if not is_columnar(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+        return
+
+    pa = _require_pyarrow()
+    if path.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(columns=columns)
+    else:
+        import pyarrow.ipc
+        reader = pyarrow.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if columns:
+            batches = (b.select(columns) for b in batches)
+
+    for batch in batches:
+        names = batch.schema.names
+        data = [batch.column(i).cast(pa.string()).to_pylist()
+                if not pa.types.is_dictionary(batch.column(i).type)
+                else batch.column(i).dictionary_decode().to_pylist()
+                for i in range(batch.num_columns)]
+        for values in zip(*data):
+            yield {name: ('' if v is None else v) for name, v in zip(names, values)}
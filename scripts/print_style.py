@@ -1,70 +1,145 @@
-import zipfile
-import xml.etree.ElementTree as ET
+import argparse
+import json
 import os
 
+from convert_kmz_to_csv import STYLE_MAPPING, StyleClassifier
+from kmz_index import load_index, style_maps_to_normal
+
 def print_style_definition(kmz_path, style_id):
     if not os.path.exists(kmz_path):
         print(f"Error: File not found: {kmz_path}")
         return
 
     try:
-        with zipfile.ZipFile(kmz_path, 'r') as z:
-            kml_filename = None
-            for name in z.namelist():
-                if name.endswith('.kml'):
-                    kml_filename = name
-                    break
-            
-            if not kml_filename:
-                print("Error: No KML file found.")
-                return
-
-            with z.open(kml_filename) as kml_file:
-                tree = ET.parse(kml_file)
-                root = tree.getroot()
-                
-                ns = {}
-                if '}' in root.tag:
-                    ns_url = root.tag.split('}')[0].strip('{')
-                    ns = {'kml': ns_url}
-
-                # Find the style
-                # style_id usually starts with # in reference, but id attribute doesn't have #
-                target_id = style_id.strip('#')
-                
-                # Look for Style
-                style = None
-                for s in root.findall('.//kml:Style', ns) if ns else root.findall('.//Style'):
-                    if s.get('id') == target_id:
-                        style = s
-                        print(f"Found Style with ID: {target_id}")
-                        icon_style = s.find('.//kml:IconStyle', ns) if ns else s.find('.//IconStyle')
-                        if icon_style is not None:
-                            color = icon_style.find('kml:color', ns) if ns else icon_style.find('color')
-                            scale = icon_style.find('kml:scale', ns) if ns else icon_style.find('scale')
-                            icon = icon_style.find('.//kml:href', ns) if ns else icon_style.find('.//href')
-                            print(f"  IconStyle:")
-                            print(f"    Color: {color.text if color is not None else 'None'}")
-                            print(f"    Scale: {scale.text if scale is not None else 'None'}")
-                            print(f"    Icon href: {icon.text if icon is not None else 'None'}")
-                        return
-
-                # Look for StyleMap
-                for sm in root.findall('.//kml:StyleMap', ns) if ns else root.findall('.//StyleMap'):
-                    if sm.get('id') == target_id:
-                        print(f"Found StyleMap with ID: {target_id}")
-                        pairs = sm.findall('kml:Pair', ns) if ns else sm.findall('Pair')
-                        for pair in pairs:
-                            key = pair.find('kml:key', ns) if ns else pair.find('key')
-                            url = pair.find('kml:styleUrl', ns) if ns else pair.find('styleUrl')
-                            print(f"  Pair: {key.text} -> {url.text}")
-                        return
-
-                print(f"Style or StyleMap with ID {target_id} not found.")
+        index = load_index(kmz_path)
+
+        # Find the style
+        # style_id usually starts with # in reference, but id attribute doesn't have #
+        target_id = style_id.strip('#')
+
+        # Look for Style
+        style = index['styles'].get(target_id)
+        if style is not None:
+            print(f"Found Style with ID: {target_id}")
+            if any(style[k] is not None for k in ('color', 'scale', 'icon')):
+                print(f"  IconStyle:")
+                print(f"    Color: {style['color']}")
+                print(f"    Scale: {style['scale']}")
+                print(f"    Icon href: {style['icon']}")
+            return
+
+        # Look for StyleMap
+        pairs = index['style_maps'].get(target_id)
+        if pairs is not None:
+            print(f"Found StyleMap with ID: {target_id}")
+            for key, url in pairs.items():
+                print(f"  Pair: {key} -> {url}")
+            return
+
+        print(f"Style or StyleMap with ID {target_id} not found.")
 
     except Exception as e:
         print(f"Error: {e}")
 
+def _follow(index, ref, key):
+    """
+    Follows StyleMap pairs for key ('normal' or 'highlight') until a Style.
+    Returns (style id, style dict), or (last id, None) if the chain breaks.
+    """
+    seen = set()
+    while ref not in seen:
+        seen.add(ref)
+        if ref in index['styles']:
+            return ref, index['styles'][ref]
+        pairs = index['style_maps'].get(ref)
+        if not pairs or not pairs.get(key):
+            return ref, None
+        ref = pairs[key].strip('#')
+    return ref, None
+
+def resolve_styles(kmz_path, style_ids='all'):
+    """
+    Resolves many style ids against one id -> Style/StyleMap table.
+
+    style_ids is a list of ids (with or without '#'), 'all' for every Style
+    and StyleMap in the document, or 'mapped' for the STYLE_MAPPING keys.
+    StyleMap chains are followed to their final normal and highlight Styles.
+    Fruit and legitimacy are those convert_kmz_to_csv assigns (see
+    StyleClassifier), so Styles behind a mapped StyleMap inherit its entry.
+    Returns one dict per id, in the order requested.
+    """
+    index = load_index(kmz_path)
+    classifier = StyleClassifier(index['styles'], style_maps_to_normal(index))
+
+    if style_ids == 'all':
+        style_ids = sorted(set(index['styles']) | set(index['style_maps']))
+    elif style_ids == 'mapped':
+        style_ids = list(STYLE_MAPPING)
+
+    results = []
+    for style_id in style_ids:
+        target_id = style_id.strip('#')
+        if target_id in index['styles']:
+            kind = 'Style'
+        elif target_id in index['style_maps']:
+            kind = 'StyleMap'
+        else:
+            kind = None
+
+        normal_id, normal = _follow(index, target_id, 'normal')
+        highlight_id, highlight = _follow(index, target_id, 'highlight')
+        mapping = {'style_url': '#' + target_id}
+        classifier.apply(mapping)
+        normal = normal or {}
+        highlight = highlight or {}
+
+        results.append({
+            'id': target_id,
+            'type': kind,
+            'normal_style': normal_id if normal else None,
+            'color': normal.get('color'),
+            'scale': normal.get('scale'),
+            'icon': normal.get('icon'),
+            'highlight_style': highlight_id if highlight else None,
+            'highlight_color': highlight.get('color'),
+            'highlight_scale': highlight.get('scale'),
+            'highlight_icon': highlight.get('icon'),
+            'fruit': mapping['fruit_type'] or None,
+            'legitimacy': mapping['legitimacy'] or None,
+        })
+    return results
+
+def print_style_report(kmz_path, style_ids='all', as_json=False):
+    if not os.path.exists(kmz_path):
+        print(f"Error: File not found: {kmz_path}")
+        return
+
+    try:
+        results = resolve_styles(kmz_path, style_ids)
+    except Exception as e:
+        print(f"Error: {e}")
+        return
+
+    if as_json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'Style':<24} | {'Type':<8} | {'Normal Style':<24} | {'Color':<8} | {'Scale':<5} | {'Fruit':<28} | {'Legitimacy':<15} | Icon")
+    print("-" * 160)
+    for r in results:
+        print(f"{r['id']:<24} | {r['type'] or 'missing':<8} | {r['normal_style'] or '':<24} | {r['color'] or '':<8} | "
+              f"{r['scale'] or '':<5} | {r['fruit'] or '':<28} | {r['legitimacy'] or '':<15} | {r['icon'] or ''}")
+
 if __name__ == "__main__":
-    # Example style ID from previous output
-    print_style_definition("/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz", "#icon-959-009D57")
+    parser = argparse.ArgumentParser(description="Print KMZ Style/StyleMap definitions.")
+    parser.add_argument('kmz', nargs='?', default="/Users/jhalperin/digital-forest-cards/עצי פרי 2022 ).kmz")
+    parser.add_argument('style_ids', nargs='*', help="Style ids, 'all' or 'mapped' (STYLE_MAPPING ids)")
+    parser.add_argument('--json', action='store_true', help="Print a JSON report")
+    args = parser.parse_args()
+
+    if not args.style_ids:
+        # Example style ID from previous output
+        print_style_definition(args.kmz, "#icon-959-009D57")
+    else:
+        ids = args.style_ids[0] if args.style_ids[0] in ('all', 'mapped') else args.style_ids
+        print_style_report(args.kmz, ids, as_json=args.json)
@@ -0,0 +1,151 @@
+import argparse
+import random
+import zipfile
+
+from convert_kmz_to_csv import STYLE_MAPPING
+
+FRUITS = ['לימון', 'תפוז', 'קלמנטינה', 'אשכולית', 'פומלה', 'קומקוואט', 'פסיפלורה', 'פיטנגה', 'בננה', 'אבוקדו', 'גויאבה', 'רימון', 'תאנה', 'זית', 'שסק', 'מנגו']
+LEGITIMACY = ['לגיטימי', 'לא לגיטימי', 'חצי לגיטימי']
+STREETS = ['הרצל', 'ויצמן', 'ז\'בוטינסקי', 'בן גוריון', 'רוטשילד', 'הנביאים', 'יפו', 'העצמאות']
+DATA_NAMES = ['גיל', 'גובה', 'מין', 'כתובת', 'מצב', 'הערות', 'קוטר', 'מקור']
+
+# Lon/lat extent of populated Israel
+LON_RANGE = (34.25, 35.65)
+LAT_RANGE = (29.55, 33.25)
+
+def _style_ids(n_styles, n_style_maps):
+    """
+    Style and StyleMap ids in the shape of Google My Maps exports: StyleMaps
+    named like the STYLE_MAPPING keys pointing at '-normal'/'-highlight' Styles,
+    plus plain Styles referenced directly.
+    """
+    mapped = [k[1:] for k in STYLE_MAPPING]
+    map_ids = [mapped[i] if i < len(mapped) else f'icon-ci-{1000 + i}' for i in range(n_style_maps)]
+    plain_ids = [f'icon-{1000 + i}-{i * 2654435761 % 0xFFFFFF:06X}' for i in range(max(n_styles - 2 * n_style_maps, 0))]
+    return map_ids, plain_ids
+
+def _styles_xml(map_ids, plain_ids):
+    parts = []
+    for i, sm_id in enumerate(map_ids):
+        color = f'ff{i * 40503 % 0xFFFFFF:06x}'
+        for suffix, scale in (('normal', '1'), ('highlight', '1.1')):
+            parts.append(f'<Style id="{sm_id}-{suffix}"><IconStyle><color>{color}</color><scale>{scale}</scale>'
+                         f'<Icon><href>images/icon-{i + 1}.png</href></Icon></IconStyle>'
+                         f'<LabelStyle><scale>0</scale></LabelStyle></Style>\n')
+        parts.append(f'<StyleMap id="{sm_id}">'
+                     f'<Pair><key>normal</key><styleUrl>#{sm_id}-normal</styleUrl></Pair>'
+                     f'<Pair><key>highlight</key><styleUrl>#{sm_id}-highlight</styleUrl></Pair></StyleMap>\n')
+    for i, style_id in enumerate(plain_ids):
+        parts.append(f'<Style id="{style_id}"><IconStyle><color>ff{style_id[-6:]}</color><scale>1</scale>'
+                     f'<Icon><href>https://www.gstatic.com/mapspro/images/stock/{959 + i}.png</href></Icon>'
+                     f'</IconStyle></Style>\n')
+    return ''.join(parts)
+
+def _placemark_xml(k, rng, style_refs, extended_fields, linestring_ratio):
+    fruit = rng.choice(FRUITS)
+    legitimacy = rng.choice(LEGITIMACY)
+    desc = f'{fruit} {legitimacy}<br>רחוב {rng.choice(STREETS)} {rng.randint(1, 120)}<br>נסקר {rng.randint(2015, 2022)}'
+    parts = [f'<Placemark><name>‎{fruit} {k}</name>'
+             f'<description><![CDATA[{desc}]]></description>'
+             f'<styleUrl>#{rng.choice(style_refs)}</styleUrl>']
+    if extended_fields:
+        parts.append('<ExtendedData>')
+        for j in range(extended_fields):
+            name = DATA_NAMES[j] if j < len(DATA_NAMES) else f'שדה {j}'
+            parts.append(f'<Data name="{name}"><value>{rng.randint(0, 99)}</value></Data>')
+        parts.append('</ExtendedData>')
+
+    lon = rng.uniform(*LON_RANGE)
+    lat = rng.uniform(*LAT_RANGE)
+    if rng.random() < linestring_ratio:
+        coords = ' '.join(f'{lon + 0.0001 * i:.6f},{lat + 0.0001 * rng.random():.6f},0' for i in range(rng.randint(2, 12)))
+        parts.append(f'<LineString><tessellate>1</tessellate><coordinates>{coords}</coordinates></LineString>')
+    else:
+        parts.append(f'<Point><coordinates>{lon:.7f},{lat:.7f},0</coordinates></Point>')
+    parts.append('</Placemark>\n')
+    return ''.join(parts)
+
+def iter_kml_chunks(placemarks=1000, folders=5, folder_depth=1, styles=120, style_maps=40,
+                    extended_fields=4, linestring_ratio=0.01, styles_last=False, seed=0):
+    """
+    Yields a synthetic KML document as text chunks.
+
+    Placemarks are spread evenly over the leaf folders of a tree with
+    `folders` top-level Folders, each nested `folder_depth` levels deep
+    (two subfolders per level below the top). styles is the total number of
+    Style elements (each StyleMap adds two); styles_last puts them after the
+    Placemarks, so references are forward.
+    """
+    rng = random.Random(seed)
+    map_ids, plain_ids = _style_ids(styles, style_maps)
+    style_refs = map_ids + plain_ids or ['missing-style']
+    styles_xml = _styles_xml(map_ids, plain_ids)
+
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>עצי פרי (סינתטי)</name>\n')
+    if not styles_last:
+        yield styles_xml
+
+    leaves = folders * 2 ** max(folder_depth - 1, 0)
+    per_leaf, extra = divmod(placemarks, max(leaves, 1))
+    k = 0
+    leaf = 0
+
+    def folder(path, depth):
+        nonlocal k, leaf
+        yield f'<Folder><name>‎שכבה {path}</name>\n'
+        if depth < folder_depth:
+            for child in range(2):
+                yield from folder(f'{path}.{child + 1}', depth + 1)
+        else:
+            count = per_leaf + (1 if leaf < extra else 0)
+            leaf += 1
+            buf = []
+            for _ in range(count):
+                k += 1
+                buf.append(_placemark_xml(k, rng, style_refs, extended_fields, linestring_ratio))
+                if len(buf) >= 1000:
+                    yield ''.join(buf)
+                    buf = []
+            yield ''.join(buf)
+        yield '</Folder>\n'
+
+    if folder_depth < 1 or folders < 1:
+        for _ in range(placemarks):
+            k += 1
+            yield _placemark_xml(k, rng, style_refs, extended_fields, linestring_ratio)
+    else:
+        for f in range(folders):
+            yield from folder(str(f + 1), 1)
+
+    if styles_last:
+        yield styles_xml
+    yield '</Document></kml>\n'
+
+def write_synthetic_kmz(kmz_path, kml_filename='doc.kml', **options):
+    """Writes a synthetic KMZ (see iter_kml_chunks for the options) without holding the KML in memory."""
+    with zipfile.ZipFile(kmz_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        with z.open(kml_filename, 'w', force_zip64=True) as f:
+            for chunk in iter_kml_chunks(**options):
+                f.write(chunk.encode('utf-8'))
+    return kmz_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic fruit-tree KMZ for benchmarks.")
+    parser.add_argument('output', help="KMZ path to write")
+    parser.add_argument('-n', '--placemarks', type=int, default=1000)
+    parser.add_argument('--folders', type=int, default=5, help="Top-level Folders")
+    parser.add_argument('--folder-depth', type=int, default=1)
+    parser.add_argument('--styles', type=int, default=120, help="Style elements in total")
+    parser.add_argument('--style-maps', type=int, default=40)
+    parser.add_argument('--extended-fields', type=int, default=4, help="ExtendedData fields per Placemark")
+    parser.add_argument('--linestring-ratio', type=float, default=0.01)
+    parser.add_argument('--styles-last', action='store_true', help="Put Styles after the Placemarks")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_synthetic_kmz(args.output, placemarks=args.placemarks, folders=args.folders,
+                        folder_depth=args.folder_depth, styles=args.styles, style_maps=args.style_maps,
+                        extended_fields=args.extended_fields, linestring_ratio=args.linestring_ratio,
+                        styles_last=args.styles_last, seed=args.seed)
+    print(f"Wrote {args.placemarks} placemarks to {args.output}")
@@ -0,0 +1,247 @@
+"""
+Async client for the digital-forest query API (see API_FIELDS.md and
+src/services/treeApi.ts), with a persistent response cache.
+
+The API takes base64-encoded SQL against trees_processed. Tree id lookups
+are batched into "meta-tree-id" IN (...) queries, sent over one pooled
+aiohttp session with at most `concurrency` requests in flight, and every
+answer (including "no rows") is kept per tree id in a SQLite cache with a
+TTL and least-recently-used eviction, so repeated enrichment runs only ask
+for ids the cache does not hold.
+
+aiohttp is only needed for network requests (pip install aiohttp). The
+endpoint can be pointed at a local stub server with url= or TREE_API_URL.
+"""
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import time
+
+API_URL = "https://api.digital-forest.org.il/api/query"
+TREE_ID_COLUMN = 'meta-tree-id'
+
+# num_rows asked per tree id; a response that fills num_rows may be
+# truncated and is re-queried (see TreeApiClient._fetch_batch)
+ROWS_PER_TREE = 20
+# Most rows asked for a single tree id before its answer is taken as is
+MAX_ROWS_PER_TREE = 20 * 4 ** 4
+# Status codes worth retrying
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# SQLite host-parameter limit is 999 on older builds
+SQL_CHUNK = 500
+
+def _require_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("aiohttp is required for API requests (pip install aiohttp)")
+    return aiohttp
+
+class TreeApiError(Exception):
+    pass
+
+def _sql_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def tree_ids_query(tree_ids):
+    """SQL for all trees_processed rows of the given meta-tree-ids (fetchTreeDataByTreeIds)."""
+    in_clause = ', '.join(_sql_literal(i) for i in tree_ids)
+    return f'SELECT * FROM trees_processed WHERE "{TREE_ID_COLUMN}" IN ({in_clause})'
+
+def encode_query(sql):
+    return base64.b64encode(sql.encode('utf-8')).decode('ascii')
+
+class ResponseCache:
+    """
+    API rows per tree id in a SQLite file.
+
+    Entries older than ttl seconds are treated as missing and dropped on
+    the next eviction; above max_entries the least recently used ones are
+    removed. An empty row list is cached too, so ids the API does not know
+    are not asked for again until they expire.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=2_000_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'tree_id TEXT PRIMARY KEY, rows TEXT NOT NULL, fetched REAL NOT NULL, used REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+        self._db.commit()
+
+    def get_many(self, tree_ids):
+        """Returns {tree id: rows} for the ids cached and not expired, and marks them used."""
+        now = time.time()
+        found = {}
+        for start in range(0, len(tree_ids), SQL_CHUNK):
+            chunk = tree_ids[start:start + SQL_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            cursor = self._db.execute(
+                f'SELECT tree_id, rows FROM responses WHERE tree_id IN ({marks}) AND fetched >= ?',
+                (*chunk, now - self.ttl))
+            for tree_id, rows in cursor:
+                found[tree_id] = json.loads(rows)
+        if found:
+            self._db.executemany('UPDATE responses SET used = ? WHERE tree_id = ?',
+                                 ((now, i) for i in found))
+            self._db.commit()
+        self.hits += len(found)
+        self.misses += len(tree_ids) - len(found)
+        return found
+
+    def put_many(self, results):
+        now = time.time()
+        self._db.executemany(
+            'INSERT OR REPLACE INTO responses (tree_id, rows, fetched, used) VALUES (?, ?, ?, ?)',
+            ((i, json.dumps(rows, ensure_ascii=False), now, now) for i, rows in results.items()))
+        self._db.commit()
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones above max_entries."""
+        self._db.execute('DELETE FROM responses WHERE fetched < ?', (time.time() - self.ttl,))
+        (count,) = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                'DELETE FROM responses WHERE tree_id IN '
+                '(SELECT tree_id FROM responses ORDER BY used LIMIT ?)', (count - self.max_entries,))
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self):
+        self.evict()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TreeApiClient:
+    """
+    Pooled, bounded-concurrency client; use as `async with TreeApiClient() as client`.
+
+    fetch_tree_ids sends batch_size ids per request. Failed requests
+    (connection errors, timeouts, 429/5xx) are retried with exponential
+    backoff up to `retries` times before TreeApiError is raised.
+    """
+
+    def __init__(self, url=None, concurrency=8, batch_size=200, cache=None, timeout=60, retries=3,
+                 rows_per_tree=ROWS_PER_TREE):
+        self.url = url or os.environ.get('TREE_API_URL') or API_URL
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.rows_per_tree = rows_per_tree
+        self.requests = 0
+        self.retried = 0
+        # Tree ids whose rows may still be cut off by the server's num_rows limit
+        self.truncated = []
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        aiohttp = _require_aiohttp()
+        self._aiohttp = aiohttp
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def query(self, sql, num_rows=1000):
+        """Runs one SQL query and returns its rows (runQuery)."""
+        params = {'query': encode_query(sql), 'num_rows': str(num_rows)}
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                self.requests += 1
+                try:
+                    async with self._session.get(self.url, params=params) as response:
+                        if response.status == 200:
+                            data = await response.json(content_type=None)
+                            return data.get('rows') or []
+                        text = await response.text()
+                        error = TreeApiError(f"HTTP {response.status}: {text[:200]}")
+                        if response.status not in RETRY_STATUS:
+                            raise error
+                except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = TreeApiError(f"{type(e).__name__}: {e}")
+                if attempt < self.retries:
+                    self.retried += 1
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+            raise error
+
+    async def _fetch_batch(self, tree_ids, num_rows=None, previous=0):
+        num_rows = num_rows or len(tree_ids) * self.rows_per_tree
+        rows = await self.query(tree_ids_query(tree_ids), num_rows)
+        if len(rows) >= num_rows and len(tree_ids) == 1:
+            # Possibly cut off at num_rows: ask for more rows of the tree, unless the
+            # server stopped returning more (it may cap num_rows) or the limit is reached
+            if len(rows) > previous and num_rows < MAX_ROWS_PER_TREE:
+                return await self._fetch_batch(tree_ids, num_rows * 4, len(rows))
+            self.truncated.append(tree_ids[0])
+        elif len(rows) >= num_rows:
+            # Possibly cut off at num_rows: ask again in halves
+            half = len(tree_ids) // 2
+            first, second = await asyncio.gather(self._fetch_batch(tree_ids[:half]),
+                                                 self._fetch_batch(tree_ids[half:]))
+            return {**first, **second}
+
+        results = {i: [] for i in tree_ids}
+        for row in rows:
+            tree_id = row.get(TREE_ID_COLUMN)
+            if tree_id in results:
+                results[tree_id].append(row)
+        if self.cache is not None:
+            self.cache.put_many(results)
+        return results
+
+    async def fetch_tree_ids(self, tree_ids):
+        """
+        Returns {tree id: [API rows]} for every distinct non-empty id; ids
+        without rows map to []. Cached ids are served without a request.
+        """
+        unique = list(dict.fromkeys(i for i in tree_ids if i))
+        results = self.cache.get_many(unique) if self.cache is not None else {}
+        missing = [i for i in unique if i not in results]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        for batch in await asyncio.gather(*(self._fetch_batch(b) for b in batches)):
+            results.update(batch)
+        return results
+
+def merge_tree_rows(rows):
+    """One dict per tree from its API rows: the first non-empty value of each field (transformTreeData)."""
+    merged = {}
+    for row in rows:
+        for key, value in row.items():
+            if value not in (None, '') and merged.get(key) in (None, ''):
+                merged[key] = value
+    return merged
+
+def fetch_tree_ids(tree_ids, cache_path=None, **client_options):
+    """Synchronous wrapper: {tree id: [API rows]}, optionally through a ResponseCache file."""
+    async def run(cache):
+        async with TreeApiClient(cache=cache, **client_options) as client:
+            return await client.fetch_tree_ids(tree_ids)
+
+    if cache_path is None:
+        return asyncio.run(run(None))
+    with ResponseCache(cache_path) as cache:
+        return asyncio.run(run(cache))
@@ -0,0 +1,9 @@
+from .boundaries import BoundaryLayer, points_in_polygon
+from .cluster import cluster_points, cluster_sizes, union_find
+from .index import SpatialIndex
+from .itm import itm_to_wgs84, wgs84_to_itm
+from .loader import load_points, to_float
+from .pluscode import encode_plus_codes
+
+__all__ = ['BoundaryLayer', 'SpatialIndex', 'cluster_points', 'cluster_sizes', 'encode_plus_codes', 'itm_to_wgs84',
+           'load_points', 'points_in_polygon', 'to_float', 'union_find', 'wgs84_to_itm']
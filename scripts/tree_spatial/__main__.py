@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from .benchmark import print_benchmark, run_benchmark
+from .index import SpatialIndex
+from .itm import wgs84_to_itm
+from .loader import load_points
+
+def build(args):
+    parts = [load_points(path) for path in args.inputs]
+    x = np.concatenate([p[0] for p in parts])
+    y = np.concatenate([p[1] for p in parts])
+    ids = np.concatenate([p[2] for p in parts])
+    started = time.perf_counter()
+    index = SpatialIndex(x, y, ids, cell_size=args.cell_size)
+    index.save(args.output)
+    print(f"Indexed {len(index)} points in {time.perf_counter() - started:.2f}s -> {args.output}")
+
+def query(args):
+    index = SpatialIndex.load(args.index)
+    x = y = None
+    if args.lonlat:
+        x, y = (float(v) for v in wgs84_to_itm(*args.lonlat))
+    elif args.itm:
+        x, y = args.itm
+
+    started = time.perf_counter()
+    if args.bbox:
+        found = index.bbox(*args.bbox)
+        dist = np.hypot(index.x[found] - x, index.y[found] - y) if x is not None else np.zeros(len(found))
+    elif args.radius is not None:
+        found, dist = index.radius(x, y, args.radius)
+    else:
+        found, dist = index.knn(x, y, args.k)
+    elapsed = time.perf_counter() - started
+
+    for i, d in zip(found[:args.limit], dist[:args.limit]):
+        print(f"{index.ids[i]:<24} {d:>10.1f}m  x={index.x[i]:.1f} y={index.y[i]:.1f}")
+    print(f"{len(found)} results in {elapsed * 1000:.3f} ms")
+
+def bench(args):
+    print_benchmark(run_benchmark(args.points, args.queries, args.k, args.radius, args.cell_size))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='tree_spatial', description="Spatial index over tree points (ITM meters).")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help="Build an index from converter or municipality CSV/Parquet files")
+    p.add_argument('inputs', nargs='+')
+    p.add_argument('-o', '--output', default='trees_index.npz')
+    p.add_argument('--cell-size', type=float, default=100.0, help="Grid cell size in meters")
+    p.set_defaults(func=build)
+
+    p = sub.add_parser('query', help="Query an index")
+    p.add_argument('index')
+    where = p.add_mutually_exclusive_group()
+    where.add_argument('--lonlat', nargs=2, type=float, metavar=('LON', 'LAT'))
+    where.add_argument('--itm', nargs=2, type=float, metavar=('X', 'Y'))
+    p.add_argument('-k', type=int, default=5, help="Number of nearest trees")
+    p.add_argument('--radius', type=float, help="Radius in meters instead of kNN")
+    p.add_argument('--bbox', nargs=4, type=float, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'), help="ITM box instead of kNN")
+    p.add_argument('--limit', type=int, default=20, help="Results to print")
+    p.set_defaults(func=query)
+
+    p = sub.add_parser('bench', help="Compare index queries against brute-force scans")
+    p.add_argument('--points', type=int, default=1000000)
+    p.add_argument('--queries', type=int, default=200)
+    p.add_argument('-k', type=int, default=10)
+    p.add_argument('--radius', type=float, default=250.0)
+    p.add_argument('--cell-size', type=float, default=100.0)
+    p.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    if args.command == 'query' and not (args.lonlat or args.itm or args.bbox):
+        parser.error("query needs --lonlat, --itm or --bbox")
+    args.func(args)
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+
+from .index import SpatialIndex
+
+# Rough ITM extent of Israel
+ITM_BOUNDS = (150000.0, 380000.0, 280000.0, 800000.0)
+
+def synthetic_points(n, seed=0):
+    """Clustered random points over the ITM extent, like trees in towns."""
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = ITM_BOUNDS
+    centers = np.column_stack([rng.uniform(minx, maxx, 500), rng.uniform(miny, maxy, 500)])
+    which = rng.integers(0, len(centers), n)
+    pts = centers[which] + rng.normal(0, 2000, (n, 2))
+    return pts[:, 0], pts[:, 1]
+
+def _per_query(fn, queries):
+    started = time.perf_counter()
+    for qx, qy in queries:
+        fn(qx, qy)
+    return (time.perf_counter() - started) / len(queries)
+
+def run_benchmark(n_points=1000000, n_queries=200, k=10, r=250.0, cell_size=100.0, seed=0):
+    """
+    Times grid-index kNN and radius queries against brute-force scans
+    (a NumPy scan over all points, and a pure Python scan on a sample).
+    Returns a dict of timings in seconds.
+    """
+    x, y = synthetic_points(n_points, seed)
+    started = time.perf_counter()
+    index = SpatialIndex(x, y, cell_size=cell_size)
+    build = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, n_points, n_queries)
+    queries = list(zip(x[picks] + rng.normal(0, 50, n_queries), y[picks] + rng.normal(0, 50, n_queries)))
+
+    def brute_knn(qx, qy):
+        d = np.hypot(x - qx, y - qy)
+        part = np.argpartition(d, k - 1)[:k]
+        return part[np.argsort(d[part])]
+
+    def brute_radius(qx, qy):
+        d = np.hypot(x - qx, y - qy)
+        return np.flatnonzero(d <= r)
+
+    # Check the index against brute force before timing
+    for qx, qy in queries[:20]:
+        got, _ = index.knn(qx, qy, k)
+        assert set(index.rows[got]) == set(brute_knn(qx, qy)), "kNN mismatch"
+        got, _ = index.radius(qx, qy, r)
+        assert set(index.rows[got]) == set(brute_radius(qx, qy)), "radius mismatch"
+
+    py_sample = list(zip(x[:100000].tolist(), y[:100000].tolist()))
+
+    def python_scan(qx, qy):
+        return sorted((((px - qx) ** 2 + (py - qy) ** 2), i) for i, (px, py) in enumerate(py_sample))[:k]
+
+    results = {
+        'points': n_points,
+        'queries': n_queries,
+        'build_s': build,
+        'index_knn_s': _per_query(lambda qx, qy: index.knn(qx, qy, k), queries),
+        'index_radius_s': _per_query(lambda qx, qy: index.radius(qx, qy, r), queries),
+        'numpy_scan_knn_s': _per_query(brute_knn, queries[:20]),
+        'numpy_scan_radius_s': _per_query(brute_radius, queries[:20]),
+        # Scaled from a 100k-point sample
+        'python_scan_knn_s': _per_query(python_scan, queries[:3]) * n_points / len(py_sample),
+    }
+    return results
+
+def print_benchmark(results):
+    print(f"{results['points']} points, {results['queries']} queries, index built in {results['build_s']:.2f}s")
+    print(f"{'Query':<28} | {'Per query':>12} | {'vs kNN':>8}")
+    print("-" * 56)
+    base = results['index_knn_s']
+    for label, key in [('index kNN', 'index_knn_s'), ('index radius', 'index_radius_s'),
+                       ('numpy scan kNN', 'numpy_scan_knn_s'), ('numpy scan radius', 'numpy_scan_radius_s'),
+                       ('python scan kNN (est.)', 'python_scan_knn_s')]:
+        print(f"{label:<28} | {results[key] * 1e6:>10.1f}us | {results[key] / base:>7.1f}x")
@@ -0,0 +1,152 @@
+"""Point-in-polygon assignment of trees to boundary polygons (municipalities, statistical areas)."""
+import json
+
+import numpy as np
+
+from .itm import wgs84_to_itm
+
+def _ring_edges(ring):
+    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+    if len(ring) and not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+    return ring[:-1], ring[1:]
+
+def points_in_polygon(px, py, rings):
+    """
+    Even-odd point-in-polygon test for many points against one polygon
+    given as rings (outer boundaries and holes, any number of parts).
+
+    Points are sorted by y once; for every edge the points whose y lies in
+    its span form one contiguous slice found with searchsorted, so only
+    (edge, point) pairs that can cross are ever built, and the crossing
+    counts are reduced with bincount. No Python loop runs over edges or
+    points.
+    """
+    n = len(px)
+    if not n:
+        return np.zeros(0, dtype=bool)
+    starts, ends = zip(*(_ring_edges(r) for r in rings)) if rings else ((), ())
+    if not starts:
+        return np.zeros(n, dtype=bool)
+    a = np.concatenate(starts)
+    b = np.concatenate(ends)
+
+    order = np.argsort(py, kind='stable')
+    sy = py[order]
+    sx = px[order]
+
+    y0 = np.minimum(a[:, 1], b[:, 1])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    # Half-open [y0, y1) so a vertex shared by two edges counts once
+    lo = np.searchsorted(sy, y0, side='left')
+    hi = np.searchsorted(sy, y1, side='left')
+    counts = hi - lo
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(n, dtype=bool)
+
+    edge = np.repeat(np.arange(len(a)), counts)
+    # Point positions lo..hi-1 of every edge, flattened
+    offsets = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    point = np.arange(total) + offsets
+
+    ax, ay = a[edge, 0], a[edge, 1]
+    bx, by = b[edge, 0], b[edge, 1]
+    qy = sy[point]
+    x_cross = ax + (qy - ay) * (bx - ax) / (by - ay)
+    crossing = sx[point] < x_cross
+
+    inside_sorted = np.bincount(point[crossing], minlength=n) % 2 == 1
+    inside = np.empty(n, dtype=bool)
+    inside[order] = inside_sorted
+    return inside
+
+def _feature_rings(geometry):
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return list(geometry['coordinates'])
+    if geometry['type'] == 'MultiPolygon':
+        return [ring for polygon in geometry['coordinates'] for ring in polygon]
+    if geometry['type'] == 'GeometryCollection':
+        return [ring for g in geometry['geometries'] for ring in _feature_rings(g)]
+    return []
+
+def _is_itm(collection, rings):
+    crs = json.dumps(collection.get('crs') or {})
+    if '2039' in crs:
+        return True
+    for ring in rings:
+        if len(ring):
+            return abs(ring[0][0]) > 360
+    return False
+
+class BoundaryLayer:
+    """
+    Polygons with attributes, queried in ITM.
+
+    assign() prefilters with each polygon's bounding box: points are kept
+    sorted by x, so the points inside a box are one searchsorted slice
+    plus a y mask, and only those go through points_in_polygon. The first
+    polygon containing a point wins.
+    """
+
+    def __init__(self, polygons, properties):
+        self.polygons = polygons  # list of ring lists, ITM
+        self.properties = properties
+        boxes = []
+        for rings in polygons:
+            pts = np.vstack([np.asarray(r)[:, :2] for r in rings]) if rings else np.full((1, 2), np.nan)
+            boxes.append((pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max()))
+        self.bboxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """Loads a GeoJSON FeatureCollection of (Multi)Polygons in WGS84 or ITM (EPSG:2039)."""
+        with open(path, 'r', encoding='utf-8') as f:
+            collection = json.load(f)
+        polygons = []
+        properties = []
+        for feature in collection.get('features', []):
+            rings = [np.asarray(r, dtype=np.float64)[:, :2] for r in _feature_rings(feature.get('geometry'))]
+            rings = [r for r in rings if len(r) >= 3]
+            if not rings:
+                continue
+            polygons.append(rings)
+            properties.append(feature.get('properties') or {})
+
+        if polygons and not _is_itm(collection, polygons[0]):
+            converted = []
+            for rings in polygons:
+                itm_rings = []
+                for r in rings:
+                    x, y = wgs84_to_itm(r[:, 0], r[:, 1])
+                    itm_rings.append(np.column_stack([x, y]))
+                converted.append(itm_rings)
+            polygons = converted
+        return cls(polygons, properties)
+
+    def assign(self, x, y):
+        """Returns the index of the polygon containing each ITM point, or -1."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        result = np.full(len(x), -1, dtype=np.int64)
+        order = np.argsort(x, kind='stable')
+        sx = x[order]
+        for i, (minx, miny, maxx, maxy) in enumerate(self.bboxes):
+            lo = np.searchsorted(sx, minx, side='left')
+            hi = np.searchsorted(sx, maxx, side='right')
+            if lo >= hi:
+                continue
+            candidates = order[lo:hi]
+            candidates = candidates[(y[candidates] >= miny) & (y[candidates] <= maxy) & (result[candidates] < 0)]
+            if not candidates.size:
+                continue
+            inside = points_in_polygon(x[candidates], y[candidates], self.polygons[i])
+            result[candidates[inside]] = i
+        return result
+
+    def values(self, assigned, prop, default=''):
+        """Property prop of each assigned polygon as a list of strings ('' where unassigned)."""
+        column = [default if p.get(prop) is None else str(p[prop]) for p in self.properties]
+        return [column[i] if i >= 0 else default for i in assigned.tolist()]
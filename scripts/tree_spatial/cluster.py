@@ -0,0 +1,129 @@
+"""Grouping of points within a distance of each other (duplicate trees across sources)."""
+import numpy as np
+
+# Half of the 3x3 cell neighbourhood as (dx, dy): every pair of adjacent cells is visited once
+_NEIGHBOURS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+def _roots(parent):
+    """Compresses parent pointers in place until every entry points at its root."""
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            return parent
+        parent[:] = grand
+
+def union_find(n, a, b):
+    """
+    Connected components of n nodes joined by the edges (a[i], b[i]).
+
+    Vectorized union-find: each round hooks every root that has an
+    unsatisfied edge to the smallest root it is joined to (np.minimum.at,
+    so edges sharing a root all count in the same round), then compresses
+    all paths by pointer jumping. Roots only ever point lower, so the label
+    of a component is its smallest node. A star (many records of one tree)
+    merges in two rounds whatever its degree; chains need more, but far
+    fewer rounds than edges.
+    """
+    parent = np.arange(n, dtype=np.int64)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while a.size:
+        ra, rb = parent[a], parent[b]
+        open_ = ra != rb
+        if not open_.any():
+            break
+        a, b, ra, rb = a[open_], b[open_], ra[open_], rb[open_]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+        _roots(parent)
+    return parent
+
+def _pair_ranges(keys, offset, cell_keys, cell_starts, same_cell):
+    """Per point (in key order), the [start, end) positions of the points it is paired with."""
+    if same_cell:
+        cell = np.searchsorted(cell_keys, keys)
+        return np.arange(1, len(keys) + 1), cell_starts[cell + 1]
+    target = keys + offset
+    cell = np.searchsorted(cell_keys, target)
+    found = cell < len(cell_keys)
+    found[found] = cell_keys[cell[found]] == target[found]
+    starts = np.where(found, cell_starts[np.minimum(cell, len(cell_keys) - 1)], 0)
+    ends = np.where(found, cell_starts[np.minimum(cell + 1, len(cell_keys))], 0)
+    return starts, ends
+
+def cluster_points(x, y, distance, groups=None, cross_group_only=False, chunk_size=4_000_000):
+    """
+    Labels points (ITM meters) so that points within distance of each
+    other, directly or through a chain of such points, share a label.
+    The label is the smallest input position in the cluster, so earlier
+    inputs act as the cluster's representative.
+
+    Points are hashed to a grid of distance-sized cells and only pairs in
+    the same or adjacent cells are measured; the candidate pairs are built
+    as whole arrays, chunk_size pairs at a time. With cross_group_only,
+    points of the same group (e.g. _source) are never linked directly.
+    NaN coordinates stay singletons.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if groups is not None:
+        _, groups = np.unique(np.asarray(groups), return_inverse=True)
+    valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    if valid.size < 2:
+        return np.arange(n, dtype=np.int64)
+
+    cx = np.floor(x[valid] / distance).astype(np.int64)
+    cy = np.floor(y[valid] / distance).astype(np.int64)
+    cx -= cx.min()
+    cy -= cy.min()
+    # A spare column keeps dx = +-1 from wrapping onto the next row of cells
+    ncols = int(cx.max()) + 2
+    keys = cy * ncols + cx
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    points = valid[order]
+    px, py = x[points], y[points]
+    cell_keys, starts = np.unique(keys, return_index=True)
+    cell_starts = np.append(starts, len(keys))
+
+    limit = distance * distance
+    edges_a, edges_b = [], []
+    for dx, dy in ((0, 0),) + _NEIGHBOURS:
+        lo, hi = _pair_ranges(keys, dy * ncols + dx, cell_keys, cell_starts, (dx, dy) == (0, 0))
+        counts = np.maximum(hi - lo, 0)
+        total = np.cumsum(counts)
+        # Split the points so that each chunk builds at most about chunk_size pairs
+        bounds = np.searchsorted(total, np.arange(chunk_size, int(total[-1]) + chunk_size, chunk_size), side='right')
+        first = 0
+        for last in np.unique(np.append(bounds, len(keys))):
+            if last <= first:
+                continue
+            c = counts[first:last]
+            m = int(c.sum())
+            if m:
+                i = np.repeat(np.arange(first, last), c)
+                j = np.arange(m) + np.repeat(lo[first:last] - (np.cumsum(c) - c), c)
+                close = (px[i] - px[j]) ** 2 + (py[i] - py[j]) ** 2 <= limit
+                if cross_group_only and groups is not None:
+                    close &= groups[points[i]] != groups[points[j]]
+                edges_a.append(points[i[close]])
+                edges_b.append(points[j[close]])
+            first = last
+
+    if not edges_a:
+        return np.arange(n, dtype=np.int64)
+    return union_find(n, np.concatenate(edges_a), np.concatenate(edges_b))
+
+def cluster_sizes(labels, groups=None):
+    """
+    Per point, the size of its cluster: the number of distinct groups
+    (sources) in it, or the number of members if groups is None.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    n = len(labels)
+    if groups is None:
+        return np.bincount(labels, minlength=n)[labels]
+    _, codes = np.unique(np.asarray(groups), return_inverse=True)
+    ngroups = int(codes.max()) + 1 if n else 1
+    distinct = np.unique(labels * ngroups + codes)
+    return np.bincount(distinct // ngroups, minlength=n)[labels]
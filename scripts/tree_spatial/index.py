@@ -0,0 +1,116 @@
+import numpy as np
+
+from .itm import wgs84_to_itm
+
+class SpatialIndex:
+    """
+    Uniform grid index over ITM meters.
+
+    Points are sorted by grid cell, so every row of cells in a query window
+    is one contiguous slice found with two binary searches. Results are
+    positions into the arrays the index was built from (see rows/ids).
+    """
+
+    def __init__(self, x, y, ids=None, cell_size=100.0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if ids is None:
+            ids = np.arange(len(x)).astype(str)
+
+        self.cell_size = float(cell_size)
+        self.x0 = float(x.min()) if len(x) else 0.0
+        self.y0 = float(y.min()) if len(y) else 0.0
+        cx = ((x - self.x0) // self.cell_size).astype(np.int64)
+        cy = ((y - self.y0) // self.cell_size).astype(np.int64)
+        self.ncols = int(cx.max()) + 1 if len(x) else 1
+        self.nrows = int(cy.max()) + 1 if len(y) else 1
+
+        keys = cy * self.ncols + cx
+        order = np.argsort(keys, kind='stable')
+        self.rows = order
+        self.x = x[order]
+        self.y = y[order]
+        self.ids = np.asarray(ids, dtype=str)[order]
+        self.cell_keys, starts = np.unique(keys[order], return_index=True)
+        self.cell_starts = np.append(starts, len(order)).astype(np.int64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def save(self, path):
+        np.savez(path, x=self.x, y=self.y, rows=self.rows, ids=self.ids,
+                 cell_keys=self.cell_keys, cell_starts=self.cell_starts,
+                 grid=np.array([self.x0, self.y0, self.cell_size, self.ncols, self.nrows]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls.__new__(cls)
+        index.x = data['x']
+        index.y = data['y']
+        index.rows = data['rows']
+        index.ids = data['ids']
+        index.cell_keys = data['cell_keys']
+        index.cell_starts = data['cell_starts']
+        x0, y0, cell_size, ncols, nrows = data['grid']
+        index.x0, index.y0, index.cell_size = float(x0), float(y0), float(cell_size)
+        index.ncols, index.nrows = int(ncols), int(nrows)
+        return index
+
+    def _window(self, minx, miny, maxx, maxy):
+        """Positions of all points in the cells overlapping a box (a superset of the box)."""
+        cx0 = max(int((minx - self.x0) // self.cell_size), 0)
+        cx1 = min(int((maxx - self.x0) // self.cell_size), self.ncols - 1)
+        cy0 = max(int((miny - self.y0) // self.cell_size), 0)
+        cy1 = min(int((maxy - self.y0) // self.cell_size), self.nrows - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype=np.int64)
+
+        row_keys = np.arange(cy0, cy1 + 1, dtype=np.int64) * self.ncols
+        lo = np.searchsorted(self.cell_keys, row_keys + cx0, side='left')
+        hi = np.searchsorted(self.cell_keys, row_keys + cx1, side='right')
+        starts = self.cell_starts[lo]
+        ends = self.cell_starts[hi]
+        keep = ends > starts
+        if not keep.any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts[keep], ends[keep])])
+
+    def bbox(self, minx, miny, maxx, maxy):
+        """Positions of the points inside a box."""
+        cand = self._window(minx, miny, maxx, maxy)
+        x, y = self.x[cand], self.y[cand]
+        return cand[(x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)]
+
+    def radius(self, x, y, r):
+        """Positions and distances of the points within r meters, nearest first."""
+        cand = self._window(x - r, y - r, x + r, y + r)
+        d = np.hypot(self.x[cand] - x, self.y[cand] - y)
+        inside = d <= r
+        cand, d = cand[inside], d[inside]
+        order = np.argsort(d, kind='stable')
+        return cand[order], d[order]
+
+    def knn(self, x, y, k=1):
+        """Positions and distances of the k nearest points, nearest first."""
+        r = self.cell_size
+        extent = max(self.ncols, self.nrows) * self.cell_size
+        while True:
+            cand = self._window(x - r, y - r, x + r, y + r)
+            d = np.hypot(self.x[cand] - x, self.y[cand] - y)
+            # Everything within r is in the window, so k hits within r are final
+            if np.count_nonzero(d <= r) >= k or (r > extent + abs(x - self.x0) + abs(y - self.y0)):
+                if len(d) > k:
+                    part = np.argpartition(d, k - 1)[:k]
+                    cand, d = cand[part], d[part]
+                order = np.argsort(d, kind='stable')
+                return cand[order], d[order]
+            r *= 2
+
+    def knn_lonlat(self, lon, lat, k=1):
+        x, y = wgs84_to_itm(lon, lat)
+        return self.knn(float(x), float(y), k)
+
+    def radius_lonlat(self, lon, lat, r):
+        x, y = wgs84_to_itm(lon, lat)
+        return self.radius(float(x), float(y), r)
@@ -0,0 +1,114 @@
+"""WGS84 <-> Israeli Transverse Mercator (ITM, EPSG:2039) on NumPy arrays."""
+import numpy as np
+
+# WGS84 and GRS80 ellipsoids
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+GRS80_A = 6378137.0
+GRS80_F = 1 / 298.257222101
+
+# Israel 1993 -> WGS 84 (2), coordinate frame Helmert; meters, arc-seconds, ppm.
+# This is the PROJ default for EPSG:4326 -> EPSG:2039 and reproduces the
+# location-x-il/location-y-il values of the tree records.
+HELMERT = (23.772, 17.49, 17.859, 0.3132, 1.85274, -1.67299, -5.4262)
+
+# ITM projection parameters
+LAT0 = np.radians(31 + 44 / 60 + 3.817 / 3600)
+LON0 = np.radians(35 + 12 / 60 + 16.261 / 3600)
+K0 = 1.0000067
+FALSE_EASTING = 219529.584
+FALSE_NORTHING = 626907.390
+
+_ARCSEC = np.pi / (180 * 3600)
+
+def _geodetic_to_ecef(lat, lon, a, f):
+    e2 = f * (2 - f)
+    sin_lat = np.sin(lat)
+    nu = a / np.sqrt(1 - e2 * sin_lat ** 2)
+    return nu * np.cos(lat) * np.cos(lon), nu * np.cos(lat) * np.sin(lon), nu * (1 - e2) * sin_lat
+
+def _ecef_to_geodetic(x, y, z, a, f):
+    e2 = f * (2 - f)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - e2))
+    for _ in range(4):
+        nu = a / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+        lat = np.arctan2(z + e2 * nu * np.sin(lat), p)
+    return lat, np.arctan2(y, x)
+
+def _helmert(x, y, z, inverse=False):
+    """Applies the Israel 1993 -> WGS84 shift, or WGS84 -> Israel 1993 if inverse."""
+    tx, ty, tz, rx, ry, rz, s = HELMERT
+    rx, ry, rz = rx * _ARCSEC, ry * _ARCSEC, rz * _ARCSEC
+    m = 1 + s * 1e-6
+    if inverse:
+        x, y, z = (x - tx) / m, (y - ty) / m, (z - tz) / m
+        # Transpose of the coordinate frame rotation
+        return x - rz * y + ry * z, rz * x + y - rx * z, -ry * x + rx * y + z
+    xo = m * (x + rz * y - ry * z)
+    yo = m * (-rz * x + y + rx * z)
+    zo = m * (ry * x - rx * y + z)
+    return xo + tx, yo + ty, zo + tz
+
+def _kruger():
+    n = GRS80_F / (2 - GRS80_F)
+    big_a = GRS80_A / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+    alpha = (n / 2 - 2 / 3 * n ** 2 + 5 / 16 * n ** 3,
+             13 / 48 * n ** 2 - 3 / 5 * n ** 3,
+             61 / 240 * n ** 3)
+    beta = (n / 2 - 2 / 3 * n ** 2 + 37 / 96 * n ** 3,
+            1 / 48 * n ** 2 + 1 / 15 * n ** 3,
+            17 / 480 * n ** 3)
+    delta = (2 * n - 2 / 3 * n ** 2 - 2 * n ** 3,
+             7 / 3 * n ** 2 - 8 / 5 * n ** 3,
+             56 / 15 * n ** 3)
+    return n, big_a, alpha, beta, delta
+
+_N, _A, _ALPHA, _BETA, _DELTA = _kruger()
+_E_SQRT = 2 * np.sqrt(_N) / (1 + _N)
+
+def _tm_forward(lat, dlon):
+    t = np.sinh(np.arctanh(np.sin(lat)) - _E_SQRT * np.arctanh(_E_SQRT * np.sin(lat)))
+    xi = np.arctan2(t, np.cos(dlon))
+    eta = np.arctanh(np.sin(dlon) / np.sqrt(1 + t ** 2))
+    e = eta.copy()
+    nn = xi.copy()
+    for j, a in enumerate(_ALPHA, start=1):
+        e = e + a * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+        nn = nn + a * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+    return _A * e, _A * nn
+
+_, _NORTHING_ORIGIN = _tm_forward(np.float64(LAT0), np.float64(0.0))
+
+def wgs84_to_itm(lon, lat):
+    """
+    Converts WGS84 lon/lat degrees (scalars or arrays) to ITM x/y meters.
+    NaN inputs give NaN outputs.
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    x, y, z = _geodetic_to_ecef(lat, lon, WGS84_A, WGS84_F)
+    x, y, z = _helmert(x, y, z, inverse=True)
+    lat, lon = _ecef_to_geodetic(x, y, z, GRS80_A, GRS80_F)
+    e, n = _tm_forward(lat, lon - LON0)
+    return FALSE_EASTING + K0 * e, FALSE_NORTHING + K0 * (n - _NORTHING_ORIGIN)
+
+def itm_to_wgs84(x, y):
+    """Converts ITM x/y meters (scalars or arrays) to WGS84 lon/lat degrees."""
+    xi = (np.asarray(y, dtype=np.float64) - FALSE_NORTHING) / K0 + _NORTHING_ORIGIN
+    eta = (np.asarray(x, dtype=np.float64) - FALSE_EASTING) / K0
+    xi, eta = xi / _A, eta / _A
+    xi_p, eta_p = xi.copy(), eta.copy()
+    for j, b in enumerate(_BETA, start=1):
+        xi_p = xi_p - b * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+        eta_p = eta_p - b * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+    chi = np.arcsin(np.sin(xi_p) / np.cosh(eta_p))
+    lat = chi.copy()
+    for j, d in enumerate(_DELTA, start=1):
+        lat = lat + d * np.sin(2 * j * chi)
+    lon = LON0 + np.arctan2(np.sinh(eta_p), np.cos(xi_p))
+
+    gx, gy, gz = _geodetic_to_ecef(lat, lon, GRS80_A, GRS80_F)
+    gx, gy, gz = _helmert(gx, gy, gz)
+    lat, lon = _ecef_to_geodetic(gx, gy, gz, WGS84_A, WGS84_F)
+    return np.degrees(lon), np.degrees(lat)
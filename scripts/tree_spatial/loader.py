@@ -0,0 +1,55 @@
+import numpy as np
+
+from output_sinks import read_rows
+
+from .itm import wgs84_to_itm
+
+# Columns tried in order for ids; municipality records, then converter output
+ID_COLUMNS = ('meta-tree-id', 'name')
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def to_float(values):
+    """
+    float64 array of values as read from a records file (strings or numbers);
+    None, '' and values that do not parse as numbers (e.g. 'N/A') become NaN.
+    """
+    values = [v if v not in (None, '') else 'nan' for v in values]
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_float_or_nan(v) for v in values], dtype=np.float64)
+
+def load_points(path):
+    """
+    Reads tree points from a CSV/Parquet file and returns (x, y, ids) in ITM.
+
+    Municipality records (municipality-examples.csv) use location-x-il /
+    location-y-il, falling back to location-x / location-y; converter output
+    uses longitude / latitude, which are transformed to ITM in one
+    vectorized call. Rows without coordinates are skipped. ids default to
+    '<file row number>' when no id column is present.
+    """
+    xs, ys, lons, lats, ids = [], [], [], [], []
+    id_column = None
+    for i, row in enumerate(read_rows(path)):
+        if i == 0:
+            id_column = next((c for c in ID_COLUMNS if c in row), None)
+        ids.append(row[id_column] if id_column and row[id_column] else str(i))
+        xs.append(row.get('location-x-il') or '')
+        ys.append(row.get('location-y-il') or '')
+        lons.append(row.get('location-x') or row.get('longitude') or '')
+        lats.append(row.get('location-y') or row.get('latitude') or '')
+
+    x, y = to_float(xs), to_float(ys)
+    missing = np.isnan(x) | np.isnan(y)
+    if missing.any():
+        mx, my = wgs84_to_itm(to_float(lons)[missing], to_float(lats)[missing])
+        x[missing], y[missing] = mx, my
+
+    keep = ~(np.isnan(x) | np.isnan(y))
+    return x[keep], y[keep], np.asarray(ids, dtype=str)[keep]
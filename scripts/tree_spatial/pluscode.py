@@ -0,0 +1,56 @@
+"""Open Location Code (Plus Code) encoding on NumPy arrays."""
+import numpy as np
+
+ALPHABET = np.frombuffer(b'23456789CFGHJMPQRVWX', dtype=np.uint8)
+SEPARATOR = ord('+')
+SEPARATOR_POSITION = 8
+PAIR_CODE_LENGTH = 10
+GRID_CODE_LENGTH = 5
+GRID_ROWS = 5
+GRID_COLUMNS = 4
+# Integer units of the finest code: 1/8000 degree per pair digit, then the grid steps
+FINAL_LAT_PRECISION = 8000 * GRID_ROWS ** GRID_CODE_LENGTH
+FINAL_LNG_PRECISION = 8000 * GRID_COLUMNS ** GRID_CODE_LENGTH
+
+# meta-tree-id length: 8 + 4 digits, about 3.5 x 2.8 cm cells
+TREE_ID_LENGTH = 12
+
+def encode_plus_codes(lon, lat, code_length=TREE_ID_LENGTH):
+    """
+    Encodes lon/lat arrays as Plus Codes (e.g. '8G3QQ4X8+WGQG' at length 12).
+    All digits are computed as whole-array integer operations; NaN
+    coordinates give ''. code_length is between 10 and 15.
+    """
+    if not PAIR_CODE_LENGTH <= code_length <= PAIR_CODE_LENGTH + GRID_CODE_LENGTH:
+        raise ValueError(f"code_length must be 10..15, got {code_length}")
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    lon = np.where(valid, lon, 0.0)
+    lat = np.where(valid, lat, 0.0)
+
+    lat = np.clip(lat, -90, 90)
+    lon = (lon + 180) % 360 - 180
+    # Same rounding as the reference implementation before truncating
+    lat_val = np.floor(np.round((lat + 90) * FINAL_LAT_PRECISION, 6)).astype(np.int64)
+    lng_val = np.floor(np.round((lon + 180) * FINAL_LNG_PRECISION, 6)).astype(np.int64)
+    lat_val = np.minimum(lat_val, 180 * FINAL_LAT_PRECISION - 1)
+
+    digits = np.empty((lat_val.size, PAIR_CODE_LENGTH + GRID_CODE_LENGTH), dtype=np.int64)
+    for i in range(GRID_CODE_LENGTH):
+        digits[:, -1 - i] = (lat_val % GRID_ROWS) * GRID_COLUMNS + lng_val % GRID_COLUMNS
+        lat_val //= GRID_ROWS
+        lng_val //= GRID_COLUMNS
+    for i in range(PAIR_CODE_LENGTH // 2):
+        digits[:, PAIR_CODE_LENGTH - 1 - 2 * i] = lng_val % 20
+        digits[:, PAIR_CODE_LENGTH - 2 - 2 * i] = lat_val % 20
+        lat_val //= 20
+        lng_val //= 20
+
+    chars = np.empty((lat_val.size, code_length + 1), dtype=np.uint8)
+    chars[:, :SEPARATOR_POSITION] = ALPHABET[digits[:, :SEPARATOR_POSITION]]
+    chars[:, SEPARATOR_POSITION] = SEPARATOR
+    chars[:, SEPARATOR_POSITION + 1:] = ALPHABET[digits[:, SEPARATOR_POSITION:code_length]]
+    codes = chars.view(f'S{code_length + 1}').ravel().astype(f'U{code_length + 1}')
+    codes[~valid] = ''
+    return codes
@@ -0,0 +1,124 @@
+"""
+Web Mercator tile math and point tile encoders (GeoJSON and Mapbox Vector Tiles).
+
+The MVT encoder writes the protobuf wire format directly (spec version 2),
+for point layers only, so no protobuf or mapbox-vector-tile package is
+needed.
+"""
+import json
+import math
+
+import numpy as np
+
+MAX_LATITUDE = 85.05112878
+
+def lonlat_to_world(lon, lat):
+    """Web Mercator position of lon/lat arrays in [0, 1) world units (x east, y south)."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    x = (lon + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return x, y
+
+def world_to_lonlat(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    lon = x * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y))))
+    return lon, lat
+
+def geojson_tile(lon, lat, properties):
+    """A FeatureCollection of Points as a compact JSON string."""
+    features = [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [round(x, 7), round(y, 7)]},
+         'properties': props}
+        for x, y, props in zip(lon, lat, properties)
+    ]
+    return json.dumps({'type': 'FeatureCollection', 'features': features}, ensure_ascii=False,
+                      separators=(',', ':'))
+
+# --- MVT (protobuf) ---
+
+def _varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+def _field(out, number, wire_type):
+    _varint(out, (number << 3) | wire_type)
+
+def _bytes_field(out, number, payload):
+    _field(out, number, 2)
+    _varint(out, len(payload))
+    out += payload
+
+def _value(v):
+    out = bytearray()
+    if isinstance(v, bool):
+        _field(out, 7, 0)
+        _varint(out, int(v))
+    elif isinstance(v, int):
+        if v >= 0:
+            _field(out, 5, 0)
+            _varint(out, v)
+        else:
+            _field(out, 6, 0)
+            _varint(out, _zigzag(v))
+    elif isinstance(v, float):
+        _field(out, 3, 1)
+        out += np.float64(v).tobytes()
+    else:
+        _bytes_field(out, 1, str(v).encode('utf-8'))
+    return bytes(out)
+
+def mvt_tile(layer_name, px, py, properties, extent=4096):
+    """
+    Encodes one point layer as an MVT tile.
+
+    px/py are integer positions inside the tile (0..extent); properties is
+    one dict per point. Keys and values are de-duplicated per layer as the
+    spec requires.
+    """
+    keys, values = {}, {}
+    layer = bytearray()
+    _field(layer, 15, 0)
+    _varint(layer, 2)
+    _bytes_field(layer, 1, layer_name.encode('utf-8'))
+
+    for i, (x, y, props) in enumerate(zip(px, py, properties)):
+        feature = bytearray()
+        _field(feature, 1, 0)
+        _varint(feature, i + 1)
+
+        tags = bytearray()
+        for k, v in props.items():
+            if v is None or v == '':
+                continue
+            _varint(tags, keys.setdefault(k, len(keys)))
+            _varint(tags, values.setdefault(_value(v), len(values)))
+        _bytes_field(feature, 2, tags)
+
+        _field(feature, 3, 0)
+        _varint(feature, 1)  # POINT
+        geometry = bytearray()
+        _varint(geometry, (1 << 3) | 1)  # MoveTo, one point
+        _varint(geometry, _zigzag(int(x)))
+        _varint(geometry, _zigzag(int(y)))
+        _bytes_field(feature, 4, geometry)
+        _bytes_field(layer, 2, feature)
+
+    for k in keys:
+        _bytes_field(layer, 3, k.encode('utf-8'))
+    for v in values:
+        _bytes_field(layer, 4, v)
+    _field(layer, 5, 0)
+    _varint(layer, extent)
+
+    tile = bytearray()
+    _bytes_field(tile, 3, layer)
+    return bytes(tile)
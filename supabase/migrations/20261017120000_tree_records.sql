@@ -0,0 +1,93 @@
+-- Tree records (municipality-examples.csv schema) loaded by scripts/load_tree_records.py.
+-- Column names match the digital-forest API fields; a tree id can have one row per source.
+create table public.tree_records (
+  _source text not null default '',
+  "attributes-age" text,
+  "attributes-age-estimated" text,
+  "attributes-bark-circumference" text,
+  "attributes-bark-diameter" text,
+  "attributes-canopy-area" text,
+  "attributes-canopy-diameter" text,
+  "attributes-description" text,
+  "attributes-genus" text,
+  "attributes-good-status" text,
+  "attributes-health-score" text,
+  "attributes-height" text,
+  "attributes-num-barks" text,
+  "attributes-species" text,
+  "attributes-species-clean-en" text,
+  "attributes-species-clean-he" text,
+  "attributes-year-planted" text,
+  cad_code text,
+  cad_gush text,
+  cad_parcel text,
+  "cluster-size" integer,
+  coords text,
+  "environment-description" text,
+  "environment-grass" text,
+  "environment-habitat" text,
+  "environment-habitat-volume" text,
+  "environment-irrigated" text,
+  "environment-irrigation-type" text,
+  "environment-irrigation-water-quality" text,
+  "environment-lighting" text,
+  "environment-pavement" text,
+  "environment-signage" text,
+  "environment-sitting-area" text,
+  "environment-type" text,
+  idx bigint,
+  "importance-aesthetic" text,
+  "importance-botanical" text,
+  "importance-community" text,
+  "importance-historic" text,
+  "importance-symbolic" text,
+  "location-accuracy" text,
+  "location-address" text,
+  "location-block" text,
+  "location-city" text,
+  "location-elevation" text,
+  "location-grid" text,
+  "location-plot" text,
+  "location-street" text,
+  "location-street-number" text,
+  "location-x" double precision,
+  "location-x-il" double precision,
+  "location-y" double precision,
+  "location-y-il" double precision,
+  "meta-collection-type" text,
+  "meta-date" text,
+  "meta-internal-id" text not null default '',
+  "meta-source" text,
+  "meta-source-type" text,
+  "meta-tree-id" text not null default '',
+  "meta-url" text,
+  muni_code text,
+  muni_name text,
+  muni_name_en text,
+  muni_region text,
+  "photos-bark" text,
+  "photos-fruit" text,
+  "photos-general" text,
+  "photos-ground" text,
+  "photos-leaf" text,
+  "photos-top-view" text,
+  "photos-wide-view" text,
+  road_id text,
+  road_name text,
+  road_type text,
+  stat_area_code text,
+  fruit_type text,
+  legitimacy text,
+  loaded_at timestamptz not null default now(),
+  primary key ("meta-tree-id", _source, "meta-internal-id")
+);
+
+create index tree_records_muni_name_idx on public.tree_records (muni_name);
+create index tree_records_source_idx on public.tree_records (_source);
+
+alter table public.tree_records enable row level security;
+
+create policy "public can read tree records"
+on public.tree_records
+for select
+using (true);